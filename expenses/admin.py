@@ -1,7 +1,15 @@
 from django.contrib import admin
-from .models import User, Transaction, PaymentMethod
+from .models import (User, Transaction, PaymentMethod, MonthlyRollup, RecurrencePause, Change, Budget, BudgetAlert,
+                     CategorySpend, ArchivedTransaction)
 
 # Register your models here.
 admin.site.register(User)
 admin.site.register(Transaction)
-admin.site.register(PaymentMethod)
\ No newline at end of file
+admin.site.register(PaymentMethod)
+admin.site.register(MonthlyRollup)
+admin.site.register(RecurrencePause)
+admin.site.register(Change)
+admin.site.register(Budget)
+admin.site.register(BudgetAlert)
+admin.site.register(CategorySpend)
+admin.site.register(ArchivedTransaction)
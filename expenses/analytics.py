@@ -0,0 +1,307 @@
+import calendar
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from django.db.models import BigIntegerField, F, Func, Value
+from django.db.models.functions import Cast, Coalesce, Round
+from django.utils import timezone
+
+from .models import Transaction
+from .schedule import materialize, monthly_projection
+
+CATEGORIES = [category for category, _ in Transaction.CATEGORIES]
+
+# Code of categories outside CATEGORIES, stored before categories were
+# validated on write
+OTHER_CATEGORY = CATEGORIES.index('other')
+
+# Months of the rolling category averages
+WINDOWS = [3, 6, 12]
+
+# Complete months the projections are fitted on
+HISTORY_MONTHS = 12
+
+# Days the burn rate of each payment method is averaged over
+BURN_RATE_DAYS = 90
+
+PROJECTIONS = ['linear', 'seasonal']
+
+# A user's one-time transactions as parallel arrays, one entry per transaction.
+# days are local days since 1970-01-01, categories index CATEGORIES and
+# methods index method_ids, in which 0 stands for no payment method.
+History = namedtuple('History', ['days', 'cents', 'income', 'categories', 'methods', 'method_ids'])
+
+
+class EpochSeconds(Func):
+    """
+    Seconds since 1970-01-01 UTC of a datetime column, as an integer, so rows
+    reach Python without being parsed into datetime objects.
+    """
+
+    template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) AS BIGINT)'
+    output_field = BigIntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection,
+                              template='CAST(ROUND((julianday(%(expressions)s) - 2440587.5) * 86400) AS INTEGER)',
+                              **extra_context)
+
+
+def utc_offsets(seconds, tzinfo):
+    """
+    UTC offsets in seconds of an array of epoch seconds in a time zone.
+    Offsets are looked up once per distinct UTC day, and per row only on the
+    days a transition happens.
+    """
+
+    def offset(value):
+        return datetime.fromtimestamp(int(value), tzinfo).utcoffset().total_seconds()
+
+    days, index = np.unique(seconds // 86400, return_inverse=True)
+    at_start = np.array([offset(day * 86400) for day in days])
+    at_end = np.array([offset((day + 1) * 86400) for day in days])
+    offsets = at_start[index]
+    changing = (at_start != at_end)[index]
+    offsets[changing] = [offset(value) for value in seconds[changing]]
+    return offsets
+
+
+def load_history(user):
+    """
+    Reads the user's one-time transactions with a single query. Timestamps and
+    cents come out of the database as integers and are converted to local
+    days and codes column by column.
+    Returns:
+        History of the user
+    """
+
+    rows = list(Transaction.objects
+                .filter(userID=user, repeat_interval='none')
+                .annotate(seconds=EpochSeconds('date'),
+                          cents=Cast(Round(F('amount') * 100), BigIntegerField()),
+                          method=Coalesce('payment_methodID', Value(0)))
+                .values_list('seconds', 'cents', 'transaction_type', 'category', 'method')
+                .order_by())
+    if not rows:
+        return History(np.zeros(0, np.int32), np.zeros(0, np.int64), np.zeros(0, bool),
+                       np.zeros(0, np.int16), np.zeros(0, np.int32), np.zeros(0, np.int64))
+
+    seconds, cents, types, categories, methods = zip(*rows)
+    seconds = np.array(seconds, dtype=np.int64)
+    names, category_index = np.unique(np.array(categories), return_inverse=True)
+    codes = np.array([CATEGORIES.index(name) if name in CATEGORIES else OTHER_CATEGORY for name in names],
+                     dtype=np.int16)
+    method_ids, method_index = np.unique(np.array(methods, dtype=np.int64), return_inverse=True)
+    return History(
+        days=((seconds + utc_offsets(seconds, user.tzinfo)) // 86400).astype(np.int32),
+        cents=np.array(cents, dtype=np.int64),
+        income=np.array(types) == 'income',
+        categories=codes[category_index],
+        methods=method_index.astype(np.int32),
+        method_ids=method_ids,
+    )
+
+
+def epoch_day(day):
+    return (day - date(1970, 1, 1)).days
+
+
+def epoch_month(day):
+    return (day.year - 1970) * 12 + day.month - 1
+
+
+def month_start(index):
+    return date(1970 + index // 12, index % 12 + 1, 1)
+
+
+def months_of(days):
+    """
+    Months since January 1970 of an array of epoch days.
+    """
+
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+
+
+def monthly_sums(history, first, last, income, groups=None, count=1):
+    """
+    Sums the cents of the income or the expenses per month and group.
+    Args:
+        history: History to sum
+        first: first month, as months since January 1970
+        last: month after the last one
+        income: True to sum income, False for expenses
+        groups: array of group codes parallel to the history, or None for a
+                single group
+        count: number of groups
+    Returns:
+        Array of shape (months, count)
+    """
+
+    months = months_of(history.days)
+    mask = (history.income == income) & (months >= first) & (months < last)
+    index = (months[mask] - first) * count
+    if groups is not None:
+        index += groups[mask]
+    sums = np.bincount(index, weights=history.cents[mask], minlength=(last - first) * count)
+    return sums.reshape(last - first, count)
+
+
+def rolling_averages(sums, windows=WINDOWS):
+    """
+    Average per month of the last k rows of a (months, groups) array, for each
+    k in windows, from a single cumulative sum.
+    Returns:
+        Array of shape (windows, groups)
+    """
+
+    totals = np.cumsum(sums[::-1], axis=0)
+    return np.stack([totals[min(window, len(sums)) - 1] / window for window in windows])
+
+
+def linear_projection(sums, horizon):
+    """
+    Fits a least-squares line to each column of a (months, groups) array and
+    extends it over the next months. Projections never go below zero.
+    Returns:
+        Array of shape (horizon, groups)
+    """
+
+    months = np.arange(len(sums))
+    slope, intercept = np.polyfit(months, sums, 1)
+    future = np.arange(len(sums), len(sums) + horizon)[:, None]
+    return np.clip(future * slope + intercept, 0, None)
+
+
+def seasonal_projection(sums, first, horizon):
+    """
+    Linear projection scaled by a seasonal index, the ratio of each calendar
+    month's mean to the overall mean. Calendar months without history, or
+    columns without any amount, keep an index of 1.
+    Args:
+        sums: (months, groups) array
+        first: month of the first row, as months since January 1970
+        horizon: number of months to project
+    Returns:
+        Array of shape (horizon, groups)
+    """
+
+    calendar_months = (first + np.arange(len(sums))) % 12
+    totals = np.zeros((12, sums.shape[1]))
+    np.add.at(totals, calendar_months, sums)
+    counts = np.bincount(calendar_months, minlength=12)[:, None]
+    means = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+    overall = sums.mean(axis=0)
+    index = np.divide(means, overall, out=np.ones_like(means), where=(counts > 0) & (overall > 0))
+    index[index == 0] = 1
+
+    trend = linear_projection(sums / index[calendar_months], horizon)
+    return trend * index[(first + len(sums) + np.arange(horizon)) % 12]
+
+
+def project(sums, first, horizon, projection):
+    if projection == 'seasonal':
+        return seasonal_projection(sums, first, horizon)
+    return linear_projection(sums, horizon)
+
+
+def burn_rates(history, today, days=BURN_RATE_DAYS):
+    """
+    Average expense per day of each payment method over the last days,
+    today included.
+    Returns:
+        Array of cents per day, parallel to history.method_ids
+    """
+
+    mask = ~history.income & (history.days > epoch_day(today) - days) & (history.days <= epoch_day(today))
+    return np.bincount(history.methods[mask], weights=history.cents[mask],
+                       minlength=len(history.method_ids)) / days
+
+
+def to_amounts(cents):
+    return np.round(np.asarray(cents) / 100, 2).tolist()
+
+
+def forecast(user, horizon=6, projection='linear', today=None):
+    """
+    Forecasts the user's cash flow from their history: the projected balance
+    at the end of the current month, rolling averages of the expenses of each
+    category, the burn rate of each payment method and the income and
+    expenses of the next months. One-time transactions are projected from the
+    last HISTORY_MONTHS complete months, recurring ones come from their
+    schedule.
+    Args:
+        user: owner of the transactions
+        horizon: number of months to project, the current one included
+        projection: 'linear' or 'seasonal'
+        today: day of the forecast, defaults to today in the user's time zone
+    Returns:
+        JSON-ready dictionary
+    """
+
+    today = today or timezone.localdate(timezone=user.tzinfo)
+    history = load_history(user)
+
+    current = epoch_month(today)
+    first = current - HISTORY_MONTHS
+    income = monthly_sums(history, first, current, income=True)
+    expense = monthly_sums(history, first, current, income=False)
+    projected_income = project(income, first, horizon, projection)[:, 0]
+    projected_expense = project(expense, first, horizon, projection)[:, 0]
+
+    # The current month: what was recorded so far, plus the share of the
+    # projected month for the days left, plus what is scheduled
+    this_month = month_start(current)
+    next_month = month_start(current + 1)
+    tomorrow = today + timedelta(days=1)
+    left = (next_month - tomorrow).days / calendar.monthrange(today.year, today.month)[1]
+    months = months_of(history.days)
+    recorded = (months == current) & (history.days <= epoch_day(today))
+    recorded_income = int(history.cents[recorded & history.income].sum())
+    recorded_expense = int(history.cents[recorded & ~history.income].sum())
+
+    scheduled_cents = {(False, 'income'): 0, (False, 'expense'): 0, (True, 'income'): 0, (True, 'expense'): 0}
+    for occurrence in materialize(user, this_month, next_month):
+        scheduled_cents[occurrence.date > today, occurrence.transaction_type] += int(occurrence.amount * 100)
+    income_to_date = recorded_income + scheduled_cents[False, 'income']
+    expense_to_date = recorded_expense + scheduled_cents[False, 'expense']
+    income_left = projected_income[0] * left + scheduled_cents[True, 'income']
+    expense_left = projected_expense[0] * left + scheduled_cents[True, 'expense']
+
+    # Following months: projected one-time transactions plus scheduled ones
+    scheduled = monthly_projection(user, next_month, month_start(current + horizon)) if horizon > 1 else {}
+    months_ahead = [month_start(current + offset) for offset in range(horizon)]
+    scheduled_income = np.array([0] + [int(scheduled[day.year, day.month]['income'] * 100)
+                                       for day in months_ahead[1:]])
+    scheduled_expense = np.array([0] + [int(scheduled[day.year, day.month]['expense'] * 100)
+                                        for day in months_ahead[1:]])
+    month_income = projected_income + scheduled_income
+    month_expense = projected_expense + scheduled_expense
+    month_income[0] = income_to_date + income_left
+    month_expense[0] = expense_to_date + expense_left
+
+    by_category = monthly_sums(history, first, current, income=False, groups=history.categories,
+                               count=len(CATEGORIES))
+    averages = rolling_averages(by_category)
+    spent = np.flatnonzero(by_category.sum(axis=0))
+    rates = burn_rates(history, today)
+
+    return {
+        "as_of": today,
+        "projection": projection,
+        "month": {
+            "income_to_date": to_amounts(income_to_date),
+            "expense_to_date": to_amounts(expense_to_date),
+            "projected_income": to_amounts(income_to_date + income_left),
+            "projected_expense": to_amounts(expense_to_date + expense_left),
+            "projected_balance": to_amounts(income_to_date + income_left - expense_to_date - expense_left),
+        },
+        "windows": WINDOWS,
+        "categories": [CATEGORIES[code] for code in spent],
+        "category_averages": to_amounts(averages[:, spent].T),
+        "methods": [int(method_id) or None for method_id in history.method_ids],
+        "burn_rate": to_amounts(rates),
+        "months": [day.strftime('%Y-%m') for day in months_ahead],
+        "income": to_amounts(month_income),
+        "expense": to_amounts(month_expense),
+    }
@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .analytics import HISTORY_MONTHS
+from .models import ArchivedTransaction, Transaction, User, archiving, batched_writes
+
+BATCH_SIZE = 1000
+
+# Forecasts read the last HISTORY_MONTHS complete months from Transaction, so
+# younger transactions are never archived
+MIN_ARCHIVE_MONTHS = HISTORY_MONTHS + 1
+
+
+def archive_cutoff(user, months, today=None):
+    """
+    Returns the start of the month `months` months before the current one, in
+    the user's time zone. Archiving whole local months moves every one-time
+    transaction of the rollup buckets before it.
+    """
+
+    today = today or timezone.localdate(timezone=user.tzinfo)
+    index = today.year * 12 + today.month - 1 - months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=user.tzinfo)
+
+
+def archive_transactions(user, before, batch_size=BATCH_SIZE):
+    """
+    Moves the user's one-time transactions dated before a cutoff to
+    ArchivedTransaction, one database transaction per batch. Recurring
+    transactions are the templates of future occurrences and stay. The
+    rollups are left as they are, so they carry the archived totals forward;
+    the moved rows are logged as deleted for synced clients.
+    Args:
+        user: owner of the transactions
+        before: aware datetime, transactions dated before it are archived
+        batch_size: number of transactions moved per database transaction
+    Returns:
+        Number of transactions archived
+    """
+
+    fields = [(field, ArchivedTransaction._meta.get_field(field).attname)
+              for field in ArchivedTransaction.COPIED_FIELDS]
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Transaction.objects
+                        .filter(userID=user, repeat_interval='none', date__lt=before)
+                        .order_by('id')
+                        .values(*ArchivedTransaction.COPIED_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ArchivedTransaction.objects.bulk_create([
+                ArchivedTransaction(**{attname: row[field] for field, attname in fields}) for row in rows
+            ])
+            with archiving(), batched_writes():
+                Transaction.objects.filter(id__in=[row['id'] for row in rows]).delete()
+            # Committed with the first batch, so reads look in the archive
+            # even if a later batch fails
+            if user.archived_before is None or user.archived_before < before:
+                User.objects.filter(pk=user.pk).update(archived_before=before)
+                user.archived_before = before
+            moved += len(rows)
+
+    return moved
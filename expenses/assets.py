@@ -0,0 +1,183 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# Text formats worth precompressing. Images and fonts are compressed already.
+COMPRESSIBLE = {'.js', '.css', '.map', '.json', '.svg', '.html', '.txt'}
+
+# Encodings in order of preference, with the suffix of their files
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Compressed variants saving less than this fraction are not written
+MIN_SAVING = 0.05
+
+# Names written by hashed_name(), with or without an extension
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}(\.[^./]+)?$')
+
+# Served with every built file. Names change with their content, so a file
+# can be cached for a year without ever being revalidated.
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_manifest_cache = {}
+
+
+def hashed_name(name, content):
+    """
+    Inserts the first 12 hex digits of the content's MD5 before the extension:
+    expenses/app.js becomes expenses/app.0123456789ab.js.
+    """
+
+    root, extension = os.path.splitext(name)
+    return f'{root}.{hashlib.md5(content).hexdigest()[:12]}{extension}'
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=11)
+    # mtime=0 keeps the output identical between builds of the same content
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def source_files():
+    """
+    Every static file the staticfiles finders know of, as (name, absolute
+    path), the first finder winning like in collectstatic.
+    """
+
+    found = {}
+    for finder in get_finders():
+        for name, storage in finder.list([]):
+            found.setdefault(name.replace(os.sep, '/'), storage.path(name))
+    return sorted(found.items())
+
+
+def write_file(path, content):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+
+
+def build():
+    """
+    Writes a content-hashed copy of every static file under
+    settings.STATIC_BUILD_ROOT, with Brotli (when the brotli package is
+    installed) and gzip variants of text files, then the manifest mapping
+    source names to hashed ones. Files of earlier builds are kept, so pages
+    rendered before a deploy still load.
+    Returns:
+        The manifest
+    """
+
+    root = Path(settings.STATIC_BUILD_ROOT)
+    encodings = [(encoding, suffix) for encoding, suffix in ENCODINGS if encoding != 'br' or brotli]
+    manifest = {'files': {}, 'encodings': {}}
+
+    for name, path in source_files():
+        content = Path(path).read_bytes()
+        hashed = hashed_name(name, content)
+        write_file(root / hashed, content)
+        manifest['files'][name] = hashed
+
+        if os.path.splitext(name)[1] not in COMPRESSIBLE:
+            continue
+        available = []
+        for encoding, suffix in encodings:
+            compressed = compress(content, encoding)
+            if len(compressed) <= len(content) * (1 - MIN_SAVING):
+                write_file(root / (hashed + suffix), compressed)
+                available.append(encoding)
+        if available:
+            manifest['encodings'][hashed] = available
+
+    # Replaced in one step so a running server never reads half a manifest
+    temporary = root / (MANIFEST_NAME + '.tmp')
+    write_file(temporary, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    os.replace(temporary, root / MANIFEST_NAME)
+    return manifest
+
+
+def load_manifest():
+    """
+    Returns the manifest of the last build, or None if nothing was built. It
+    is read again only when the file changes.
+    """
+
+    path = Path(settings.STATIC_BUILD_ROOT) / MANIFEST_NAME
+    try:
+        modified = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != modified:
+        cached = (modified, json.loads(path.read_bytes()))
+        _manifest_cache[path] = cached
+    return cached[1]
+
+
+def built_name(name):
+    """
+    Hashed name of a static file in the last build, or None.
+    """
+
+    manifest = load_manifest()
+    return manifest['files'].get(name) if manifest else None
+
+
+def built_path(name):
+    """
+    Absolute path of a hashed file of the current or an earlier build, or
+    None if the name is not a hashed one, falls outside the build directory
+    or does not exist.
+    """
+
+    if not HASHED_NAME.search(name):
+        return None
+    root = Path(settings.STATIC_BUILD_ROOT).resolve()
+    path = (root / name).resolve()
+    if not path.is_relative_to(root) or not path.is_file():
+        return None
+    return path
+
+
+def accepted_encodings(header):
+    """
+    Content codings allowed by an Accept-Encoding header, ignoring q=0 ones.
+    """
+
+    accepted = set()
+    for item in header.split(','):
+        coding, _, parameters = item.strip().partition(';')
+        quality = parameters.strip().removeprefix('q=')
+        try:
+            if parameters and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def choose_encoding(path, header):
+    """
+    Returns (encoding, file suffix) of the best precompressed variant of a
+    built file the client accepts, or (None, '') for the file itself.
+    Variants are looked up on disk, so files of earlier builds keep theirs.
+    """
+
+    accepted = accepted_encodings(header)
+    for encoding, suffix in ENCODINGS:
+        if (encoding in accepted or '*' in accepted) and path.with_name(path.name + suffix).is_file():
+            return encoding, suffix
+    return None, ''
@@ -0,0 +1,126 @@
+from functools import wraps
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from . import dashboard
+from .cache import cached_response
+from .models import PaymentMethod
+from .pagination import InvalidCursor, akeyset_page
+from .serializers import serialize_transactions, transaction_key, transaction_rows
+from .views import (MAX_PAGE_SIZE, PAGE_SIZE, data_etag, data_last_modified, dated_data_etag,
+                    filter_transactions)
+
+# Async versions of the read-only JSON views, for ASGI servers. They return the
+# same responses as their counterparts in views.py.
+
+
+def with_user(view):
+    """
+    Loads request.user with the async ORM. ETag functions and the views read
+    request.user directly, which would otherwise query the database
+    synchronously.
+    """
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+@login_required
+@with_user
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_data_etag)
+@cached_response('summary', dated_data_etag)
+async def user_summary(request):
+
+    """
+    Retrieves the summary of the user's financial status, running its
+    independent aggregates concurrently.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the summary
+    """
+
+    return JsonResponse(await dashboard.asummary(request.user), safe=False)
+
+
+@login_required
+@with_user
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@cached_response('list_methods', data_etag)
+async def list_methods(request):
+
+    """
+    Lists all payment methods from a user.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the payment methods
+    """
+
+    methods = PaymentMethod.objects.filter(userID=request.user).order_by('id').values(
+        'id', 'userID', 'name', 'type', 'processor')
+    return JsonResponse([method async for method in methods], safe=False)
+
+
+@login_required
+@with_user
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@cached_response('list_months', data_etag)
+async def list_months(request):
+
+    """
+    Lists all months in which the user has transactions.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the months
+    """
+
+    rows = [row async for row in dashboard.months(request.user)]
+    return JsonResponse(dashboard.serialize_months(rows), safe=False)
+
+
+@login_required
+@with_user
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@cached_response('list_transactions', data_etag)
+async def list_transactions(request):
+
+    """
+    Lists one page of the user's transactions, newest first, with the same
+    filters and cursor as views.list_transactions.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the page of transactions and the cursor of the next page
+    """
+
+    try:
+        transaction_list = transaction_rows(filter_transactions(request.user, request.GET))
+
+        limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError(limit)
+
+        page, next_cursor = await akeyset_page(transaction_list, request.GET.get('cursor', ''), limit,
+                                               key=transaction_key)
+
+        return JsonResponse({
+            "transactions": serialize_transactions(page),
+            "next_cursor": next_cursor
+        })
+
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "Invalid filter value"}, status=400)
@@ -0,0 +1,213 @@
+from django.db import transaction
+
+from .importer import MethodResolver, RowError, build_transaction
+from .models import Change, MonthlyRollup, PaymentMethod, Transaction, batched_writes, touch_users
+
+ACTIONS = {'create', 'update', 'delete'}
+MODELS = {'transaction', 'method'}
+
+METHOD_TYPES = {value for value, _ in PaymentMethod.METHOD_TYPES}
+CARD_PROCESSORS = {value for value, _ in PaymentMethod.CARD_PROCESSORS}
+
+TRANSACTION_FIELDS = ['payment_methodID', 'transaction_type', 'category', 'amount', 'date',
+                      'repeat_interval', 'repeat_until', 'description', 'merchant']
+
+
+class BatchError(Exception):
+    """
+    Raised to roll back a batch when any of its operations is invalid.
+    """
+
+    def __init__(self, results):
+        super().__init__('Batch contains invalid operations')
+        self.results = results
+
+
+def _method_fields(data, current=None):
+    """
+    Validates payment method data, falling back to the current values for
+    fields that are not given.
+    """
+
+    fields = {
+        'name': data.get('name', current.name if current else ''),
+        'type': data.get('type', current.type if current else ''),
+        'processor': data.get('processor', current.processor if current else 'none'),
+    }
+    for field, value in fields.items():
+        if not isinstance(value, str):
+            raise RowError(f'Invalid {field}: {value}')
+    if not fields['name'].strip():
+        raise RowError('Name is required')
+    if fields['type'] not in METHOD_TYPES:
+        raise RowError(f"Invalid method type: {fields['type']}")
+    if fields['processor'] not in CARD_PROCESSORS:
+        raise RowError(f"Invalid processor: {fields['processor']}")
+    return fields
+
+
+def _transaction_row(data, current):
+    """
+    Merges partial update data over a transaction, in the format read by
+    build_transaction.
+    """
+
+    row = {
+        'type': current.transaction_type,
+        'category': current.category,
+        'amount': current.amount,
+        'date': current.date.isoformat(),
+        'repeat_interval': current.repeat_interval,
+        'repeat_until': current.repeat_until.isoformat() if current.repeat_until else None,
+        'description': current.description,
+        'merchant': current.merchant,
+        'methodID': current.payment_methodID_id or '',
+    }
+    row.update(data)
+    return row
+
+
+def apply_operations(user, operations):
+    """
+    Applies a list of create, update and delete operations on the user's
+    transactions and payment methods in a single database transaction, using
+    set-based inserts, updates and deletes. Nothing is saved if any operation
+    is invalid.
+    Args:
+        user: owner of the rows
+        operations: list of {"action", "model", "id", "data"} dictionaries
+    Returns:
+        List with one result per operation
+    """
+
+    results = [{"index": index, "status": "ok"} for index in range(len(operations))]
+    failed = False
+
+    def fail(index, message):
+        nonlocal failed
+        failed = True
+        results[index] = {"index": index, "status": "error", "error": message}
+
+    # Group the operations so each kind is applied with a single statement
+    grouped = {(model, action): [] for model in MODELS for action in ACTIONS}
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            fail(index, 'Operation must be an object')
+        elif not isinstance(operation.get('model'), str) or not isinstance(operation.get('action'), str) \
+                or operation['model'] not in MODELS or operation['action'] not in ACTIONS:
+            fail(index, 'Unknown model or action')
+        elif operation['action'] != 'create' and not isinstance(operation.get('id'), int):
+            fail(index, 'An integer id is required')
+        elif not isinstance(operation.get('data', {}), dict):
+            fail(index, 'Data must be an object')
+        else:
+            grouped[operation['model'], operation['action']].append((index, operation))
+
+    with transaction.atomic():
+        methods = {method.id: method for method in PaymentMethod.objects.filter(userID=user)}
+        names = {method.name for method in methods.values()}
+
+        new_methods = []
+        for index, operation in grouped['method', 'create']:
+            try:
+                fields = _method_fields(operation.get('data', {}))
+                if fields['name'] in names:
+                    raise RowError('Payment method already exists')
+            except RowError as error:
+                fail(index, str(error))
+                continue
+            names.add(fields['name'])
+            new_methods.append((index, PaymentMethod(userID=user, **fields)))
+
+        changed_methods = []
+        for index, operation in grouped['method', 'update']:
+            method = methods.get(operation['id'])
+            try:
+                if method is None:
+                    raise RowError('Method does not exist')
+                fields = _method_fields(operation.get('data', {}), method)
+                if fields['name'] != method.name and fields['name'] in names:
+                    raise RowError('Payment method already exists')
+            except RowError as error:
+                fail(index, str(error))
+                continue
+            names.discard(method.name)
+            names.add(fields['name'])
+            for field, value in fields.items():
+                setattr(method, field, value)
+            changed_methods.append((index, method))
+
+        deleted_methods = []
+        for index, operation in grouped['method', 'delete']:
+            if operation['id'] not in methods:
+                fail(index, 'Method does not exist')
+            else:
+                deleted_methods.append((index, operation['id']))
+
+        PaymentMethod.objects.bulk_create([method for _, method in new_methods])
+        PaymentMethod.objects.bulk_update([method for _, method in changed_methods], ['name', 'type', 'processor'])
+        Change.record([(user.id, 'method', method.id, False) for _, method in new_methods + changed_methods])
+        for index, method in new_methods + changed_methods:
+            results[index]["id"] = method.id
+
+        # Methods created above can be referenced by name
+        resolver = MethodResolver(user)
+        ids = {operation['id'] for action in ('update', 'delete') for _, operation in grouped['transaction', action]}
+        transactions = {item.id: item for item in Transaction.objects.filter(userID=user, id__in=ids)}
+
+        new_transactions = []
+        for index, operation in grouped['transaction', 'create']:
+            try:
+                new_transactions.append((index, build_transaction(user, operation.get('data', {}), resolver)))
+            except RowError as error:
+                fail(index, str(error))
+
+        changed_transactions = []
+        previous = []
+        for index, operation in grouped['transaction', 'update']:
+            current = transactions.get(operation['id'])
+            try:
+                if current is None:
+                    raise RowError('Transaction does not exist')
+                updated = build_transaction(user, _transaction_row(operation.get('data', {}), current), resolver)
+            except RowError as error:
+                fail(index, str(error))
+                continue
+            previous.append(current.snapshot())
+            for field in TRANSACTION_FIELDS:
+                attname = Transaction._meta.get_field(field).attname
+                setattr(current, attname, getattr(updated, attname))
+            changed_transactions.append((index, current))
+
+        deleted_transactions = []
+        for index, operation in grouped['transaction', 'delete']:
+            if operation['id'] not in transactions:
+                fail(index, 'Transaction does not exist')
+            else:
+                deleted_transactions.append((index, operation['id']))
+
+        if failed:
+            raise BatchError(results)
+
+        with batched_writes():
+            Transaction.objects.bulk_create([item for _, item in new_transactions])
+            Transaction.objects.bulk_update([item for _, item in changed_transactions], TRANSACTION_FIELDS)
+            # Bulk inserts and updates skip the save signals
+            MonthlyRollup.apply(removed=previous,
+                                added=[item.snapshot() for _, item in new_transactions + changed_transactions])
+            Change.record([(user.id, 'transaction', item.id, False)
+                           for _, item in new_transactions + changed_transactions])
+            touch_users({user.id})
+            Transaction.objects.filter(userID=user, id__in=[pk for _, pk in deleted_transactions]).delete()
+        for index, item in new_transactions + changed_transactions:
+            results[index]["id"] = item.id
+        for index, pk in deleted_transactions:
+            results[index]["id"] = pk
+
+        # Methods go last so transactions moved away from them keep their method
+        with batched_writes():
+            PaymentMethod.objects.filter(userID=user, id__in=[pk for _, pk in deleted_methods]).delete()
+        for index, pk in deleted_methods:
+            results[index]["id"] = pk
+
+    return results
@@ -0,0 +1,131 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a list of numbers.
+    """
+
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(fraction * len(ordered) + 0.5) - 1))
+    return ordered[rank]
+
+
+def latency_stats(latencies):
+    """
+    Summarizes latencies in seconds as rounded millisecond percentiles.
+    """
+
+    return {
+        'requests': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+    }
+
+
+@contextmanager
+def test_environment():
+    """
+    Lets the test client reach the views outside of the test runner. Does
+    nothing when the test environment is already set up.
+    """
+
+    try:
+        setup_test_environment()
+    except RuntimeError:
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        teardown_test_environment()
+
+
+def read_response(response):
+    """
+    Consumes a response, including streamed ones, and returns its size.
+    """
+
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting statements and timing them with
+    perf_counter. The times CaptureQueriesContext records are rounded to the
+    millisecond, too coarse for queries of a few hundred microseconds.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def measure(send, repeat, prepare=None):
+    """
+    Times a request several times and records the SQL it runs. Memory is
+    traced in a separate run so tracing does not slow the timed ones.
+    Args:
+        send: function sending one request and returning the response
+        repeat: number of timed requests
+        prepare: optional function run untimed before each request, its
+                 result is passed to send
+    Returns:
+        Dictionary of latency percentiles, query count, SQL time, peak memory
+        and the status codes seen
+    """
+
+    latencies = []
+    queries = []
+    sql_times = []
+    statuses = set()
+    prepare = prepare or (lambda: None)
+    for _ in range(repeat):
+        prepared = prepare()
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            response = send(prepared)
+            read_response(response)
+            latencies.append(time.perf_counter() - started)
+        statuses.add(response.status_code)
+        queries.append(timer.count)
+        sql_times.append(timer.seconds)
+
+    tracemalloc.start()
+    try:
+        prepared = prepare()
+        tracemalloc.reset_peak()
+        read_response(send(prepared))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        **latency_stats(latencies),
+        'queries': percentile(queries, 0.50),
+        'max_queries': max(queries),
+        'sql_ms': round(percentile(sql_times, 0.50) * 1000, 3),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'status': sorted(statuses),
+    }
@@ -0,0 +1,162 @@
+import hashlib
+import threading
+from collections import Counter
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.core.cache import caches
+from django.http import HttpResponse
+
+CACHE_ALIAS = 'expenses'
+
+
+# Hits and misses are counted in each process and added to the shared
+# counters every STATS_FLUSH_EVERY requests, so counting costs no cache round
+# trip on the others
+STATS_FLUSH_EVERY = 100
+
+_pending_counts = Counter()
+_pending_total = 0
+_pending_lock = threading.Lock()
+
+
+def result_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _take_counts(view_name, outcome):
+    """
+    Counts a hit or miss in this process. Returns the pending counts once
+    STATS_FLUSH_EVERY of them were taken, for the caller to add to the shared
+    counters, and None otherwise.
+    """
+
+    global _pending_total
+    with _pending_lock:
+        _pending_counts[view_name, outcome] += 1
+        _pending_total += 1
+        if _pending_total < STATS_FLUSH_EVERY:
+            return None
+        counts = dict(_pending_counts)
+        _pending_counts.clear()
+        _pending_total = 0
+        return counts
+
+
+def _count(view_name, outcome):
+    counts = _take_counts(view_name, outcome)
+    if counts is None:
+        return
+    cache = result_cache()
+    for (name, counted), delta in counts.items():
+        key = f'stats:{name}:{counted}'
+        # add() is a no-op when the counter exists, incr() then updates it in place
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            # The counter was evicted between add() and incr()
+            cache.add(key, delta, timeout=None)
+
+
+async def _acount(view_name, outcome):
+    counts = _take_counts(view_name, outcome)
+    if counts is None:
+        return
+    cache = result_cache()
+    for (name, counted), delta in counts.items():
+        key = f'stats:{name}:{counted}'
+        await cache.aadd(key, 0, timeout=None)
+        try:
+            await cache.aincr(key, delta)
+        except ValueError:
+            await cache.aadd(key, delta, timeout=None)
+
+
+def clear_cache_stats():
+    """
+    Forgets the counts of this process not added to the shared counters yet.
+    """
+
+    global _pending_total
+    with _pending_lock:
+        _pending_counts.clear()
+        _pending_total = 0
+
+
+def cache_stats(view_names):
+    """
+    Returns the hit and miss counters of the given cached views: the shared
+    ones plus the counts of this process not added to them yet.
+    """
+
+    cache = result_cache()
+    counters = cache.get_many([f'stats:{name}:{outcome}' for name in view_names for outcome in ('hits', 'misses')])
+    with _pending_lock:
+        pending = dict(_pending_counts)
+    return {
+        name: {outcome: counters.get(f'stats:{name}:{outcome}', 0) + pending.get((name, outcome), 0)
+               for outcome in ('hits', 'misses')}
+        for name in view_names
+    }
+
+
+def cached_response(view_name, version_func):
+    """
+    Caches successful GET responses of a view per user, per query string and
+    per data version. Writes bump the version, so stale entries are never read
+    again and simply age out of the bounded cache. Works on sync and async
+    views.
+    Args:
+        view_name: name used in cache keys and hit/miss counters
+        version_func: function of the request returning the version of the
+                      data the response depends on, such as its ETag function
+    """
+
+    def cache_key(request):
+        query = hashlib.md5(request.META.get('QUERY_STRING', '').encode()).hexdigest()
+        return f'response:{view_name}:{request.user.pk}:{version_func(request)}:{query}'
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != 'GET':
+                    return await view(request, *args, **kwargs)
+
+                key = cache_key(request)
+                cache = result_cache()
+                cached = await cache.aget(key)
+                if cached is not None:
+                    await _acount(view_name, 'hits')
+                    content, content_type = cached
+                    return HttpResponse(content, content_type=content_type)
+
+                await _acount(view_name, 'misses')
+                response = await view(request, *args, **kwargs)
+                if response.status_code == 200 and not response.streaming:
+                    await cache.aset(key, (response.content, response['Content-Type']))
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            key = cache_key(request)
+            cache = result_cache()
+            cached = cache.get(key)
+            if cached is not None:
+                _count(view_name, 'hits')
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+
+            _count(view_name, 'misses')
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']))
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,212 @@
+import asyncio
+import calendar
+from datetime import date, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import Budget, BudgetAlert, CategorySpend, MonthlyRollup, PaymentMethod, Transaction
+from .pagination import keyset_page
+from .schedule import monthly_projection
+from .serializers import METHOD_COLUMNS, serialize_transactions, transaction_key, transaction_rows
+
+
+def current_month(user):
+    """
+    Returns the (year, month) of the current date in the user's time zone.
+    """
+
+    today = timezone.localdate(timezone=user.tzinfo)
+    return today.year, today.month
+
+
+# Aggregates of month_totals()
+MONTH_TOTALS = {
+    'income': Sum('total', filter=Q(transaction_type='income')),
+    'variable_expense': Sum('total', filter=Q(transaction_type='expense')),
+}
+
+
+def month_totals(user, year, month):
+    """
+    Rollup rows of the user's one-time transactions in a month, to aggregate
+    with MONTH_TOTALS.
+    """
+
+    return MonthlyRollup.objects.filter(userID=user, year=year, month=month, repeat_interval='none')
+
+
+def method_balances(user):
+    """
+    (name, income, expense) of each payment method, in a single grouped query.
+    """
+
+    return PaymentMethod.objects.filter(userID=user).annotate(
+        income=Sum('monthlyrollup__total', filter=Q(monthlyrollup__transaction_type='income')),
+        expense=Sum('monthlyrollup__total', filter=Q(monthlyrollup__transaction_type='expense'))
+    ).values_list('name', 'income', 'expense')
+
+
+def scheduled_totals(user, year, month):
+    """
+    Income and expense of the user's recurring transactions in a month.
+    """
+
+    month_start = date(year, month, 1)
+    month_end = month_start + timedelta(days=calendar.monthrange(year, month)[1])
+    return monthly_projection(user, month_start, month_end)[year, month]
+
+
+def build_summary(totals, scheduled, balances):
+    """
+    Combines the pieces of the summary. One-time transactions come from the
+    rollups, recurring ones from their schedule for the month.
+    """
+
+    income_amount = (totals['income'] or 0) + scheduled['income']
+    variable_expense_amount = totals['variable_expense'] or 0
+    fixed_expense_amount = scheduled['expense']
+    expense_amount = fixed_expense_amount + variable_expense_amount
+    balance = income_amount - expense_amount
+
+    return {
+        'balance': float(balance),
+        'income_amount': float(income_amount),
+        'expense_amount': float(expense_amount),
+        'fixed_expense_amount': float(fixed_expense_amount),
+        'variable_expense_amount': float(variable_expense_amount),
+        'payment_method_balances': {
+            name: float((method_income or 0) - (method_expense or 0))
+            for name, method_income, method_expense in balances
+        }
+    }
+
+
+def summary(user):
+    """
+    Returns the summary of the user's financial status for the current month.
+    """
+
+    year, month = current_month(user)
+    return build_summary(month_totals(user, year, month).aggregate(**MONTH_TOTALS),
+                         scheduled_totals(user, year, month),
+                         method_balances(user))
+
+
+async def asummary(user):
+    """
+    Async summary. The totals, the schedule and the method balances do not
+    depend on each other, so they are requested concurrently.
+    """
+
+    year, month = current_month(user)
+
+    async def balances():
+        return [row async for row in method_balances(user)]
+
+    totals, scheduled, rows = await asyncio.gather(
+        month_totals(user, year, month).aaggregate(**MONTH_TOTALS),
+        sync_to_async(scheduled_totals)(user, year, month),
+        balances(),
+    )
+    return build_summary(totals, scheduled, rows)
+
+
+def months(user):
+    """
+    Every month in which the user has transactions, newest first. Each one has
+    at least one rollup bucket, already computed in the user's time zone.
+    """
+
+    return (MonthlyRollup.objects.filter(userID=user)
+            .values_list('year', 'month')
+            .distinct()
+            .order_by('-year', '-month'))
+
+
+def serialize_months(rows):
+    return [{"month": calendar.month_name[month], "year": year} for year, month in rows]
+
+
+def bootstrap(user, limit):
+    """
+    Builds everything the dashboard shows on load: the summary, the payment
+    methods, the month list and the first page of transactions. Rollups are
+    read once for both the month list and the month totals, and methods once
+    for both the method list and their balances.
+    Args:
+        user: owner of the data
+        limit: number of transactions in the first page
+    Returns:
+        JSON-ready dictionary
+    """
+
+    year, month = current_month(user)
+
+    one_time = Q(repeat_interval='none')
+    rollups = (MonthlyRollup.objects.filter(userID=user)
+               .values_list('year', 'month')
+               .annotate(income=Sum('total', filter=one_time & Q(transaction_type='income')),
+                         variable_expense=Sum('total', filter=one_time & Q(transaction_type='expense')))
+               .order_by('-year', '-month'))
+    totals = {'income': None, 'variable_expense': None}
+    month_rows = []
+    for row_year, row_month, income, variable_expense in rollups:
+        month_rows.append((row_year, row_month))
+        if (row_year, row_month) == (year, month):
+            totals = {'income': income, 'variable_expense': variable_expense}
+
+    methods = []
+    balances = []
+    for *columns, income, expense in method_balances(user).order_by('id').values_list(*METHOD_COLUMNS, 'income',
+                                                                                      'expense'):
+        method = dict(zip(['id', 'userID', 'name', 'type', 'processor'], columns))
+        methods.append(method)
+        balances.append((method['name'], income, expense))
+
+    page, next_cursor = keyset_page(transaction_rows(Transaction.objects.filter(userID=user)), '', limit,
+                                    key=transaction_key)
+
+    return {
+        "summary": build_summary(totals, scheduled_totals(user, year, month), balances),
+        "methods": methods,
+        "months": serialize_months(month_rows),
+        "transactions": {
+            "transactions": serialize_transactions(page),
+            "next_cursor": next_cursor
+        }
+    }
+
+
+def budget_status(user, year, month):
+    """
+    Spending of each of the user's budgets in a month, read from the category
+    spend counters, with the thresholds already reached.
+    Args:
+        user: owner of the budgets
+        year: year of the month
+        month: month number
+    Returns:
+        JSON-ready list with one entry per budget
+    """
+
+    spent = dict(CategorySpend.objects.filter(userID=user, year=year, month=month)
+                 .values_list('category', 'total'))
+    reached = {}
+    for budget_id, threshold in (BudgetAlert.objects.filter(budgetID__userID=user, year=year, month=month)
+                                 .order_by('threshold').values_list('budgetID', 'threshold')):
+        reached.setdefault(budget_id, []).append(threshold)
+
+    status = []
+    for budget in Budget.objects.filter(userID=user).order_by('category'):
+        total = spent.get(budget.category, Decimal('0.00'))
+        status.append({
+            **budget.serialize(),
+            "spent": str(total),
+            "remaining": str(budget.amount - total),
+            "percent": round(float(total / budget.amount * 100), 1) if budget.amount else None,
+            "alerts": reached.get(budget.id, []),
+        })
+    return status
@@ -0,0 +1,116 @@
+import csv
+import heapq
+import json
+from itertools import islice
+from operator import itemgetter
+
+from .models import ArchivedTransaction, Transaction
+
+CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('type', 'transaction_type'),
+    ('category', 'category'),
+    ('amount', 'amount'),
+    ('repeat_interval', 'repeat_interval'),
+    ('methodID', 'payment_methodID'),
+    ('methodName', 'payment_methodID__name'),
+    ('repeat_until', 'repeat_until'),
+    ('description', 'description'),
+    ('merchant', 'merchant'),
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class Echo:
+    """
+    File-like object that hands back what is written to it, so csv.writer
+    can format rows without buffering them.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_rows(user, include_archived=False):
+    """
+    Streams the user's full transaction history oldest first as plain tuples,
+    reading the database in chunks instead of loading every row at once.
+    Args:
+        user: owner of the transactions
+        include_archived: also export the archived transactions, merged in
+                          date order
+    Returns:
+        Iterator of tuples ordered like EXPORT_FIELDS
+    """
+
+    columns = [column for _, column in EXPORT_FIELDS]
+
+    def ordered(model):
+        return (model.objects.filter(userID=user)
+                .order_by('date', 'id')
+                .values_list(*columns)
+                .iterator(chunk_size=CHUNK_SIZE))
+
+    rows = ordered(Transaction)
+    if include_archived and user.archived_before:
+        rows = heapq.merge(rows, ordered(ArchivedTransaction), key=itemgetter(1, 0))
+    for (transaction_id, date, transaction_type, category, amount,
+         repeat_interval, method_id, method_name, repeat_until, description, merchant) in rows:
+        # dates and amounts are formatted the same way for both formats
+        yield (transaction_id, date.isoformat(), transaction_type, category, str(amount),
+               repeat_interval, method_id, method_name, repeat_until.isoformat() if repeat_until else None,
+               description, merchant)
+
+
+def _chunks(lines):
+    """
+    Groups formatted lines so the response is sent in reasonably sized pieces.
+    """
+
+    lines = iter(lines)
+    while chunk := ''.join(islice(lines, CHUNK_SIZE)):
+        yield chunk
+
+
+def stream_csv(rows):
+    """
+    Formats export rows as CSV, header first.
+    """
+
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in EXPORT_FIELDS])
+    yield from _chunks(writer.writerow(row) for row in rows)
+
+
+def stream_ndjson(rows):
+    """
+    Formats export rows as newline-delimited JSON objects.
+    """
+
+    names = [name for name, _ in EXPORT_FIELDS]
+    yield from _chunks(json.dumps(dict(zip(names, row))) + '\n' for row in rows)
+
+
+def stream_export(user, export_format, include_archived=False):
+    """
+    Returns a generator with the user's history in the requested format.
+    Args:
+        user: owner of the transactions
+        export_format: 'csv' or 'ndjson'
+        include_archived: also export the archived transactions
+    Returns:
+        Generator of strings
+    """
+
+    if export_format == 'csv':
+        return stream_csv(export_rows(user, include_archived))
+    if export_format == 'ndjson':
+        return stream_ndjson(export_rows(user, include_archived))
+    raise ValueError(f'Unknown export format: {export_format}')
@@ -0,0 +1,248 @@
+import csv
+import io
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Change, MonthlyRollup, PaymentMethod, Transaction, touch_users
+
+BATCH_SIZE = 1000
+
+TRANSACTION_TYPES = {value for value, _ in Transaction.TRANSACTION_TYPES}
+CATEGORIES = {value for value, _ in Transaction.CATEGORIES}
+TIME_INTERVALS = {value for value, _ in Transaction.TIME_INTERVALS}
+
+# Largest amount that fits in Transaction.amount (max_digits=10, decimal_places=2)
+MAX_AMOUNT = Decimal('99999999.99')
+
+
+class RowError(ValueError):
+    pass
+
+
+class MethodResolver:
+    """
+    Resolves payment methods by id or case-insensitive name from a single
+    preloaded map of the user's methods.
+    """
+
+    def __init__(self, user):
+        self.ids = set()
+        self.by_name = {}
+        for method_id, name in PaymentMethod.objects.filter(userID=user).values_list('id', 'name'):
+            self.ids.add(method_id)
+            self.by_name[name.lower()] = method_id
+
+    def resolve(self, row):
+        """
+        Returns the id of the method referenced by a row, or None if the row
+        references no method.
+        """
+
+        method_id = row.get('methodID') or ''
+        name = row.get('methodName') or ''
+        method = row.get('method') or ''
+        if method:
+            if str(method).isdigit():
+                method_id = method
+            else:
+                name = method
+
+        # Names win over ids so files exported from another account still match
+        if str(name).strip():
+            try:
+                return self.by_name[str(name).strip().lower()]
+            except KeyError:
+                raise RowError(f'Unknown payment method: {name}')
+        if str(method_id).strip():
+            if not str(method_id).strip().isdigit() or int(method_id) not in self.ids:
+                raise RowError(f'Unknown payment method id: {method_id}')
+            return int(method_id)
+        return None
+
+
+def text_value(row, field, default=''):
+    """
+    Returns a string field of a row, or the default when it is missing or
+    empty. JSON rows may hold any type, so other values are row errors.
+    """
+
+    value = row.get(field)
+    if value is None or value == '':
+        return default
+    if not isinstance(value, str):
+        raise RowError(f'Invalid {field}: {value}')
+    return value
+
+
+def parse_amount(value):
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise RowError(f'Invalid amount: {value}')
+    if not amount.is_finite() or amount < 0 or amount > MAX_AMOUNT:
+        raise RowError(f'Invalid amount: {value}')
+    return amount.quantize(Decimal('0.01'))
+
+
+def parse_text(value, field):
+    """
+    Strips a free text field and checks it fits its column.
+    """
+
+    if value is not None and not isinstance(value, str):
+        raise RowError(f'Invalid {field}: {value}')
+    text = (value or '').strip()
+    max_length = Transaction._meta.get_field(field).max_length
+    if len(text) > max_length:
+        raise RowError(f'{field.capitalize()} is longer than {max_length} characters')
+    return text
+
+
+def parse_repeat_until(value):
+    """
+    Parses the optional ISO end date of a recurring transaction.
+    """
+
+    if value is None or value == '':
+        return None
+    try:
+        day = parse_date(value) if isinstance(value, str) else None
+    except ValueError:
+        day = None
+    if day is None:
+        raise RowError(f'Invalid repeat until date: {value}')
+    return day
+
+
+def parse_when(value, tzinfo):
+    """
+    Parses an ISO date or datetime. Values without a time zone are taken in the
+    user's time zone, and plain dates at midnight.
+    """
+
+    if not value:
+        return timezone.now()
+
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(value)
+            parsed = datetime.combine(day, time())
+    except ValueError:
+        raise RowError(f'Invalid date: {value}')
+
+    if timezone.is_naive(parsed):
+        parsed = parsed.replace(tzinfo=tzinfo)
+    return parsed
+
+
+def transaction_fields(row, tzinfo):
+    """
+    Validates the fields of a transaction row other than its payment method.
+    Args:
+        row: dictionary with type, category, amount and optional date,
+             repeat_interval, repeat_until, description and merchant
+        tzinfo: time zone of dates without one
+    Returns:
+        Dictionary of Transaction field values
+    """
+
+    transaction_type = text_value(row, 'type')
+    if transaction_type not in TRANSACTION_TYPES:
+        raise RowError(f'Invalid type: {transaction_type}')
+
+    category = text_value(row, 'category')
+    if category not in CATEGORIES:
+        raise RowError(f'Invalid category: {category}')
+
+    repeat_interval = text_value(row, 'repeat_interval', 'none')
+    if repeat_interval not in TIME_INTERVALS:
+        raise RowError(f'Invalid repeat interval: {repeat_interval}')
+
+    return {
+        'transaction_type': transaction_type,
+        'category': category,
+        'amount': parse_amount(row.get('amount', '')),
+        'date': parse_when(text_value(row, 'date'), tzinfo),
+        'repeat_interval': repeat_interval,
+        'repeat_until': parse_repeat_until(row.get('repeat_until')),
+        'description': parse_text(row.get('description'), 'description'),
+        'merchant': parse_text(row.get('merchant'), 'merchant'),
+    }
+
+
+def build_transaction(user, row, methods):
+    """
+    Validates an imported row and turns it into an unsaved Transaction.
+    Args:
+        user: owner of the transaction
+        row: dictionary with the fields read by transaction_fields and an
+             optional method (id or name)
+        methods: MethodResolver of the user
+    Returns:
+        Transaction instance
+    """
+
+    if not isinstance(row, dict):
+        raise RowError('Row must be an object')
+
+    fields = transaction_fields(row, user.tzinfo)
+    return Transaction(userID=user, payment_methodID_id=methods.resolve(row), **fields)
+
+
+def read_csv(file):
+    """
+    Reads an uploaded or opened binary CSV file as dictionaries keyed by header.
+    """
+
+    return csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+
+
+def import_transactions(user, rows, batch_size=BATCH_SIZE):
+    """
+    Validates and inserts transactions in batches inside a single database
+    transaction. Invalid rows are skipped and reported.
+    Args:
+        user: owner of the transactions
+        rows: iterable of dictionaries, as read from JSON or CSV
+        batch_size: number of rows per INSERT
+    Returns:
+        Tuple of (number of transactions created, list of row errors)
+    """
+
+    methods = MethodResolver(user)
+    created = 0
+    errors = []
+    batch = []
+    # bulk_create skips the save signals, so rollups, category spend, the
+    # change log and the data version are updated here
+    rollup_deltas = {}
+
+    def flush():
+        Transaction.objects.bulk_create(batch, batch_size=batch_size)
+        MonthlyRollup.deltas(added=[item.snapshot() for item in batch], into=rollup_deltas)
+        Change.record([(user.id, 'transaction', item.id, False) for item in batch])
+        batch.clear()
+
+    with transaction.atomic():
+        for number, row in enumerate(rows, start=1):
+            try:
+                batch.append(build_transaction(user, row, methods))
+            except RowError as error:
+                errors.append({"row": number, "error": str(error)})
+                continue
+
+            created += 1
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        MonthlyRollup.apply_deltas(rollup_deltas)
+        touch_users({user.id})
+
+    return created, errors
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.archive import BATCH_SIZE, MIN_ARCHIVE_MONTHS, archive_cutoff, archive_transactions
+from expenses.models import User
+
+
+class Command(BaseCommand):
+    help = ("Moves one-time transactions older than a number of months to the archive table. "
+            "Rollups keep their totals, so summaries do not change.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=24,
+                            help='Archive transactions dated before the start of the month this many months ago')
+        parser.add_argument('--user', help='Only process the given username')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['months'] < MIN_ARCHIVE_MONTHS:
+            raise CommandError(f'Transactions of the last {MIN_ARCHIVE_MONTHS} months feed the forecasts '
+                               'and cannot be archived')
+
+        users = User.objects.order_by('id')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} does not exist")
+
+        total = 0
+        for user in users.iterator():
+            moved = archive_transactions(user, archive_cutoff(user, options['months']), options['batch_size'])
+            if moved:
+                self.stdout.write(f'{user.username}: {moved} transactions archived')
+            total += moved
+        self.stdout.write(self.style.SUCCESS(f'{total} transactions archived'))
@@ -0,0 +1,224 @@
+import json
+import platform
+from datetime import date, timedelta
+from itertools import count
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+
+from expenses import urls
+from expenses.assets import built_name
+from expenses.benchmark import measure, test_environment
+from expenses.cache import result_cache
+from expenses.models import Budget, PaymentMethod, Transaction
+from expenses.synthetic import seed
+
+
+class Endpoints:
+    """
+    Builds one request per URL name of expenses/urls.py for a benchmark user.
+    Write endpoints get fresh rows to work on, created before the timer starts.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.client = Client()
+        self.client.force_login(user)
+        self.serial = count()
+        self.cash = PaymentMethod.objects.filter(userID=user, name='Cash').values_list('id', flat=True).first()
+        # Writes of food expenses check this budget's thresholds
+        Budget.objects.update_or_create(userID=user, category='food', defaults={'amount': '500.00'})
+
+    def get(self, name, params=None):
+        url = reverse(name)
+        return None, lambda _: self.client.get(url, params or {})
+
+    def post(self, name, data, prepare=None):
+        """
+        Posts JSON to an endpoint. data may be a function building the body.
+        prepare, when given, returns the URL arguments and runs before the
+        timer starts.
+        """
+
+        def send(kwargs):
+            body = data() if callable(data) else data
+            return self.client.post(reverse(name, kwargs=kwargs), json.dumps(body), content_type='application/json')
+
+        return prepare, send
+
+    def scratch_transaction(self):
+        return {'transaction_id': Transaction.objects.create(
+            userID=self.user, payment_methodID_id=self.cash, transaction_type='expense',
+            category='food', amount='9.99', repeat_interval='weekly').id}
+
+    def scratch_method(self):
+        return {'method_id': PaymentMethod.objects.create(
+            userID=self.user, name=f'Scratch {next(self.serial)}', type='debit', processor='visa').id}
+
+    def scratch_budget(self):
+        budget, _ = Budget.objects.update_or_create(userID=self.user, category='other',
+                                                    defaults={'amount': '100.00'})
+        return {'budget_id': budget.id}
+
+    def logged_in_client(self):
+        client = Client()
+        client.force_login(self.user)
+        return client
+
+    def request(self, name):
+        """
+        Returns (prepare, send) functions for one request to the named
+        endpoint, or None if the endpoint has no benchmark request yet.
+        """
+
+        transaction = {'type': 'expense', 'category': 'food', 'amount': '12.50', 'methodID': self.cash,
+                       'repeat_interval': 'none'}
+        today = date.today()
+
+        if name in ('index', 'login', 'register', 'summary', 'list_methods', 'list_months', 'cache_stats',
+                    'list_all_transactions', 'export_transactions', 'async_summary', 'async_list_methods',
+                    'async_list_months', 'list_budgets'):
+            return self.get(name)
+        if name in ('transactions', 'async_transactions', 'bootstrap'):
+            return self.get(name, {'limit': 50})
+        if name == 'asset':
+            # The built app.js, or a 404 when build_static has not run
+            path = built_name('expenses/app.js') or 'expenses/app.js'
+            return None, lambda _: self.client.get(reverse(name, args=[path]), HTTP_ACCEPT_ENCODING='gzip, br')
+        if name == 'search':
+            return self.get(name, {'q': 'groceries', 'type': 'expense', 'limit': 50})
+        if name == 'sync':
+            return self.get(name, {'cursor': 0})
+        if name == 'projection':
+            return self.get(name, {'start': today.replace(day=1).isoformat(), 'occurrences': '1'})
+        if name == 'forecast':
+            return self.get(name, {'horizon': 12, 'projection': 'seasonal'})
+        if name == 'report':
+            return self.get(name, {'bucket': 'week', 'group_by': 'category,method'})
+        if name == 'budget':
+            return self.post(name, {'category': 'shopping', 'amount': '250.00', 'alert_at': 90})
+        if name == 'delete_budget':
+            return self.post(name, {}, prepare=self.scratch_budget)
+        if name == 'logout':
+            # Logging out ends the session, so each request gets its own
+            return self.logged_in_client, lambda client: client.get(reverse(name))
+        if name == 'method':
+            return self.post(name, lambda: {'methodName': f'Bench {next(self.serial)}', 'methodType': 'debit',
+                                            'methodProcessor': 'visa'})
+        if name == 'edit_method':
+            return self.post(name, lambda: {'name': f'Bench {next(self.serial)}', 'type': 'credit',
+                                            'processor': 'visa'}, prepare=self.scratch_method)
+        if name == 'delete_method':
+            return self.post(name, {}, prepare=self.scratch_method)
+        if name == 'register_transaction':
+            return self.post(name, {'type': 'expense', 'category': 'food', 'paymentMethod': self.cash,
+                                    'amount': '12.50', 'repetition': 'none'})
+        if name == 'edit_transaction':
+            return self.post(name, {**transaction, 'amount': '15.00'}, prepare=self.scratch_transaction)
+        if name == 'delete_transaction':
+            return self.post(name, {}, prepare=self.scratch_transaction)
+        if name == 'pause_transaction':
+            return self.post(name, {'start': today.isoformat(), 'end': (today + timedelta(days=14)).isoformat()},
+                             prepare=self.scratch_transaction)
+        if name == 'import_transactions':
+            return self.post(name, [transaction] * 100)
+        if name == 'batch':
+            return self.post(name, {'operations': [
+                {'action': 'create', 'model': 'transaction', 'data': transaction} for _ in range(20)
+            ]})
+        return None
+
+
+class Command(BaseCommand):
+    help = ("Seeds synthetic users and transactions, sends requests to every endpoint and "
+            "reports latency percentiles, SQL queries, SQL time and peak memory as JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of regular users')
+        parser.add_argument('--transactions', type=int, default=200,
+                            help='Mean number of transactions of a regular user')
+        parser.add_argument('--heavy-users', type=int, default=1, help='Number of heavy-tail users')
+        parser.add_argument('--heavy-transactions', type=int, default=100000,
+                            help='Number of transactions of each heavy-tail user')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint and user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Keep the result cache between requests instead of measuring cold requests')
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help='Only measure the given URL name, can be repeated')
+        parser.add_argument('--in-place', action='store_true',
+                            help='Seed the configured database instead of a throwaway test database')
+        parser.add_argument('--output', help='Write the report to a file instead of stdout')
+
+    def handle(self, *args, **options):
+        names = [pattern.name for pattern in urls.urlpatterns]
+        unknown = set(options['endpoints'] or ()) - set(names)
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+        with test_environment():
+            if options['in_place']:
+                report = self.run(options, names)
+            else:
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                try:
+                    report = self.run(options, names)
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, options, names):
+        population = seed(users=options['users'], transactions=options['transactions'],
+                          heavy_users=options['heavy_users'], heavy_transactions=options['heavy_transactions'],
+                          seed=options['seed'])
+
+        # The regular user with the median number of rows stands for a typical one
+        regular = sorted(population['regular'], key=lambda user: Transaction.objects.filter(userID=user).count())
+        profiles = {}
+        if regular:
+            profiles['typical'] = regular[len(regular) // 2]
+        if population['heavy']:
+            profiles['heavy'] = population['heavy'][0]
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'options': {key: options[key] for key in ('users', 'transactions', 'heavy_users', 'heavy_transactions',
+                                                      'repeat', 'seed', 'warm_cache')},
+            'profiles': {},
+        }
+
+        cache = result_cache()
+        for profile, user in profiles.items():
+            endpoints = Endpoints(user)
+            results = {'transactions': Transaction.objects.filter(userID=user).count(), 'endpoints': {}}
+            for name in names:
+                if options['endpoints'] and name not in options['endpoints']:
+                    continue
+                request = endpoints.request(name)
+                if request is None:
+                    results['endpoints'][name] = {'skipped': 'No benchmark request defined'}
+                    continue
+
+                def prepare(prepare_request=request[0]):
+                    if not options['warm_cache']:
+                        cache.clear()
+                    return prepare_request() if prepare_request else None
+
+                results['endpoints'][name] = measure(request[1], options['repeat'], prepare)
+                self.stderr.write(f"{profile} {name}: p50 {results['endpoints'][name]['p50_ms']} ms")
+            report['profiles'][profile] = results
+
+        return report
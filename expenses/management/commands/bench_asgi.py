@@ -0,0 +1,123 @@
+import asyncio
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.urls import reverse
+
+from expenses.benchmark import latency_stats, read_response, test_environment
+from expenses.cache import result_cache
+from expenses.synthetic import seed
+
+# (sync view, async view) URL names compared by the benchmark
+ENDPOINTS = [
+    ('summary', 'async_summary'),
+    ('list_methods', 'async_list_methods'),
+    ('list_months', 'async_list_months'),
+    ('transactions', 'async_transactions'),
+]
+
+
+class Command(BaseCommand):
+    help = ("Compares requests per second and latency of the sync views served through the WSGI handler "
+            "with the async views served through the ASGI handler, at a given concurrency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=400, help='Requests per endpoint and handler')
+        parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight at once')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--transactions', type=int, default=1000,
+                            help='Mean number of transactions of each user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--warm-cache', action='store_true',
+                            help='Let repeated requests be answered by the result cache')
+        parser.add_argument('--output', help='Write the report to a file instead of stdout')
+
+    def handle(self, *args, **options):
+        with test_environment():
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        population = seed(users=options['users'], transactions=options['transactions'], heavy_users=0,
+                          seed=options['seed'])
+        sessions = []
+        for user in population['regular']:
+            client = Client()
+            client.force_login(user)
+            sessions.append(client.cookies.output(header='', sep=';'))
+
+        rng = random.Random(options['seed'])
+        report = {
+            'options': {key: options[key] for key in ('requests', 'concurrency', 'users', 'transactions',
+                                                      'seed', 'warm_cache')},
+            'endpoints': {},
+        }
+        for sync_name, async_name in ENDPOINTS:
+            # The same users in the same order for both handlers
+            plan = [rng.choice(sessions) for _ in range(options['requests'])]
+            result_cache().clear()
+            wsgi = self.run_wsgi(reverse(sync_name), plan, options)
+            result_cache().clear()
+            asgi = asyncio.run(self.run_asgi(reverse(async_name), plan, options))
+            report['endpoints'][sync_name] = {'wsgi': wsgi, 'asgi': asgi}
+            self.stderr.write(f"{sync_name}: wsgi {wsgi['requests_per_second']} req/s, "
+                              f"asgi {asgi['requests_per_second']} req/s")
+        return report
+
+    def params(self, index, options):
+        # A unique query string misses the result cache
+        return {} if options['warm_cache'] else {'request': index}
+
+    def results(self, latencies, statuses, elapsed):
+        return {
+            'requests_per_second': round(len(latencies) / elapsed, 1),
+            **latency_stats(latencies),
+            'status': sorted(statuses),
+        }
+
+    def run_wsgi(self, url, plan, options):
+        def send(index):
+            client = Client()
+            client.cookies = SimpleCookie(plan[index])
+            started = time.perf_counter()
+            response = client.get(url, self.params(index, options))
+            read_response(response)
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(send, range(len(plan))))
+        elapsed = time.perf_counter() - started
+        return self.results([latency for latency, _ in results], {status for _, status in results}, elapsed)
+
+    async def run_asgi(self, url, plan, options):
+        limit = asyncio.Semaphore(options['concurrency'])
+
+        async def send(index):
+            async with limit:
+                client = AsyncClient()
+                client.cookies = SimpleCookie(plan[index])
+                started = time.perf_counter()
+                response = await client.get(url, self.params(index, options))
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(send(index) for index in range(len(plan))))
+        elapsed = time.perf_counter() - started
+        return self.results([latency for latency, _ in results], {status for _, status in results}, elapsed)
@@ -0,0 +1,172 @@
+import json
+import multiprocessing
+import random
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Q, Sum
+
+from expenses.benchmark import latency_stats
+from expenses.models import MonthlyRollup, Transaction, User
+from expenses.pagination import keyset_page
+from expenses.serializers import transaction_key, transaction_rows
+from expenses.synthetic import seed
+
+# Connection settings compared by the benchmark. "default" is a bare sqlite3
+# connection opened for every request (CONN_MAX_AGE = 0), "tuned" uses the
+# options of settings.DATABASES and keeps its connection, like the workers of
+# the WSGI deployment.
+MODES = {
+    'default': {'OPTIONS': {}, 'persistent': False},
+    'tuned': {'OPTIONS': settings.DATABASES['default'].get('OPTIONS', {}), 'persistent': True},
+}
+
+
+def use_database(path, options):
+    """
+    Points the default connection of this process at a database file.
+    """
+
+    connection.close()
+    connection.settings_dict['NAME'] = str(path)
+    connection.settings_dict['OPTIONS'] = dict(options)
+
+
+def read(user_id):
+    """
+    Reads one page of transactions and the month totals, like the dashboard.
+    """
+
+    page, _ = keyset_page(transaction_rows(Transaction.objects.filter(userID=user_id).order_by('-date', '-id')),
+                          '', 50, key=transaction_key)
+    MonthlyRollup.objects.filter(userID=user_id).aggregate(
+        income=Sum('total', filter=Q(transaction_type='income')),
+        expense=Sum('total', filter=Q(transaction_type='expense')))
+    return page
+
+
+def write(user_id, method_id, rng):
+    """
+    Registers one transaction, updating its rollup and the data version.
+    """
+
+    with transaction.atomic():
+        Transaction.objects.create(userID_id=user_id, payment_methodID_id=method_id, transaction_type='expense',
+                                   category='food', amount=Decimal(rng.randint(100, 5000)) / 100)
+
+
+def worker(path, mode, users, write_ratio, duration, worker_seed, results):
+    use_database(path, MODES[mode]['OPTIONS'])
+    rng = random.Random(worker_seed)
+    reads, writes, errors = [], [], 0
+
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        user_id, method_id = rng.choice(users)
+        is_write = rng.random() < write_ratio
+        started = time.perf_counter()
+        try:
+            if is_write:
+                write(user_id, method_id, rng)
+            else:
+                read(user_id)
+        except OperationalError:
+            # "database is locked"
+            errors += 1
+            continue
+        finally:
+            if not MODES[mode]['persistent']:
+                connection.close()
+        (writes if is_write else reads).append(time.perf_counter() - started)
+
+    connection.close()
+    results.put((reads, writes, errors))
+
+
+class Command(BaseCommand):
+    help = ("Measures read and write throughput of several worker processes sharing a SQLite file, "
+            "with a bare connection and with the tuned connection settings.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker processes')
+        parser.add_argument('--duration', type=float, default=5, help='Seconds each mode runs for')
+        parser.add_argument('--write-ratio', type=float, default=0.2, help='Share of requests that write')
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--transactions', type=int, default=500,
+                            help='Mean number of transactions of each user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the report to a file instead of stdout')
+
+    def handle(self, *args, **options):
+        original = dict(connection.settings_dict)
+        directory = Path(tempfile.mkdtemp(prefix='expenses-bench-'))
+        try:
+            report = self.run(options, directory)
+        finally:
+            connection.close()
+            connection.settings_dict.update(original)
+            shutil.rmtree(directory, ignore_errors=True)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run(self, options, directory):
+        # Seed one file in rollback journal mode, then give each mode a copy
+        template = directory / 'seed.sqlite3'
+        use_database(template, {})
+        call_command('migrate', verbosity=0)
+        population = seed(users=options['users'], transactions=options['transactions'],
+                          heavy_users=0, seed=options['seed'])
+        users = [(user.id, user.paymentmethod_set.values_list('id', flat=True).first())
+                 for user in User.objects.filter(id__in=[user.id for user in population['regular']])]
+        connection.close()
+
+        report = {
+            'options': {key: options[key] for key in ('workers', 'duration', 'write_ratio', 'users',
+                                                      'transactions', 'seed')},
+            'modes': {},
+        }
+        # Forked workers must not share the parent's connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        for mode in MODES:
+            path = directory / f'{mode}.sqlite3'
+            shutil.copyfile(template, path)
+
+            results = context.Queue()
+            processes = [
+                context.Process(target=worker, args=(path, mode, users, options['write_ratio'],
+                                                     options['duration'], options['seed'] + index, results))
+                for index in range(options['workers'])
+            ]
+            for process in processes:
+                process.start()
+            collected = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+
+            reads = [latency for worker_reads, _, _ in collected for latency in worker_reads]
+            writes = [latency for _, worker_writes, _ in collected for latency in worker_writes]
+            report['modes'][mode] = {
+                'reads_per_second': round(len(reads) / options['duration'], 1),
+                'writes_per_second': round(len(writes) / options['duration'], 1),
+                'locked_errors': sum(errors for _, _, errors in collected),
+                'read_latency': latency_stats(reads) if reads else None,
+                'write_latency': latency_stats(writes) if writes else None,
+            }
+            self.stderr.write(f"{mode}: {report['modes'][mode]['reads_per_second']} reads/s, "
+                              f"{report['modes'][mode]['writes_per_second']} writes/s, "
+                              f"{report['modes'][mode]['locked_errors']} locked")
+
+        return report
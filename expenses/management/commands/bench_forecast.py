@@ -0,0 +1,161 @@
+import json
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from expenses import analytics
+from expenses.benchmark import latency_stats
+from expenses.models import Transaction
+from expenses.synthetic import seed
+
+
+def python_forecast(user, today):
+    """
+    Pure Python baseline: loops over the user's Transaction objects and
+    computes the monthly income and expenses, the rolling category averages,
+    the method burn rates and linear projections with dictionaries.
+    """
+
+    current = analytics.epoch_month(today)
+    first = current - analytics.HISTORY_MONTHS
+    today_index = analytics.epoch_day(today)
+    income = [0] * analytics.HISTORY_MONTHS
+    expense = [0] * analytics.HISTORY_MONTHS
+    by_category = defaultdict(lambda: [0] * analytics.HISTORY_MONTHS)
+    burned = defaultdict(int)
+
+    for transaction in Transaction.objects.filter(userID=user, repeat_interval='none'):
+        day = timezone.localtime(transaction.date, user.tzinfo).date()
+        cents = int(round(transaction.amount * 100))
+        month = analytics.epoch_month(day) - first
+        if 0 <= month < analytics.HISTORY_MONTHS:
+            if transaction.transaction_type == 'income':
+                income[month] += cents
+            else:
+                expense[month] += cents
+                by_category[transaction.category][month] += cents
+        if (transaction.transaction_type == 'expense'
+                and today_index - analytics.BURN_RATE_DAYS < analytics.epoch_day(day) <= today_index):
+            burned[transaction.payment_methodID_id or 0] += cents
+
+    def linear(values, horizon):
+        count = len(values)
+        mean_x = (count - 1) / 2
+        mean_y = sum(values) / count
+        slope = (sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values))
+                 / sum((x - mean_x) ** 2 for x in range(count)))
+        return [max(mean_y + slope * (x - mean_x), 0) for x in range(count, count + horizon)]
+
+    return {
+        'income': linear(income, 6),
+        'expense': linear(expense, 6),
+        'category_averages': {
+            category: [sum(months[-window:]) / window for window in analytics.WINDOWS]
+            for category, months in by_category.items() if any(months)
+        },
+        'burn_rate': {method: cents / analytics.BURN_RATE_DAYS for method, cents in burned.items()},
+    }
+
+
+def numpy_forecast(user, today):
+    """
+    The same figures computed by expenses.analytics.
+    """
+
+    history = analytics.load_history(user)
+    current = analytics.epoch_month(today)
+    first = current - analytics.HISTORY_MONTHS
+    income = analytics.monthly_sums(history, first, current, income=True)
+    expense = analytics.monthly_sums(history, first, current, income=False)
+    by_category = analytics.monthly_sums(history, first, current, income=False, groups=history.categories,
+                                         count=len(analytics.CATEGORIES))
+    averages = analytics.rolling_averages(by_category)
+    rates = analytics.burn_rates(history, today)
+    return {
+        'income': analytics.linear_projection(income, 6)[:, 0].tolist(),
+        'expense': analytics.linear_projection(expense, 6)[:, 0].tolist(),
+        'category_averages': {
+            analytics.CATEGORIES[code]: averages[:, code].tolist()
+            for code in np.flatnonzero(by_category.sum(axis=0))
+        },
+        'burn_rate': {int(method): rate for method, rate in zip(history.method_ids, rates) if rate},
+    }
+
+
+def same_results(first, second):
+    if first.keys() != second.keys():
+        return False
+    for key in first:
+        if isinstance(first[key], dict):
+            if first[key].keys() != second[key].keys():
+                return False
+            pairs = [(first[key][name], second[key][name]) for name in first[key]]
+        else:
+            pairs = [(first[key], second[key])]
+        if not all(np.allclose(left, right, rtol=1e-6, atol=1e-3) for left, right in pairs):
+            return False
+    return True
+
+
+class Command(BaseCommand):
+    help = ("Compares the NumPy forecasting engine with a pure Python loop over the ORM, "
+            "for users with growing numbers of transactions.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000],
+                            help='Numbers of transactions of the measured users')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per size and engine')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--in-place', action='store_true',
+                            help='Seed the configured database instead of a throwaway test database')
+        parser.add_argument('--output', help='Write the report to a file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['in_place']:
+            report = self.run(options)
+        else:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                report = self.run(options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def time(self, function, user, today, repeat):
+        latencies = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function(user, today)
+            latencies.append(time.perf_counter() - started)
+        return result, latency_stats(latencies)
+
+    def run(self, options):
+        report = {
+            'options': {key: options[key] for key in ('sizes', 'repeat', 'seed')},
+            'sizes': {},
+        }
+        for index, size in enumerate(options['sizes']):
+            user = seed(users=0, heavy_users=1, heavy_transactions=size, seed=options['seed'] + index)['heavy'][0]
+            today = timezone.localdate(timezone=user.tzinfo)
+
+            python_result, python_stats = self.time(python_forecast, user, today, options['repeat'])
+            numpy_result, numpy_stats = self.time(numpy_forecast, user, today, options['repeat'])
+            report['sizes'][size] = {
+                'python': python_stats,
+                'numpy': numpy_stats,
+                'speedup': round(python_stats['p50_ms'] / numpy_stats['p50_ms'], 1),
+                'same_results': same_results(python_result, numpy_result),
+            }
+            self.stderr.write(f"{size} transactions: python {python_stats['p50_ms']} ms, "
+                              f"numpy {numpy_stats['p50_ms']} ms")
+        return report
@@ -0,0 +1,25 @@
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand
+
+from expenses.assets import brotli, build
+
+
+class Command(BaseCommand):
+    help = ("Writes content-hashed copies of the static files with gzip and Brotli variants, and the manifest "
+            "the asset template tags read. Production React builds saved in expenses/static/expenses/vendor/ "
+            "and JSX compiled to expenses/static/expenses/app.compiled.js are used by the pages when built. "
+            f"Files are written to {settings.STATIC_BUILD_ROOT}, set by STATIC_BUILD_ROOT.")
+
+    def handle(self, *args, **options):
+        source, compiled = finders.find('expenses/app.js'), finders.find('expenses/app.compiled.js')
+        if compiled and os.path.getmtime(compiled) < os.path.getmtime(source):
+            self.stderr.write('expenses/app.compiled.js is older than expenses/app.js, compile the JSX again')
+
+        manifest = build()
+        if brotli is None:
+            self.stderr.write('brotli is not installed, only gzip variants were written')
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(manifest['files'])} files built, {len(manifest['encodings'])} precompressed"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.export import CONTENT_TYPES, stream_export
+from expenses.models import User
+
+
+class Command(BaseCommand):
+    help = "Streams a user's complete transaction history as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='csv')
+        parser.add_argument('--output', help='File to write to, defaults to stdout')
+        parser.add_argument('--include-archived', action='store_true',
+                            help='Also export the transactions moved to the archive')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        chunks = stream_export(user, options['format'], include_archived=options['include_archived'])
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,38 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.importer import import_transactions, read_csv
+from expenses.models import User
+
+
+class Command(BaseCommand):
+    help = "Imports a user's transactions from a CSV file or a JSON array."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help='File format, guessed from the extension by default')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        file_format = options['format'] or ('json' if options['path'].endswith('.json') else 'csv')
+
+        with open(options['path'], 'rb') as file:
+            if file_format == 'json':
+                rows = json.load(file)
+                if not isinstance(rows, list):
+                    raise CommandError('Expected a JSON array of transactions')
+            else:
+                rows = read_csv(file)
+            created, errors = import_transactions(user, rows, batch_size=options['batch_size'])
+
+        for error in errors:
+            self.stderr.write(f"Row {error['row']}: {error['error']}")
+        self.stdout.write(self.style.SUCCESS(f'{created} transactions imported, {len(errors)} rows skipped'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.models import MonthlyRollup, User
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the monthly rollups from the raw transactions, or verifies them with --verify."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only process the given username')
+        parser.add_argument('--verify', action='store_true',
+                            help='Report differences instead of rebuilding')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"User {options['user']} does not exist")
+
+        if options['verify']:
+            expected = MonthlyRollup.expected(users)
+            rollups = MonthlyRollup.objects.filter(userID__in=users)
+            stored = {
+                tuple(getattr(rollup, field) for field in MonthlyRollup.KEY_FIELDS): (rollup.total, rollup.count)
+                for rollup in rollups
+            }
+            mismatches = [key for key in expected.keys() | stored.keys()
+                          if expected.get(key) != stored.get(key)]
+            for key in mismatches:
+                self.stdout.write(f'{key}: expected {expected.get(key)}, stored {stored.get(key)}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} rollup buckets are out of date')
+            self.stdout.write(self.style.SUCCESS(f'{len(stored)} rollup buckets verified'))
+            return
+
+        written = MonthlyRollup.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(f'{written} rollup buckets rebuilt'))
@@ -0,0 +1,137 @@
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('expenses.slow_requests')
+
+_current_profile = ContextVar('expenses_request_profile', default=None)
+
+
+class RequestProfile:
+    """
+    Timings collected while handling one request.
+    """
+
+    def __init__(self, slow_queries):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.slowest = []
+        self.slow_queries = slow_queries
+        self.timings = {}
+
+    def record_query(self, execute, sql, params, many, context):
+        """
+        Database execute wrapper timing every statement of the request.
+        """
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.query_count += 1
+            self.sql_time += elapsed
+            if self.slow_queries:
+                self.slowest.append((elapsed, sql))
+                self.slowest.sort(key=lambda item: item[0], reverse=True)
+                del self.slowest[self.slow_queries:]
+
+    def add(self, name, elapsed):
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+
+@contextmanager
+def timing(name):
+    """
+    Adds the time spent in a block, not counting its SQL, to the current
+    request profile under the given name. Does nothing when requests are not
+    profiled.
+    """
+
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    sql_before = profile.sql_time
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started - (profile.sql_time - sql_before))
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
+
+
+class ProfilingMiddleware:
+    """
+    Records the query count, SQL time, slowest statements, view time and
+    serialization time of each request, reports them in a Server-Timing header
+    and logs requests slower than EXPENSES_SLOW_REQUEST_MS.
+
+    Enabled with EXPENSES_PROFILE_REQUESTS = True. It should come first in
+    MIDDLEWARE so session and user lookups are counted too.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'EXPENSES_PROFILE_REQUESTS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'EXPENSES_SLOW_REQUEST_MS', 500) / 1000
+        self.slow_queries = getattr(settings, 'EXPENSES_SLOW_QUERIES', 5)
+
+    def __call__(self, request):
+        profile = RequestProfile(self.slow_queries)
+        token = _current_profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile.record_query))
+                response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+
+        ended = time.perf_counter()
+        total = ended - profile.started
+        view = ended - profile.view_started if profile.view_started is not None else None
+
+        metrics = [f'sql;dur={_ms(profile.sql_time)};desc="{profile.query_count} queries"']
+        if view is not None:
+            metrics.append(f'view;dur={_ms(view)}')
+        metrics.extend(f'{name};dur={_ms(elapsed)}' for name, elapsed in profile.timings.items())
+        metrics.append(f'total;dur={_ms(total)}')
+        response['Server-Timing'] = ', '.join(metrics)
+
+        if total >= self.threshold:
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'query_string': request.META.get('QUERY_STRING', ''),
+                'status': response.status_code,
+                # Only read the user if the request already loaded it
+                'user': getattr(getattr(request, '_cached_user', None), 'pk', None),
+                'total_ms': _ms(total),
+                'view_ms': _ms(view) if view is not None else None,
+                'sql_ms': _ms(profile.sql_time),
+                'queries': profile.query_count,
+                'timings_ms': {name: _ms(elapsed) for name, elapsed in profile.timings.items()},
+                'slowest_queries': [{'ms': _ms(elapsed), 'sql': sql} for elapsed, sql in profile.slowest],
+            }))
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+        return None
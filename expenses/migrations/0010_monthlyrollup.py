@@ -0,0 +1,55 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_rollups(apps, schema_editor):
+    Transaction = apps.get_model('expenses', 'Transaction')
+    MonthlyRollup = apps.get_model('expenses', 'MonthlyRollup')
+
+    buckets = (Transaction.objects
+               .values('userID', 'transaction_type', 'category', 'repeat_interval', 'payment_methodID',
+                       year=ExtractYear('date'), month=ExtractMonth('date'))
+               .annotate(total=Sum('amount'), count=Count('id'))
+               .order_by())
+    MonthlyRollup.objects.bulk_create([
+        MonthlyRollup(userID_id=bucket['userID'], year=bucket['year'], month=bucket['month'],
+                      transaction_type=bucket['transaction_type'], category=bucket['category'],
+                      repeat_interval=bucket['repeat_interval'],
+                      payment_methodID_id=bucket['payment_methodID'],
+                      total=bucket['total'], count=bucket['count'])
+        for bucket in buckets
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_alter_transaction_repeat_interval'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('transaction_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(choices=[('entertainment', 'Entertainment'), ('vehicle', 'Vehicle'), ('housing', 'Housing'), ('transportation', 'Transportation'), ('shopping', 'Shopping'), ('financial', 'Financial Expenses'), ('food', 'Food and Drinks'), ('earned', 'Earned income'), ('passive', 'Passive income'), ('porfolio', 'Portfolio income'), ('other', 'Other')], max_length=50)),
+                ('repeat_interval', models.CharField(choices=[('none', 'One Time'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('payment_methodID', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='expenses.paymentmethod')),
+                ('userID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('userID', 'year', 'month', 'transaction_type', 'category', 'repeat_interval', 'payment_methodID'), name='unique_rollup_bucket')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:06
+
+import expenses.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0010_monthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='time_zone',
+            field=models.CharField(default='UTC', max_length=64, validators=[expenses.models.validate_time_zone]),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0011_user_time_zone'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['userID', 'date'], name='transaction_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['userID', 'transaction_type', 'repeat_interval'], name='transaction_user_type_rep_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['userID', 'payment_methodID', 'transaction_type'], name='transaction_user_method_idx'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_spend(apps, schema_editor):
+    MonthlyRollup = apps.get_model('expenses', 'MonthlyRollup')
+    CategorySpend = apps.get_model('expenses', 'CategorySpend')
+
+    rows = (MonthlyRollup.objects
+            .filter(transaction_type='expense', repeat_interval='none')
+            .values('userID', 'year', 'month', 'category')
+            .annotate(total=Sum('total'), count=Sum('count'))
+            .order_by())
+    CategorySpend.objects.bulk_create([
+        CategorySpend(userID_id=row['userID'], year=row['year'], month=row['month'], category=row['category'],
+                      total=round(row['total'], 2), count=row['count'])
+        for row in rows
+    ], batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0016_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Budget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('entertainment', 'Entertainment'), ('vehicle', 'Vehicle'), ('housing', 'Housing'), ('transportation', 'Transportation'), ('shopping', 'Shopping'), ('financial', 'Financial Expenses'), ('food', 'Food and Drinks'), ('earned', 'Earned income'), ('passive', 'Passive income'), ('porfolio', 'Portfolio income'), ('other', 'Other')], max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('alert_at', models.PositiveSmallIntegerField(default=80)),
+                ('userID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BudgetAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('threshold', models.PositiveSmallIntegerField()),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('budgetID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='expenses.budget')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategorySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('category', models.CharField(choices=[('entertainment', 'Entertainment'), ('vehicle', 'Vehicle'), ('housing', 'Housing'), ('transportation', 'Transportation'), ('shopping', 'Shopping'), ('financial', 'Financial Expenses'), ('food', 'Food and Drinks'), ('earned', 'Earned income'), ('passive', 'Passive income'), ('porfolio', 'Portfolio income'), ('other', 'Other')], max_length=50)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('userID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='budget',
+            constraint=models.UniqueConstraint(fields=('userID', 'category'), name='unique_budget_category'),
+        ),
+        migrations.AddConstraint(
+            model_name='budgetalert',
+            constraint=models.UniqueConstraint(fields=('budgetID', 'year', 'month', 'threshold'), name='unique_budget_alert'),
+        ),
+        migrations.AddConstraint(
+            model_name='categoryspend',
+            constraint=models.UniqueConstraint(fields=('userID', 'year', 'month', 'category'), name='unique_category_spend'),
+        ),
+        migrations.RunPython(populate_spend, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,94 @@
+from django.db import migrations, models
+
+# Full-text index over the description and merchant of transactions. It is an
+# external content table: the text lives in expenses_transaction only and the
+# triggers keep the index in step with every insert, update and delete,
+# including bulk ones. Rows without any text are left out of the index.
+# The owner is indexed as a token too, so a search only ranks the rows of the
+# user who runs it.
+# SQLite rebuilds a table to alter most of its columns, dropping its triggers:
+# a later migration doing so on Transaction must create them again.
+CREATE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE expenses_transaction_fts USING fts5(
+        description, merchant, userID_id,
+        content='expenses_transaction', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    # Merchant matches weigh twice as much as description ones, the owner
+    # does not count
+    "INSERT INTO expenses_transaction_fts(expenses_transaction_fts, rank) VALUES('rank', 'bm25(1.0, 2.0, 0.0)')",
+    """
+    CREATE TRIGGER expenses_transaction_fts_insert AFTER INSERT ON expenses_transaction
+    WHEN new.description != '' OR new.merchant != ''
+    BEGIN
+        INSERT INTO expenses_transaction_fts(rowid, description, merchant, userID_id)
+        VALUES (new.id, new.description, new.merchant, new.userID_id);
+    END
+    """,
+    """
+    CREATE TRIGGER expenses_transaction_fts_delete AFTER DELETE ON expenses_transaction
+    WHEN old.description != '' OR old.merchant != ''
+    BEGIN
+        INSERT INTO expenses_transaction_fts(expenses_transaction_fts, rowid, description, merchant, userID_id)
+        VALUES ('delete', old.id, old.description, old.merchant, old.userID_id);
+    END
+    """,
+    """
+    CREATE TRIGGER expenses_transaction_fts_update AFTER UPDATE OF description, merchant, userID_id ON expenses_transaction
+    WHEN old.description != new.description OR old.merchant != new.merchant OR old.userID_id != new.userID_id
+    BEGIN
+        INSERT INTO expenses_transaction_fts(expenses_transaction_fts, rowid, description, merchant, userID_id)
+        SELECT 'delete', old.id, old.description, old.merchant, old.userID_id
+        WHERE old.description != '' OR old.merchant != '';
+        INSERT INTO expenses_transaction_fts(rowid, description, merchant, userID_id)
+        SELECT new.id, new.description, new.merchant, new.userID_id
+        WHERE new.description != '' OR new.merchant != '';
+    END
+    """,
+    """
+    INSERT INTO expenses_transaction_fts(rowid, description, merchant, userID_id)
+    SELECT id, description, merchant, userID_id FROM expenses_transaction
+    WHERE description != '' OR merchant != ''
+    """,
+]
+
+DROP_INDEX = [
+    "DROP TRIGGER IF EXISTS expenses_transaction_fts_update",
+    "DROP TRIGGER IF EXISTS expenses_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS expenses_transaction_fts_insert",
+    "DROP TABLE IF EXISTS expenses_transaction_fts",
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # FTS5 is SQLite's; other backends keep the columns without the index
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0017_budgets'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='description',
+            field=models.CharField(blank=True, default='', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='merchant',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(run(CREATE_INDEX), run(DROP_INDEX)),
+    ]
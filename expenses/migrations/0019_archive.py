@@ -0,0 +1,41 @@
+# Generated by Django 5.1.3 on 2026-10-18 17:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0018_transaction_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='archived_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('transaction_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('category', models.CharField(choices=[('entertainment', 'Entertainment'), ('vehicle', 'Vehicle'), ('housing', 'Housing'), ('transportation', 'Transportation'), ('shopping', 'Shopping'), ('financial', 'Financial Expenses'), ('food', 'Food and Drinks'), ('earned', 'Earned income'), ('passive', 'Passive income'), ('porfolio', 'Portfolio income'), ('other', 'Other')], max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('date', models.DateTimeField()),
+                ('repeat_interval', models.CharField(choices=[('none', 'One Time'), ('weekly', 'Weekly'), ('monthly', 'Monthly')], default='none', max_length=10)),
+                ('repeat_until', models.DateField(blank=True, null=True)),
+                ('description', models.CharField(blank=True, default='', max_length=200)),
+                ('merchant', models.CharField(blank=True, default='', max_length=100)),
+                ('archived', models.DateTimeField(default=django.utils.timezone.now)),
+                ('payment_methodID', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='expenses.paymentmethod')),
+                ('userID', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['userID', 'date'], name='archived_user_date_idx')],
+            },
+        ),
+    ]
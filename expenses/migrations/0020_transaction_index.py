@@ -0,0 +1,25 @@
+# Generated by Django 5.1.3 on 2026-10-18 18:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0019_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionIndex',
+            fields=[
+                ('transaction', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='expenses.transaction')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'expenses_transaction_fts',
+                'managed': False,
+            },
+        ),
+    ]
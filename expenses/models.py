@@ -1,11 +1,63 @@
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from zoneinfo import ZoneInfo, available_timezones
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
-from django.db.models.signals import post_save
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+# Changes collected while a batched_writes() block is active in this thread
+_pending_writes = threading.local()
+
+
+def validate_time_zone(value):
+    if value not in available_timezones():
+        raise ValidationError(f'{value} is not a valid time zone')
+
 
 # Create your models here.
 class User(AbstractUser):
-    pass
+    # Months and "current month" are computed in this zone. Changing it
+    # rebuilds the user's rollups.
+    time_zone = models.CharField(max_length=64, default='UTC', validators=[validate_time_zone])
+    # Bumped by touch_users() on every change to the user's transactions or
+    # payment methods, used for conditional GETs and cache keys
+    data_version = models.PositiveBigIntegerField(default=0)
+    data_modified = models.DateTimeField(default=timezone.now)
+    # Latest cutoff the user's transactions were archived with, empty while
+    # nothing was archived
+    archived_before = models.DateTimeField(null=True, blank=True)
+
+    # Written by touch_users() and archive_transactions() only
+    TRACKED_FIELDS = {'data_version', 'data_modified', 'archived_before'}
+
+    def save(self, *args, **kwargs):
+        # An instance loaded before a write holds older values, which a full
+        # save would put back: stale ETags and cached responses would come
+        # back to life, and archived rows would drop out of reads
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in self.TRACKED_FIELDS]
+        super().save(*args, **kwargs)
+
+    @property
+    def tzinfo(self):
+        return ZoneInfo(self.time_zone)
+
+    @property
+    def data_tag(self):
+        """
+        Identifies the current state of the user's data. The modification time
+        keeps tags unique even if a deleted user's id is reused.
+        """
+
+        return f'{self.pk}-{self.data_version}-{self.data_modified.timestamp()}'
 
 
 class PaymentMethod(models.Model):
@@ -39,7 +91,7 @@ class PaymentMethod(models.Model):
     def serialize(self):
         return {
             'id': self.id,
-            'userID': self.userID.id,
+            'userID': self.userID_id,
             'name': self.name,
             'type': self.type,
             'processor': self.processor
@@ -90,21 +142,660 @@ class Transaction(models.Model):
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     category = models.CharField(max_length=50, choices=CATEGORIES)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    date = models.DateTimeField(auto_now_add=True)
+    date = models.DateTimeField(default=timezone.now)
     repeat_interval = models.CharField(max_length=10, choices=TIME_INTERVALS, default='none')
+    # Last day a recurring transaction repeats on, open-ended when empty
+    repeat_until = models.DateField(null=True, blank=True)
+    # Free text, indexed for search by the expenses_transaction_fts table
+    description = models.CharField(max_length=200, blank=True, default='')
+    merchant = models.CharField(max_length=100, blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Listings, exports and month ranges: filter by user, order by date
+            models.Index(fields=['userID', 'date'], name='transaction_user_date_idx'),
+            # Recurring transactions of a user
+            models.Index(fields=['userID', 'transaction_type', 'repeat_interval'], name='transaction_user_type_rep_idx'),
+            # Per-method listings and balances
+            models.Index(fields=['userID', 'payment_methodID', 'transaction_type'], name='transaction_user_method_idx'),
+        ]
 
     def __str__(self):
         return f'{self.transaction_type} - {self.amount} USD'
 
+    # Fields needed to place a transaction in its rollup bucket, named like the
+    # keys returned by Transaction.objects.values(*SNAPSHOT_FIELDS)
+    SNAPSHOT_FIELDS = ['id', 'userID', 'payment_methodID', 'transaction_type',
+                       'category', 'repeat_interval', 'amount', 'date']
+
+    def snapshot(self):
+        return {field: getattr(self, self._meta.get_field(field).attname) for field in self.SNAPSHOT_FIELDS}
+
     def serialize(self):
         return {
             "id": self.id,
-            "userID": self.userID.id,
+            "userID": self.userID_id,
             "methodID": self.payment_methodID.id if self.payment_methodID else None,
             "methodName": self.payment_methodID.name if self.payment_methodID else None,
             "type": self.transaction_type,
             "category": self.category,
             "amount": self.amount,
             "date": self.date,
-            "repeat_interval": self.repeat_interval
+            "repeat_interval": self.repeat_interval,
+            "repeat_until": self.repeat_until,
+            "description": self.description,
+            "merchant": self.merchant
+        }
+
+
+class TransactionIndex(models.Model):
+    """
+    A row of the expenses_transaction_fts full-text index, created by
+    migration 0018. It only lets querysets of transactions join the index.
+    """
+
+    transaction = models.OneToOneField(Transaction, on_delete=models.DO_NOTHING, primary_key=True,
+                                       db_column='rowid', db_constraint=False, related_name='search_index')
+    # Hidden column of FTS5: bm25 score of the row for the MATCH of the
+    # query, lower is better
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'expenses_transaction_fts'
+
+
+class ArchivedTransaction(models.Model):
+    """
+    A one-time transaction moved out of Transaction by the archive_transactions
+    command. It keeps its id, and its totals stay in the rollups, so the
+    summary and the month totals read the same as before.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    userID = models.ForeignKey(User, on_delete=models.CASCADE)
+    payment_methodID = models.ForeignKey(PaymentMethod, on_delete=models.SET_NULL, null=True, blank=True)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=50, choices=Transaction.CATEGORIES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    date = models.DateTimeField()
+    repeat_interval = models.CharField(max_length=10, choices=Transaction.TIME_INTERVALS, default='none')
+    repeat_until = models.DateField(null=True, blank=True)
+    description = models.CharField(max_length=200, blank=True, default='')
+    merchant = models.CharField(max_length=100, blank=True, default='')
+    archived = models.DateTimeField(default=timezone.now)
+
+    # Fields copied from Transaction, named like Transaction.objects.values() keys
+    COPIED_FIELDS = ['id', 'userID', 'payment_methodID', 'transaction_type', 'category', 'amount', 'date',
+                     'repeat_interval', 'repeat_until', 'description', 'merchant']
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['userID', 'date'], name='archived_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.transaction_type} - {self.amount} USD (archived)'
+
+
+class RecurrencePause(models.Model):
+    """
+    Days, both ends included, on which a recurring transaction does not occur.
+    """
+
+    transactionID = models.ForeignKey(Transaction, on_delete=models.CASCADE)
+    start = models.DateField()
+    end = models.DateField()
+
+    def __str__(self):
+        return f'{self.transactionID} paused {self.start} - {self.end}'
+
+
+class Change(models.Model):
+    """
+    Append-only log of writes to a user's transactions and payment methods.
+    Ids only grow, so the id of the last change a client has seen is its sync
+    cursor. Deletes are logged as tombstones.
+    """
+
+    MODELS = [
+        ('transaction', 'Transaction'),
+        ('method', 'Payment method'),
+    ]
+
+    userID = models.ForeignKey(User, on_delete=models.CASCADE)
+    model = models.CharField(max_length=12, choices=MODELS)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Changes of a user after a cursor
+            models.Index(fields=['userID', 'id'], name='change_user_cursor_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.model} {self.object_id}{" deleted" if self.deleted else ""}'
+
+    @classmethod
+    def record(cls, entries):
+        """
+        Logs changes given as (user id, model, object id, deleted) tuples, or
+        collects them until the enclosing batched_writes() block exits.
+        """
+
+        pending = getattr(_pending_writes, 'changes', None)
+        if pending is not None:
+            pending['log'].extend(entries)
+        else:
+            cls.objects.bulk_create([
+                cls(userID_id=user_id, model=model, object_id=object_id, deleted=deleted)
+                for user_id, model, object_id, deleted in entries
+            ], batch_size=1000)
+
+
+class MonthlyRollup(models.Model):
+    """
+    Running totals of a user's transactions per month, type, category,
+    repetition and payment method. Kept up to date on every write so summaries
+    read a handful of rows per month instead of the raw transactions.
+    """
+
+    userID = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.CharField(max_length=50, choices=Transaction.CATEGORIES)
+    repeat_interval = models.CharField(max_length=10, choices=Transaction.TIME_INTERVALS)
+    payment_methodID = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE, null=True, blank=True)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    # Column names of the rollup key, in the order used by bucket()
+    KEY_FIELDS = ['userID_id', 'year', 'month', 'transaction_type', 'category',
+                  'repeat_interval', 'payment_methodID_id']
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['userID', 'year', 'month', 'transaction_type', 'category',
+                                            'repeat_interval', 'payment_methodID'],
+                                    name='unique_rollup_bucket')
+        ]
+
+    def __str__(self):
+        return f'{self.year}-{self.month:02} {self.transaction_type} {self.category} - {self.total} USD'
+
+    @classmethod
+    def bucket(cls, row, tzinfo):
+        """
+        Returns the rollup key of a transaction snapshot, with the month taken
+        in the owner's time zone.
+        """
+
+        date = timezone.localtime(row['date'], tzinfo)
+        return (row['userID'], date.year, date.month, row['transaction_type'],
+                row['category'], row['repeat_interval'], row['payment_methodID'])
+
+    @classmethod
+    def from_transactions(cls, transactions, tzinfo):
+        """
+        Recomputes rollup totals from scratch with a single grouped query.
+        Args:
+            transactions: Transaction queryset to roll up
+            tzinfo: time zone of the owners of the transactions
+        Returns:
+            Dictionary mapping rollup keys to (total, count)
+        """
+
+        buckets = (transactions
+                   .values('userID', 'transaction_type', 'category', 'repeat_interval', 'payment_methodID',
+                           year=ExtractYear('date', tzinfo=tzinfo), month=ExtractMonth('date', tzinfo=tzinfo))
+                   .annotate(total=Sum('amount'), count=Count('id'))
+                   .order_by())
+        return {
+            (bucket['userID'], bucket['year'], bucket['month'], bucket['transaction_type'],
+             bucket['category'], bucket['repeat_interval'], bucket['payment_methodID']):
+            # SQLite sums decimals as floats
+            (Decimal(bucket['total']).quantize(Decimal('0.01')), bucket['count'])
+            for bucket in buckets
+        }
+
+    @classmethod
+    def expected(cls, users):
+        """
+        Recomputes the rollup totals of several users from their transactions and
+        archived transactions, grouping them by time zone.
+        Args:
+            users: User queryset
+        Returns:
+            Dictionary mapping rollup keys to (total, count)
+        """
+
+        expected = {}
+        for time_zone in users.values_list('time_zone', flat=True).distinct().order_by():
+            owners = users.filter(time_zone=time_zone)
+            # Archived transactions still count in the rollups
+            for model in (Transaction, ArchivedTransaction):
+                for key, (total, count) in cls.from_transactions(model.objects.filter(userID__in=owners),
+                                                                 ZoneInfo(time_zone)).items():
+                    previous_total, previous_count = expected.get(key, (0, 0))
+                    expected[key] = (previous_total + total, previous_count + count)
+        return expected
+
+    @classmethod
+    def rebuild(cls, users):
+        """
+        Replaces the rollups of the given users, and the category spend
+        counters read from them, with freshly computed ones. The users are
+        touched, since the months their totals fall in may have moved.
+        Args:
+            users: User queryset
+        Returns:
+            Number of rollup buckets written
+        """
+
+        expected = cls.expected(users)
+        with transaction.atomic():
+            cls.objects.filter(userID__in=users).delete()
+            cls.objects.bulk_create([
+                cls(**dict(zip(cls.KEY_FIELDS, key)), total=total, count=count)
+                for key, (total, count) in expected.items()
+            ], batch_size=1000)
+            CategorySpend.rebuild(users)
+            touch_users(set(users.values_list('id', flat=True)))
+        return len(expected)
+
+    @classmethod
+    def apply(cls, removed=(), added=()):
+        """
+        Moves transactions out of and into their rollup buckets.
+        Args:
+            removed: snapshots of transactions as they were before the write
+            added: snapshots of transactions as they are after the write
+        """
+
+        pending = getattr(_pending_writes, 'changes', None)
+        if pending is not None:
+            pending['removed'].extend(removed)
+            pending['added'].extend(added)
+        else:
+            cls.apply_deltas(cls.deltas(removed, added))
+
+    @classmethod
+    def deltas(cls, removed=(), added=(), into=None):
+        """
+        Computes the (total, count) change of every bucket touched by a write.
+        Args:
+            removed: snapshots of transactions as they were before the write
+            added: snapshots of transactions as they are after the write
+            into: optional dictionary of pending deltas to accumulate into
+        Returns:
+            Dictionary mapping rollup keys to (total, count) deltas
+        """
+
+        deltas = {} if into is None else into
+        time_zones = dict(User.objects.filter(pk__in={row['userID'] for row in [*removed, *added]})
+                          .values_list('id', 'time_zone'))
+        for sign, rows in ((-1, removed), (1, added)):
+            for row in rows:
+                key = cls.bucket(row, ZoneInfo(time_zones[row['userID']]))
+                total, count = deltas.get(key, (0, 0))
+                deltas[key] = (total + sign * Decimal(str(row['amount'])), count + sign)
+        return deltas
+
+    @classmethod
+    def apply_deltas(cls, deltas, spend=True):
+        """
+        Adds (total, count) deltas to the given buckets, and to the category
+        spend counters unless spend is False, for writes that only move
+        amounts between buckets of the same category.
+        """
+
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+        apply_counter_deltas(cls, deltas)
+        if spend:
+            CategorySpend.apply_rollup_deltas(deltas)
+
+
+def apply_counter_deltas(model, deltas):
+    """
+    Adds (total, count) deltas to rows of a counter model, keyed by its
+    KEY_FIELDS, with in-place updates. Creates missing rows and drops the ones
+    left empty. Works in a fixed number of queries however many rows change.
+    """
+
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+
+    candidates = model.objects.filter(userID__in={key[0] for key in deltas},
+                                      year__in={key[1] for key in deltas},
+                                      month__in={key[2] for key in deltas})
+    existing = {tuple(getattr(row, field) for field in model.KEY_FIELDS): row for row in candidates}
+
+    updated = []
+    created = []
+    for key, (total, count) in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            created.append(model(**dict(zip(model.KEY_FIELDS, key)), total=total, count=count))
+        else:
+            # Relative updates stay correct under concurrent writers
+            row.total = F('total') + total
+            row.count = F('count') + count
+            updated.append(row)
+
+    model.objects.bulk_update(updated, ['total', 'count'], batch_size=500)
+    model.objects.bulk_create(created, batch_size=1000)
+    if any(count < 0 for _, count in deltas.values()):
+        model.objects.filter(pk__in=[row.pk for row in updated], count__lte=0).delete()
+
+
+class CategorySpend(models.Model):
+    """
+    Running total of a user's one-time expenses per month and category, the
+    spending that budgets limit. Updated from the same deltas as the rollups,
+    in the same database transaction as the write.
+    """
+
+    userID = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    category = models.CharField(max_length=50, choices=Transaction.CATEGORIES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    KEY_FIELDS = ['userID_id', 'year', 'month', 'category']
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['userID', 'year', 'month', 'category'], name='unique_category_spend')
+        ]
+
+    def __str__(self):
+        return f'{self.year}-{self.month:02} {self.category} - {self.total} USD'
+
+    @classmethod
+    def apply_rollup_deltas(cls, rollup_deltas):
+        """
+        Adds the one-time expense part of rollup deltas to the counters and
+        raises the budget alerts they cross.
+        """
+
+        deltas = {}
+        for (user_id, year, month, transaction_type, category, repeat_interval, _), (total, count) \
+                in rollup_deltas.items():
+            if transaction_type == 'expense' and repeat_interval == 'none':
+                key = (user_id, year, month, category)
+                previous_total, previous_count = deltas.get(key, (0, 0))
+                deltas[key] = (previous_total + total, previous_count + count)
+
+        deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+        apply_counter_deltas(cls, deltas)
+        Budget.check_thresholds(deltas)
+
+    @classmethod
+    def rebuild(cls, users):
+        """
+        Replaces the counters of the given users with totals read from their
+        rollups.
+        """
+
+        rows = (MonthlyRollup.objects
+                .filter(userID__in=users, transaction_type='expense', repeat_interval='none')
+                .values('userID', 'year', 'month', 'category')
+                .annotate(total=Sum('total'), count=Sum('count'))
+                .order_by())
+        with transaction.atomic():
+            cls.objects.filter(userID__in=users).delete()
+            cls.objects.bulk_create([
+                cls(userID_id=row['userID'], year=row['year'], month=row['month'], category=row['category'],
+                    # SQLite sums decimals as floats
+                    total=Decimal(row['total']).quantize(Decimal('0.01')), count=row['count'])
+                for row in rows
+            ], batch_size=1000)
+
+
+class Budget(models.Model):
+    """
+    Monthly limit on a user's one-time expenses in a category. Recurring
+    expenses are fixed and stay outside budgets, as in the summary. An alert
+    is raised the first time a month's spending reaches alert_at percent of
+    the amount, and again when it reaches the whole amount.
+    """
+
+    userID = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.CharField(max_length=50, choices=Transaction.CATEGORIES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    alert_at = models.PositiveSmallIntegerField(default=80)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['userID', 'category'], name='unique_budget_category')
+        ]
+
+    def __str__(self):
+        return f'{self.userID}: {self.category} - {self.amount} USD'
+
+    def thresholds(self):
+        return sorted({self.alert_at, 100})
+
+    def serialize(self):
+        return {
+            "id": self.id,
+            "category": self.category,
+            "amount": str(self.amount),
+            "alert_at": self.alert_at,
+        }
+
+    @classmethod
+    def check_thresholds(cls, deltas):
+        """
+        Raises the alerts of the budgets whose thresholds were crossed by
+        spend counter deltas. Only reads the counters of categories with a
+        budget, after the deltas were applied.
+        Args:
+            deltas: dictionary mapping CategorySpend keys to (total, count) deltas
+        """
+
+        grown = {key: total for key, (total, _) in deltas.items() if total > 0}
+        if not grown:
+            return
+
+        budgets = {(budget.userID_id, budget.category): budget
+                   for budget in cls.objects.filter(userID__in={key[0] for key in grown},
+                                                    category__in={key[3] for key in grown})}
+        grown = {key: total for key, total in grown.items() if (key[0], key[3]) in budgets}
+        if not grown:
+            return
+
+        spent = {
+            tuple(getattr(row, field) for field in CategorySpend.KEY_FIELDS): row.total
+            for row in CategorySpend.objects.filter(userID__in={key[0] for key in grown},
+                                                    year__in={key[1] for key in grown},
+                                                    month__in={key[2] for key in grown},
+                                                    category__in={key[3] for key in grown})
         }
+        alerts = []
+        for key, total in grown.items():
+            budget = budgets[key[0], key[3]]
+            after = spent.get(key, 0)
+            before = after - total
+            for threshold in budget.thresholds():
+                limit = budget.amount * threshold / 100
+                if before < limit <= after:
+                    alerts.append(BudgetAlert(budgetID=budget, year=key[1], month=key[2], threshold=threshold,
+                                              spent=after))
+        BudgetAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+
+
+class BudgetAlert(models.Model):
+    """
+    Raised once per month and threshold, when a write makes the month's
+    spending reach a threshold of a budget.
+    """
+
+    budgetID = models.ForeignKey(Budget, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    threshold = models.PositiveSmallIntegerField()
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    created = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['budgetID', 'year', 'month', 'threshold'], name='unique_budget_alert')
+        ]
+
+    def __str__(self):
+        return f'{self.budgetID} reached {self.threshold}% in {self.year}-{self.month:02}'
+
+
+@contextmanager
+def batched_writes():
+    """
+    Collects the rollup changes, change log entries and touched users of
+    every write made inside the block, such as the per-row delete signals of
+    a queryset delete, and applies them together when the block exits
+    without errors.
+    """
+
+    if getattr(_pending_writes, 'changes', None) is not None:
+        yield
+        return
+
+    _pending_writes.changes = {'removed': [], 'added': [], 'users': set(), 'log': []}
+    try:
+        yield
+        changes = _pending_writes.changes
+    finally:
+        _pending_writes.changes = None
+    MonthlyRollup.apply(removed=changes['removed'], added=changes['added'])
+    Change.record(changes['log'])
+    touch_users(changes['users'])
+
+
+@contextmanager
+def archiving():
+    """
+    Marks the transactions deleted inside the block as moved to the archive:
+    their deletes are logged and touch their owners, but their totals stay in
+    the rollups.
+    """
+
+    _pending_writes.archiving = True
+    try:
+        yield
+    finally:
+        _pending_writes.archiving = False
+
+
+def touch_users(user_ids):
+    """
+    Bumps the data version of users whose transactions or payment methods
+    changed, so clients holding older data know it is stale.
+    """
+
+    pending = getattr(_pending_writes, 'changes', None)
+    if pending is not None:
+        pending['users'].update(user_ids)
+    elif user_ids:
+        User.objects.filter(pk__in=user_ids).update(data_version=F('data_version') + 1,
+                                                    data_modified=timezone.now())
+
+
+def _deleting_user(origin):
+    """
+    Tells whether a delete cascades from a user, in which case the user's
+    rollups are being removed as well and must not be touched.
+    """
+
+    if isinstance(origin, models.Model):
+        return isinstance(origin, User)
+    return getattr(origin, 'model', None) is User
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_time_zone(sender, instance, update_fields=None, **kwargs):
+    instance._previous_time_zone = None
+    if instance.pk and (update_fields is None or 'time_zone' in update_fields):
+        instance._previous_time_zone = User.objects.filter(pk=instance.pk).values_list(
+            'time_zone', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def rebuild_rollups_on_time_zone_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_time_zone', None)
+    if not created and previous and previous != instance.time_zone:
+        MonthlyRollup.rebuild(User.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, **kwargs):
+    instance._previous_snapshot = None
+    if instance.pk:
+        instance._previous_snapshot = Transaction.objects.filter(pk=instance.pk).values(
+            *Transaction.SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_save, sender=Transaction)
+def update_rollups_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_snapshot', None)
+    MonthlyRollup.apply(removed=[previous] if previous else [], added=[instance.snapshot()])
+    Change.record([(instance.userID_id, 'transaction', instance.pk, False)])
+    touch_users({instance.userID_id})
+
+
+@receiver(post_delete, sender=Transaction)
+def update_rollups_on_delete(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        if not getattr(_pending_writes, 'archiving', False):
+            MonthlyRollup.apply(removed=[instance.snapshot()])
+        Change.record([(instance.userID_id, 'transaction', instance.pk, True)])
+        touch_users({instance.userID_id})
+
+
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+def touch_method_owner(sender, instance, origin=None, signal=None, **kwargs):
+    if not _deleting_user(origin):
+        Change.record([(instance.userID_id, 'method', instance.pk, signal is post_delete)])
+        touch_users({instance.userID_id})
+
+
+@receiver(post_save, sender=RecurrencePause)
+@receiver(post_delete, sender=RecurrencePause)
+def touch_pause_owner(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        touch_users(set(Transaction.objects.filter(pk=instance.transactionID_id).values_list('userID', flat=True)))
+
+
+@receiver(post_save, sender=Budget)
+@receiver(post_delete, sender=Budget)
+def touch_budget_owner(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        touch_users({instance.userID_id})
+
+
+@receiver(pre_delete, sender=PaymentMethod)
+def detach_method_rollups(sender, instance, origin=None, **kwargs):
+    # Transactions of a deleted method are kept with no method (SET_NULL), so
+    # their totals move to the matching buckets without a method
+    if _deleting_user(origin):
+        return
+
+    rollups = MonthlyRollup.objects.filter(payment_methodID=instance)
+    deltas = {}
+    for rollup in rollups:
+        key = (rollup.userID_id, rollup.year, rollup.month, rollup.transaction_type,
+               rollup.category, rollup.repeat_interval, None)
+        total, count = deltas.get(key, (0, 0))
+        deltas[key] = (total + rollup.total, count + rollup.count)
+    rollups.delete()
+    MonthlyRollup.apply_deltas(deltas, spend=False)
+
+    # The SET_NULL update of those transactions sends no signals
+    Change.record([
+        (instance.userID_id, 'transaction', transaction_id, False)
+        for transaction_id in Transaction.objects.filter(payment_methodID=instance).values_list('id', flat=True)
+    ])
@@ -0,0 +1,97 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(date, transaction_id):
+    """
+    Builds an opaque cursor pointing right after the given transaction.
+    Args:
+        date: date of the last transaction of the current page
+        transaction_id: id of the last transaction of the current page
+    Returns:
+        URL-safe string that can be passed back as the ``cursor`` parameter
+    """
+
+    raw = f"{date.isoformat()}|{transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Parses a cursor produced by ``encode_cursor``.
+    Args:
+        cursor: string received from the client
+    Returns:
+        Tuple of (date, id) of the last transaction already seen
+    """
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date, transaction_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date), int(transaction_id)
+    except (ValueError, UnicodeError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def _transaction_key(transaction):
+    return transaction.date, transaction.id
+
+
+def keyset_page(queryset, cursor, limit, key=_transaction_key):
+    """
+    Returns one page of transactions ordered newest first, using the stable
+    (date, id) ordering so pages never skip or repeat rows while data changes.
+    Args:
+        queryset: filtered Transaction queryset, possibly returning values
+        cursor: cursor of the previous page or an empty value for the first one
+        limit: maximum number of transactions in the page
+        key: function returning the (date, id) of a row of the queryset
+    Returns:
+        Tuple of (list of transactions, cursor of the next page or None)
+    """
+
+    page = list(_page_queryset(queryset, cursor, limit))
+    return _split_page(page, limit, key)
+
+
+async def akeyset_page(queryset, cursor, limit, key=_transaction_key):
+    """
+    Async version of keyset_page().
+    """
+
+    page = [row async for row in _page_queryset(queryset, cursor, limit)]
+    return _split_page(page, limit, key)
+
+
+def merged_keyset_page(querysets, cursor, limit, key=_transaction_key):
+    """
+    keyset_page() over several querysets of disjoint rows, such as the
+    transactions and the archived transactions of a user. Each one is read
+    up to the page size and the results are merged in (date, id) order.
+    """
+
+    rows = [row for queryset in querysets for row in _page_queryset(queryset, cursor, limit)]
+    page = sorted(rows, key=key, reverse=True)[:limit + 1]
+    return _split_page(page, limit, key)
+
+
+def _page_queryset(queryset, cursor, limit):
+    if cursor:
+        date, transaction_id = decode_cursor(cursor)
+        # date <= cursor date bounds the index range, the OR settles ties on id
+        queryset = queryset.filter(date__lte=date).filter(Q(date__lt=date) | Q(id__lt=transaction_id))
+    # One extra row tells whether there is a next page
+    return queryset.order_by('-date', '-id')[:limit + 1]
+
+
+def _split_page(page, limit, key):
+    if len(page) > limit:
+        page = page[:limit]
+        return page, encode_cursor(*key(page[-1]))
+    return page, None
@@ -0,0 +1,167 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+
+from .models import ArchivedTransaction, MonthlyRollup, Transaction
+from .schedule import materialize
+
+BUCKETS = ['day', 'week', 'month']
+
+# Dimensions a report can be grouped by, and their column
+DIMENSIONS = {
+    'type': 'transaction_type',
+    'category': 'category',
+    'method': 'payment_methodID',
+}
+
+# Largest number of buckets in one report
+MAX_REPORT_BUCKETS = 400
+
+
+def bucket_start(day, size):
+    """
+    Returns the first day of the bucket holding a day. Weeks start on Monday,
+    like the database's week truncation.
+    """
+
+    if size == 'day':
+        return day
+    if size == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_bucket(day, size):
+    """
+    First day of the bucket after the one starting on day, or date.max past
+    the last bucket of the calendar.
+    """
+
+    try:
+        if size == 'day':
+            return day + timedelta(days=1)
+        if size == 'week':
+            return day + timedelta(weeks=1)
+        return (day + timedelta(days=32)).replace(day=1)
+    except OverflowError:
+        return date.max
+
+
+def bucket_count(start, end, size):
+    """
+    Number of buckets overlapping [start, end), computed without listing them.
+    """
+
+    first = bucket_start(start, size)
+    last = bucket_start(end - timedelta(days=1), size)
+    if size == 'day':
+        return (last - first).days + 1
+    if size == 'week':
+        return (last - first).days // 7 + 1
+    return month_index(last) - month_index(first) + 1
+
+
+def bucket_labels(start, end, size):
+    """
+    First day of every bucket overlapping [start, end), oldest first.
+    """
+
+    labels = [bucket_start(start, size)]
+    for _ in range(bucket_count(start, end, size) - 1):
+        labels.append(next_bucket(labels[-1], size))
+    return labels
+
+
+def month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def recorded_totals(user, start, end, size, columns):
+    """
+    Totals the user's one-time transactions per bucket and dimension values
+    with a single grouped query, plus one over the archived transactions when
+    the range starts before the archive cutoff. Month reports over whole
+    months read the rollups instead of the transactions.
+    Returns:
+        Iterable of dictionaries with the bucket, the columns, total and count
+    """
+
+    if size == 'month' and start.day == 1 and end.day == 1:
+        return (MonthlyRollup.objects
+                .filter(userID=user, repeat_interval='none')
+                .alias(index=F('year') * 12 + F('month') - 1)
+                .filter(index__gte=month_index(start), index__lt=month_index(end))
+                .values('year', 'month', *columns)
+                .annotate(total=Sum('total'), count=Sum('count'))
+                .order_by())
+
+    tzinfo = user.tzinfo
+    start = datetime.combine(start, time(), tzinfo=tzinfo)
+    end = datetime.combine(end, time(), tzinfo=tzinfo)
+    models = [Transaction]
+    if user.archived_before and start < user.archived_before:
+        models.append(ArchivedTransaction)
+    return [row
+            for model in models
+            for row in (model.objects
+                        .filter(userID=user, repeat_interval='none', date__gte=start, date__lt=end)
+                        .annotate(bucket=Trunc('date', size, output_field=DateField(), tzinfo=tzinfo))
+                        .values('bucket', *columns)
+                        .annotate(total=Sum('amount'), count=Count('id'))
+                        .order_by())]
+
+
+def report(user, start, end, size, group_by):
+    """
+    Totals the user's transactions per time bucket over [start, end), grouped
+    by type and optionally by category and payment method. Recurring
+    transactions count on each scheduled date, as in the summary.
+    Args:
+        user: owner of the transactions
+        start: first day of the report, in the user's time zone
+        end: day after the last one
+        size: bucket size, one of BUCKETS
+        group_by: dimensions besides the type, keys of DIMENSIONS
+    Returns:
+        JSON-ready dictionary with the bucket start dates and one series of
+        totals and counts per group, aligned with the buckets
+    """
+
+    dimensions = ['type'] + [dimension for dimension in DIMENSIONS if dimension in group_by and dimension != 'type']
+    columns = [DIMENSIONS[dimension] for dimension in dimensions]
+    labels = bucket_labels(start, end, size)
+    positions = {label: position for position, label in enumerate(labels)}
+
+    totals = defaultdict(lambda: [Decimal('0.00')] * len(labels))
+    counts = defaultdict(lambda: [0] * len(labels))
+
+    def add(label, key, total, count):
+        totals[key][positions[label]] += total
+        counts[key][positions[label]] += count
+
+    for row in recorded_totals(user, start, end, size, columns):
+        label = row['bucket'] if 'bucket' in row else date(row['year'], row['month'], 1)
+        add(label, tuple(row[column] for column in columns), row['total'], row['count'])
+
+    occurrence_columns = {'transaction_type': 'transaction_type', 'category': 'category',
+                          'payment_methodID': 'method_id'}
+    for occurrence in materialize(user, start, end):
+        key = tuple(getattr(occurrence, occurrence_columns[column]) for column in columns)
+        add(bucket_start(occurrence.date, size), key, occurrence.amount, 1)
+
+    return {
+        "start": start,
+        "end": end,
+        "bucket": size,
+        "group_by": dimensions,
+        "buckets": labels,
+        "series": [
+            {**dict(zip(dimensions, key)),
+             "totals": [float(total) for total in totals[key]],
+             "counts": counts[key]}
+            for key in sorted(totals, key=lambda key: tuple((value is None, value) for value in key))
+        ]
+    }
@@ -0,0 +1,232 @@
+import calendar
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import result_cache
+from .models import RecurrencePause, Transaction
+
+CHUNK_SIZE = 500
+
+RECURRING_INTERVALS = ('weekly', 'monthly')
+
+TEMPLATE_COLUMNS = ['id', 'payment_methodID', 'transaction_type', 'category', 'amount',
+                    'repeat_interval', 'date', 'repeat_until']
+
+# A recurring transaction. The anchor is the local day of its first
+# occurrence, pauses are sorted, merged (start, end) day ranges.
+Template = namedtuple('Template', ['id', 'method_id', 'transaction_type', 'category', 'amount',
+                                   'interval', 'anchor', 'until', 'pauses'])
+
+Occurrence = namedtuple('Occurrence', ['template_id', 'date', 'method_id', 'transaction_type',
+                                       'category', 'amount'])
+
+
+def merge_pauses(pauses):
+    """
+    Sorts pauses and merges overlapping or adjacent ones, so each paused day is
+    covered exactly once.
+    """
+
+    merged = []
+    for start, end in sorted(pauses):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return tuple(merged)
+
+
+def iter_templates(user, start, end, chunk_size=CHUNK_SIZE):
+    """
+    Streams the user's recurring transactions that can occur in [start, end),
+    reading them in chunks with one query for the pauses of each chunk.
+    Args:
+        user: owner of the transactions
+        start: first day of the window
+        end: day after the last day of the window
+        chunk_size: number of templates read per query
+    Returns:
+        Iterator of Template tuples
+    """
+
+    tzinfo = user.tzinfo
+    rows = (Transaction.objects
+            .filter(userID=user, repeat_interval__in=RECURRING_INTERVALS,
+                    date__lt=datetime.combine(end, datetime.min.time(), tzinfo=tzinfo))
+            .filter(Q(repeat_until__isnull=True) | Q(repeat_until__gte=start))
+            .order_by('id')
+            .values_list(*TEMPLATE_COLUMNS)
+            .iterator(chunk_size=chunk_size))
+
+    while chunk := list(islice(rows, chunk_size)):
+        pauses = defaultdict(list)
+        paused = (RecurrencePause.objects
+                  .filter(transactionID__in=[row[0] for row in chunk], start__lt=end, end__gte=start)
+                  .values_list('transactionID', 'start', 'end'))
+        for transaction_id, pause_start, pause_end in paused:
+            pauses[transaction_id].append((pause_start, pause_end))
+
+        for (transaction_id, method_id, transaction_type, category, amount,
+             interval, when, until) in chunk:
+            yield Template(transaction_id, method_id, transaction_type, category, amount, interval,
+                           timezone.localdate(when, timezone=tzinfo), until,
+                           merge_pauses(pauses[transaction_id]))
+
+
+def _bounds(template, start, end):
+    """
+    Narrows [start, end) to the days the template is active on.
+    """
+
+    start = max(start, template.anchor)
+    if template.until is not None:
+        end = min(end, template.until + timedelta(days=1))
+    return start, end
+
+
+def _month_day(anchor, months):
+    """
+    Returns the occurrence of a monthly template the given number of months
+    after its anchor, moved to the last day of shorter months.
+    """
+
+    year, month = divmod(anchor.month - 1 + months, 12)
+    year += anchor.year
+    month += 1
+    return date(year, month, min(anchor.day, calendar.monthrange(year, month)[1]))
+
+
+def _raw_dates(template, start, end):
+    """
+    Yields the days a template occurs on in [start, end), ignoring pauses.
+    """
+
+    start, end = _bounds(template, start, end)
+    if start >= end:
+        return
+
+    # Only occurrences before end are computed, so windows ending near
+    # date.max never step past it
+    if template.interval == 'weekly':
+        first = -(-(start - template.anchor).days // 7)
+        last = (end - template.anchor - timedelta(days=1)).days // 7
+        for week in range(first, last + 1):
+            yield template.anchor + timedelta(days=week * 7)
+    else:
+        months = (start.year - template.anchor.year) * 12 + start.month - template.anchor.month
+        last = (end.year - template.anchor.year) * 12 + end.month - template.anchor.month
+        for months in range(months, last + 1):
+            day = _month_day(template.anchor, months)
+            if start <= day < end:
+                yield day
+
+
+def _paused(template, day):
+    return any(pause_start <= day <= pause_end for pause_start, pause_end in template.pauses)
+
+
+def occurrence_dates(template, start, end):
+    """
+    Lazily yields the days a template occurs on in [start, end), honoring its
+    end date and pauses.
+    """
+
+    return (day for day in _raw_dates(template, start, end) if not _paused(template, day))
+
+
+def _weekly_count(template, start, end):
+    start, end = _bounds(template, start, end)
+    if start >= end:
+        return 0
+    first = -(-(start - template.anchor).days // 7)
+    last = (end - template.anchor - timedelta(days=1)).days // 7
+    return max(last - first + 1, 0)
+
+
+def count_occurrences(template, start, end):
+    """
+    Returns how many times a template occurs in [start, end). Weekly templates
+    are counted arithmetically instead of walking every week.
+    """
+
+    if template.interval != 'weekly':
+        return sum(1 for _ in occurrence_dates(template, start, end))
+
+    count = _weekly_count(template, start, end)
+    for pause_start, pause_end in template.pauses:
+        count -= _weekly_count(template, max(start, pause_start), min(end, pause_end + timedelta(days=1)))
+    return count
+
+
+def month_windows(start, end):
+    """
+    Splits [start, end) into (year, month, start, end) calendar month pieces.
+    """
+
+    while start < end:
+        if start.month == 12:
+            # December 9999 has no next month, the window ends before it anyway
+            next_month = date(start.year + 1, 1, 1) if start.year < date.max.year else end
+        else:
+            next_month = date(start.year, start.month + 1, 1)
+        yield start.year, start.month, start, min(next_month, end)
+        start = next_month
+
+
+def _cached(kind, user, start, end, compute):
+    # Any write to the user's data changes data_tag, so entries never go stale
+    key = f'schedule:{kind}:{user.data_tag}:{start}:{end}'
+    cache = result_cache()
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+def materialize(user, start, end):
+    """
+    Expands the user's recurring transactions into concrete occurrences in
+    [start, end), ordered by date. Results are cached per data version.
+    Returns:
+        List of Occurrence tuples
+    """
+
+    def compute():
+        occurrences = [
+            Occurrence(template.id, day, template.method_id, template.transaction_type,
+                       template.category, template.amount)
+            for template in iter_templates(user, start, end)
+            for day in occurrence_dates(template, start, end)
+        ]
+        occurrences.sort(key=lambda occurrence: (occurrence.date, occurrence.template_id))
+        return occurrences
+
+    return _cached('occurrences', user, start, end, compute)
+
+
+def monthly_projection(user, start, end):
+    """
+    Totals the user's recurring transactions per month and type over
+    [start, end) without materializing each occurrence. Results are cached per
+    data version.
+    Returns:
+        Dictionary of {(year, month): {"income": Decimal, "expense": Decimal}}
+    """
+
+    def compute():
+        months = list(month_windows(start, end))
+        totals = {(year, month): {'income': Decimal('0.00'), 'expense': Decimal('0.00')} for year, month, _, _ in months}
+        for template in iter_templates(user, start, end):
+            for year, month, month_start, month_end in months:
+                count = count_occurrences(template, month_start, month_end)
+                if count:
+                    totals[year, month][template.transaction_type] += template.amount * count
+        return totals
+
+    return _cached('projection', user, start, end, compute)
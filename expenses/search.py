@@ -0,0 +1,97 @@
+import base64
+import re
+
+from django.db.models import BooleanField, F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import TransactionIndex
+from .pagination import InvalidCursor
+from .serializers import TRANSACTION_COLUMNS
+
+# FTS5 index of the description and merchant of transactions, kept up to date
+# by the triggers of migration 0018
+FTS_TABLE = TransactionIndex._meta.db_table
+
+# Largest number of words of a search
+MAX_SEARCH_TERMS = 10
+
+WORD = re.compile(r'\w+')
+
+
+class InvalidSearch(ValueError):
+    pass
+
+
+def match_expression(user, text):
+    """
+    Turns free text into an FTS5 query. Every word must match a word of the
+    description or the merchant, the last one as a prefix since it may still
+    be being typed, and the user token limits the match to the user's rows.
+    Words are quoted, so FTS5 operators in the text are searched for rather
+    than parsed.
+    Args:
+        user: owner of the transactions
+        text: search text typed by the user
+    Returns:
+        FTS5 MATCH expression
+    """
+
+    words = WORD.findall(text)[:MAX_SEARCH_TERMS]
+    if not words:
+        raise InvalidSearch(text)
+    terms = ' '.join([f'"{word}"' for word in words[:-1]] + [f'"{words[-1]}"*'])
+    return f'userID_id : {user.id} AND {{description merchant}} : ({terms})'
+
+
+def encode_search_cursor(rank, transaction_id):
+    raw = f"{rank!r}|{transaction_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_search_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        rank, transaction_id = raw.rsplit('|', 1)
+        return float(rank), int(transaction_id)
+    except (ValueError, UnicodeError) as error:
+        raise InvalidCursor(cursor) from error
+
+
+def search_page(user, queryset, text, cursor, limit):
+    """
+    Returns one page of the transactions of a queryset matching a search,
+    best match first. Matches are ranked by bm25, merchant words counting
+    twice as much as description ones, with ties in id order. The full-text
+    index drives the query and rows are read by primary key, so the filters of
+    the queryset only look at matching rows.
+    Ranks depend on the whole index, so a page read after other transactions
+    were written may repeat or skip a few matches.
+    Args:
+        user: owner of the transactions
+        queryset: filtered Transaction queryset of the user
+        text: search text
+        cursor: cursor of the previous page or an empty value for the first one
+        limit: maximum number of transactions in the page
+    Returns:
+        Tuple of (list of rows ordered like TRANSACTION_COLUMNS, cursor of the
+        next page or None)
+    """
+
+    # Excluding rows without an index entry makes the join an inner one, so
+    # SQLite goes from the matches to the rows by primary key. The MATCH
+    # condition names the index table, which is the alias of the join.
+    queryset = queryset.filter(
+        RawSQL(f'{FTS_TABLE} MATCH %s', [match_expression(user, text)], output_field=BooleanField()),
+        search_index__isnull=False,
+    ).annotate(rank=F('search_index__rank'))
+    if cursor:
+        rank, transaction_id = decode_search_cursor(cursor)
+        queryset = queryset.filter(Q(rank__gt=rank) | Q(rank=rank, id__gt=transaction_id))
+
+    # One extra row tells whether there is a next page
+    rows = list(queryset.values_list(*TRANSACTION_COLUMNS, 'rank').order_by('rank', 'id')[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_search_cursor(rows[-1][-1], rows[-1][0])
+    return [row[:-1] for row in rows], next_cursor
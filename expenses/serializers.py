@@ -0,0 +1,108 @@
+from operator import itemgetter
+
+# Columns read for transaction listings, joined in SQL and returned as plain
+# tuples so no model instances are built
+TRANSACTION_COLUMNS = ['id', 'userID', 'payment_methodID', 'payment_methodID__name',
+                       'transaction_type', 'category', 'amount', 'date', 'repeat_interval', 'repeat_until',
+                       'description', 'merchant']
+
+# (date, id) of a transaction row, used by keyset pagination
+transaction_key = itemgetter(7, 0)
+
+METHOD_COLUMNS = ['id', 'userID', 'name', 'type', 'processor']
+
+
+def format_datetime(value):
+    """
+    Formats a datetime the way DjangoJSONEncoder does, so fast responses keep
+    the same format as the ones built from Model.serialize().
+    """
+
+    formatted = value.isoformat()
+    if value.microsecond:
+        formatted = formatted[:23] + formatted[26:]
+    if formatted.endswith('+00:00'):
+        formatted = formatted[:-6] + 'Z'
+    return formatted
+
+
+def transaction_rows(queryset):
+    """
+    Returns a Transaction queryset as tuples ordered like TRANSACTION_COLUMNS.
+    """
+
+    return queryset.values_list(*TRANSACTION_COLUMNS)
+
+
+def serialize_transactions(rows):
+    """
+    Builds the same dictionaries as Transaction.serialize() from rows returned
+    by transaction_rows().
+    Args:
+        rows: iterable of transaction tuples
+    Returns:
+        List of JSON-ready dictionaries
+    """
+
+    return [
+        {
+            "id": transaction_id,
+            "userID": user_id,
+            "methodID": method_id,
+            "methodName": method_name,
+            "type": transaction_type,
+            "category": category,
+            "amount": str(amount),
+            "date": format_datetime(date),
+            "repeat_interval": repeat_interval,
+            "repeat_until": repeat_until.isoformat() if repeat_until else None,
+            "description": description,
+            "merchant": merchant
+        }
+        for (transaction_id, user_id, method_id, method_name, transaction_type,
+             category, amount, date, repeat_interval, repeat_until, description, merchant) in rows
+    ]
+
+
+def serialize_transactions_columnar(rows):
+    """
+    Builds a compact columnar listing: one array per field, with payment method
+    names moved to a lookup table keyed by method id.
+    Args:
+        rows: iterable of transaction tuples
+    Returns:
+        JSON-ready dictionary
+    """
+
+    columns = {"id": [], "methodID": [], "type": [], "category": [],
+               "amount": [], "date": [], "repeat_interval": [], "repeat_until": [],
+               "description": [], "merchant": []}
+    methods = {}
+    for (transaction_id, _, method_id, method_name, transaction_type,
+         category, amount, date, repeat_interval, repeat_until, description, merchant) in rows:
+        columns["id"].append(transaction_id)
+        columns["methodID"].append(method_id)
+        columns["type"].append(transaction_type)
+        columns["category"].append(category)
+        columns["amount"].append(str(amount))
+        columns["date"].append(format_datetime(date))
+        columns["repeat_interval"].append(repeat_interval)
+        columns["repeat_until"].append(repeat_until.isoformat() if repeat_until else None)
+        columns["description"].append(description)
+        columns["merchant"].append(merchant)
+        if method_id is not None:
+            methods[method_id] = method_name
+
+    return {"format": "columnar", "columns": columns, "methods": methods}
+
+
+def serialize_methods(queryset):
+    """
+    Builds the same dictionaries as PaymentMethod.serialize() straight from the
+    database rows.
+    """
+
+    return [
+        {"id": method_id, "userID": user_id, "name": name, "type": method_type, "processor": processor}
+        for method_id, user_id, name, method_type, processor in queryset.values_list(*METHOD_COLUMNS)
+    ]
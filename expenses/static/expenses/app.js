@@ -1,45 +1,40 @@
+// Transactions per page of the details table
+const PageSize = 10;
+
+// Milliseconds without typing before the search box sends a search
+const SearchDelay = 300;
+
 const body = document.querySelector('#body');
 const bodyRoot = ReactDOM.createRoot(body);
 bodyRoot.render(<App />);
 
 function App() {
-    const [transactions, setTransactions] = React.useState([]);
     const [summaryInfo, setSummaryInfo] = React.useState([]);
     const [methods, setMethods] = React.useState([]);
+    const [months, setMonths] = React.useState([]);
+    const [firstPage, setFirstPage] = React.useState({ transactions: [], next_cursor: null });
     const [loading, setLoading] = React.useState(true);
 
     React.useEffect(() => {
-        fetchTransactions();
-        fetchSummary();
-        fetchMethods();
+        fetchDashboard();
     }, []);
 
-
-    function fetchTransactions() {
-        fetch('/list_all_transactions')
+    // Summary, methods, months and the first page of transactions come in a
+    // single response
+    function fetchDashboard() {
+        fetch(`/bootstrap?limit=${PageSize}`)
             .then(response => response.json())
-            .then(transactions => {
-                setTransactions(transactions);
+            .then(data => {
+                setSummaryInfo(data.summary);
+                setMethods(data.methods);
+                setMonths(data.months);
+                setFirstPage(data.transactions);
                 setLoading(false);
             });
     }
 
-    function fetchSummary() {
-        fetch('/summary')
-            .then(response => response.json())
-            .then(data => setSummaryInfo(data));
-    }
-
-    function fetchMethods() {
-        fetch('/list_methods')
-            .then(response => response.json())
-            .then(data => setMethods(data));
-    }
-
     function updateTransactions() {
-        fetchMethods();
-        fetchTransactions();
-        fetchSummary();
+        fetchDashboard();
     }
 
     if (loading) {
@@ -49,7 +44,7 @@ function App() {
     return (
         <div className="app">
             <Summary summary={summaryInfo} />
-            <Details transactions={transactions} onTransactionEdited={updateTransactions} methods={methods} />
+            <Details firstPage={firstPage} monthList={months} onTransactionEdited={updateTransactions} methods={methods} />
             <TransactionForm onTransactionAdded={updateTransactions} methods={methods} />
             <MethodForm onMethodAdded={updateTransactions} methods={methods} />
         </div>
@@ -198,7 +193,9 @@ const TransactionTableRow = ({ transaction, onTransactionEdited, methods }) => {
         type: transaction.type,
         repeat_interval: transaction.repeat_interval,
         category: transaction.category,
-        amount: transaction.amount
+        amount: transaction.amount,
+        merchant: transaction.merchant,
+        description: transaction.description
     });
 
     function toggleEditMode() {
@@ -240,7 +237,9 @@ const TransactionTableRow = ({ transaction, onTransactionEdited, methods }) => {
                     type: transaction.type,
                     repeat_interval: transaction.repeat_interval,
                     category: transaction.category,
-                    amount: transaction.amount
+                    amount: transaction.amount,
+                    merchant: transaction.merchant,
+                    description: transaction.description
                 });
                 toggleEditMode();
                 onTransactionEdited();
@@ -317,6 +316,10 @@ const TransactionTableRow = ({ transaction, onTransactionEdited, methods }) => {
                         <option value="monthly">Monthly</option>
                     </select>
                 </td>
+                <td>
+                    <input type="text" className="form-control" name="merchant" value={formState.merchant} onChange={handleChange} placeholder="Merchant" maxLength="100"></input>
+                    <input type="text" className="form-control" name="description" value={formState.description} onChange={handleChange} placeholder="Description" maxLength="200"></input>
+                </td>
                 <td>
                     <input type="text" readOnly className="form-control-plaintext" value={formatTimestamp(transaction.date)}></input>
                 </td>
@@ -334,36 +337,51 @@ const TransactionTableRow = ({ transaction, onTransactionEdited, methods }) => {
             <td>${transaction.amount}</td>
             <td>{capitalizeFirstLetter(transaction.category)}</td>
             <td>{capitalizeFirstLetter(transaction.repeat_interval)}</td>
+            <td>
+                {transaction.merchant}
+                {transaction.description && <div className="text-muted small">{transaction.description}</div>}
+            </td>
             <td>{formatTimestamp(transaction.date)}</td>
         </tr>
     );
 }
 
 // Main Details Component
-function Details({ transactions, onTransactionEdited, methods }) {
-    const [monthList, setMonthList] = React.useState([]);
-    const [filteredTransactions, setFilteredTransactions] = React.useState(transactions);
+function Details({ firstPage, monthList, onTransactionEdited, methods }) {
+    const [pageTransactions, setPageTransactions] = React.useState([]);
     const [filter, setFilter] = React.useState({
         month: '',
         type: '',
-        method: ''
+        method: '',
+        search: '',
+        includeArchived: false
     });
-    const [currentPage, setCurrentPage] = React.useState(1);
-    const PageSize = 10;
-
-    React.useEffect(() => {
-        fetch('/list_months')
-            .then(response => response.json())
-            .then(monthList => setMonthList(monthList));
-    }, []);
+    // Cursors of the pages visited so far, the last one being the current page
+    const [cursors, setCursors] = React.useState(['']);
+    const [nextCursor, setNextCursor] = React.useState(null);
+    // Search text once the user stops typing, so a search runs per pause
+    // rather than per keystroke
+    const [search, setSearch] = React.useState('');
+    // Controller of the page request in flight, aborted by the next one so a
+    // slow response never replaces newer results
+    const pageRequest = React.useRef(null);
 
     React.useEffect(() => {
-        setFilteredTransactions(transactions);
-    }, [transactions]);
+        const timer = setTimeout(() => setSearch(filter.search.trim()), SearchDelay);
+        return () => clearTimeout(timer);
+    }, [filter.search]);
 
     React.useEffect(() => {
-        filterTransactions();
-    }, [filter]);
+        if (filter.month || filter.type || filter.method || search || filter.includeArchived) {
+            fetchPage('', ['']);
+        } else {
+            // The first unfiltered page comes with the dashboard data
+            pageRequest.current?.abort();
+            setPageTransactions(firstPage.transactions);
+            setNextCursor(firstPage.next_cursor);
+            setCursors(['']);
+        }
+    }, [filter.month, filter.type, filter.method, filter.includeArchived, search, firstPage]);
 
     function handleFilterChange(e) {
         const { name, value } = e.target;
@@ -373,34 +391,75 @@ function Details({ transactions, onTransactionEdited, methods }) {
         });
     }
 
-    function filterTransactions() {
-        let filtered = transactions;
+    function handleArchivedChange(e) {
+        setFilter({
+            ...filter,
+            includeArchived: e.target.checked
+        });
+    }
+
+    function fetchPage(cursor, visitedCursors) {
+        const params = new URLSearchParams({ limit: PageSize });
 
         if (filter.month) {
             const [month, year] = filter.month.split(' ');
             const monthIndex = new Date(Date.parse(month + " 1, 2000")).getMonth() + 1;
-            filtered = filtered.filter(transaction => {
-                const transactionDate = new Date(transaction.date);
-                return transactionDate.getMonth() + 1 === monthIndex && transactionDate.getFullYear() === parseInt(year);
-            });
+            params.append('month', `${year}-${String(monthIndex).padStart(2, '0')}`);
         }
 
         if (filter.type) {
-            filtered = filtered.filter(transaction => transaction.type === filter.type);
+            params.append('type', filter.type);
         }
 
         if (filter.method) {
-            filtered = filtered.filter(transaction => transaction.methodID === parseInt(filter.method));
+            params.append('method', filter.method);
+        }
+
+        if (filter.includeArchived) {
+            params.append('include_archived', '1');
+        }
+
+        if (cursor) {
+            params.append('cursor', cursor);
+        }
+
+        // Searches return the best matches first instead of the newest
+        let url = '/transactions';
+        if (search) {
+            params.append('q', search);
+            url = '/search';
         }
 
-        setFilteredTransactions(filtered);
+        pageRequest.current?.abort();
+        const controller = new AbortController();
+        pageRequest.current = controller;
+
+        fetch(`${url}?${params}`, { signal: controller.signal })
+            .then(response => response.json())
+            .then(data => {
+                setPageTransactions(data.transactions);
+                setNextCursor(data.next_cursor);
+                setCursors(visitedCursors);
+            })
+            .catch(error => {
+                if (error.name !== 'AbortError') {
+                    console.error('Fetch operation failed', error);
+                }
+            });
+    }
+
+    function handleNextPage() {
+        if (nextCursor) {
+            fetchPage(nextCursor, [...cursors, nextCursor]);
+        }
     }
 
-    const currentListData = React.useMemo(() => {
-        const firstPageIndex = (currentPage - 1) * PageSize;
-        const lastPageIndex = firstPageIndex + PageSize;
-        return filteredTransactions.slice(firstPageIndex, lastPageIndex);
-    }, [currentPage, filteredTransactions]);
+    function handlePreviousPage() {
+        if (cursors.length > 1) {
+            const visitedCursors = cursors.slice(0, -1);
+            fetchPage(visitedCursors[visitedCursors.length - 1], visitedCursors);
+        }
+    }
 
     return (
         <div id="details">
@@ -436,6 +495,16 @@ function Details({ transactions, onTransactionEdited, methods }) {
                         <option key={method.id} value={method.id}> {method.name} </option>
                     ))}
                 </select>
+                <Spacer size="3"/>
+                <label>Search</label>
+                <input type="search" className="form-control" name="search" value={filter.search}
+                       placeholder="Merchant or description" onChange={handleFilterChange}/>
+                <Spacer size="3"/>
+                <div className="form-check form-switch">
+                    <input className="form-check-input" type="checkbox" role="switch" id="include-archived"
+                           checked={filter.includeArchived} onChange={handleArchivedChange}/>
+                    <label className="form-check-label" htmlFor="include-archived">Include archived transactions</label>
+                </div>
             </form>
             <Spacer size="4" />
             <div>
@@ -451,12 +520,13 @@ function Details({ transactions, onTransactionEdited, methods }) {
                                 <th scope="col">Amount</th>
                                 <th scope="col">Category</th>
                                 <th scope="col">Repetition</th>
+                                <th scope="col">Merchant</th>
                                 <th scope="col">Date</th>
                             </tr>
                         </thead>
                         <tbody>
-                        {currentListData.length === 0 && <EmptyTransaction/>}
-                        {currentListData.map(transaction => (
+                        {pageTransactions.length === 0 && <EmptyTransaction/>}
+                        {pageTransactions.map(transaction => (
                             <TransactionTableRow
                                 key={transaction.id}
                                 transaction={transaction}
@@ -468,12 +538,12 @@ function Details({ transactions, onTransactionEdited, methods }) {
                     </table>
                     <hr/>
                 </div>
-                {filteredTransactions.length > PageSize ? <Pagination
+                {cursors.length > 1 || nextCursor ? <Pagination
                     className="pagination-bar"
-                    currentPage={currentPage}
-                    totalCount={filteredTransactions.length}
-                    pageSize={PageSize}
-                    onPageChange={page => setCurrentPage(page)}
+                    currentPage={cursors.length}
+                    hasNext={nextCursor !== null}
+                    onPrevious={handlePreviousPage}
+                    onNext={handleNextPage}
                 /> : null}
                 <Spacer size="5" />
             </div>
@@ -481,22 +551,14 @@ function Details({ transactions, onTransactionEdited, methods }) {
     );
 }
 
-const Pagination = ({ className, currentPage, totalCount, pageSize, onPageChange }) => {
-    const totalPages = Math.ceil(totalCount / pageSize);
-
-    const handleClick = (page) => {
-        if (onPageChange) { 
-            onPageChange(page); 
-        }
-    };
-
+const Pagination = ({ className, currentPage, hasNext, onPrevious, onNext }) => {
     return (
         <ul className={`pagination ${className} flex-row space-evenly`}>
-            <li className={`page-item ${currentPage === 1 ? 'disabled' : ''}`} onClick={() => handleClick(currentPage - 1)} > 
+            <li className={`page-item ${currentPage === 1 ? 'disabled' : ''}`} onClick={onPrevious} > 
                 <strong className="clickable">Previous</strong>
             </li>
             <big>{currentPage}</big>
-            <li className={`page-item ${currentPage === totalPages ? 'disabled' : ''}`} onClick={() => handleClick(currentPage + 1)} >
+            <li className={`page-item ${!hasNext ? 'disabled' : ''}`} onClick={onNext} >
                 <strong className="clickable">Next</strong>
             </li>
         </ul>
@@ -537,7 +599,9 @@ function TransactionForm ({ onTransactionAdded, methods }) {
         category: '',
         paymentMethod: '',
         amount: '',
-        repetition: 'none'
+        repetition: 'none',
+        merchant: '',
+        description: ''
     });
 
     const handleChange = (e) => {
@@ -576,7 +640,9 @@ function TransactionForm ({ onTransactionAdded, methods }) {
                         category: '',
                         paymentMethod: '',
                         amount: '',
-                        repetition: 'none'
+                        repetition: 'none',
+                        merchant: '',
+                        description: ''
                     });
                     setChecked(false);
                     setAlert({ success: true, error: false, warning: false });
@@ -629,6 +695,16 @@ function TransactionForm ({ onTransactionAdded, methods }) {
                 <input type="number" className="form-control" id="form-amount"
                        placeholder="0.00" min="0.01" name="amount" value={state.amount} onChange={handleChange}/>
             </div>
+            <div className="mb-3">
+                <label htmlFor="form-merchant" className="form-label">Merchant</label>
+                <input type="text" className="form-control" id="form-merchant" maxLength="100"
+                       name="merchant" value={state.merchant} onChange={handleChange}/>
+            </div>
+            <div className="mb-3">
+                <label htmlFor="form-description" className="form-label">Description</label>
+                <input type="text" className="form-control" id="form-description" maxLength="200"
+                       name="description" value={state.description} onChange={handleChange}/>
+            </div>
             <Spacer size="2" />
             <div className="form-check form-switch">
                 <input className="form-check-input" type="checkbox" role="switch" id="flexSwitchCheckChecked" value={checked} onChange={handleCheck}/>
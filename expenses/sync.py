@@ -0,0 +1,75 @@
+from django.db.models import Max
+
+from .models import Change, PaymentMethod, Transaction
+from .serializers import serialize_methods, serialize_transactions, transaction_rows
+
+# Maximum number of logged changes read per sync request
+SYNC_LIMIT = 1000
+
+
+def latest_cursor(user):
+    return Change.objects.filter(userID=user).aggregate(cursor=Max('id'))['cursor'] or 0
+
+
+def full_state(user):
+    """
+    Returns every transaction and payment method of the user with the cursor to
+    sync from afterwards. The cursor is read first, so a write made while the
+    rows are read is sent again on the next sync rather than missed.
+    """
+
+    cursor = latest_cursor(user)
+    return {
+        "cursor": cursor,
+        "has_more": False,
+        "transactions": serialize_transactions(
+            transaction_rows(Transaction.objects.filter(userID=user).order_by('id'))),
+        "methods": serialize_methods(PaymentMethod.objects.filter(userID=user).order_by('id')),
+        "deleted": {"transactions": [], "methods": []},
+    }
+
+
+def changes_since(user, cursor, limit=SYNC_LIMIT):
+    """
+    Returns the current state of the transactions and payment methods changed
+    after a cursor, and the ids of the deleted ones. Several changes to the
+    same row are sent once.
+    Args:
+        user: owner of the data
+        cursor: id of the last change the client has seen
+        limit: maximum number of logged changes to read
+    Returns:
+        JSON-ready dictionary with the next cursor and whether more changes
+        are waiting
+    """
+
+    changes = list(Change.objects.filter(userID=user, id__gt=cursor)
+                   .order_by('id')
+                   .values_list('id', 'model', 'object_id', 'deleted')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    # The last change of each row decides whether it is sent or deleted
+    latest = {}
+    for _, model, object_id, deleted in changes:
+        latest[model, object_id] = deleted
+    changed = {'transaction': [], 'method': []}
+    deleted = {'transaction': [], 'method': []}
+    for (model, object_id), is_deleted in latest.items():
+        (deleted if is_deleted else changed)[model].append(object_id)
+
+    transactions = serialize_transactions(transaction_rows(
+        Transaction.objects.filter(userID=user, id__in=changed['transaction']).order_by('id')))
+    methods = serialize_methods(PaymentMethod.objects.filter(userID=user, id__in=changed['method']).order_by('id'))
+
+    # Rows deleted by a change past this page are gone already
+    deleted['transaction'] += sorted(set(changed['transaction']) - {item['id'] for item in transactions})
+    deleted['method'] += sorted(set(changed['method']) - {item['id'] for item in methods})
+
+    return {
+        "cursor": changes[-1][0] if changes else cursor,
+        "has_more": has_more,
+        "transactions": transactions,
+        "methods": methods,
+        "deleted": {"transactions": sorted(deleted['transaction']), "methods": sorted(deleted['method'])},
+    }
@@ -0,0 +1,140 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MonthlyRollup, PaymentMethod, Transaction, User
+
+BATCH_SIZE = 5000
+
+PASSWORD = 'benchmark'
+
+TIME_ZONES = ['UTC', 'America/New_York', 'America/Santo_Domingo', 'Europe/Madrid', 'Asia/Tokyo']
+
+# (category, weight, median amount) of generated transactions
+EXPENSE_CATEGORIES = [
+    ('food', 40, 18), ('shopping', 15, 45), ('transportation', 12, 12),
+    ('entertainment', 10, 30), ('housing', 5, 900), ('vehicle', 5, 120),
+    ('financial', 8, 60), ('other', 5, 25),
+]
+INCOME_CATEGORIES = [('earned', 70, 1500), ('passive', 20, 200), ('porfolio', 10, 350)]
+
+EXTRA_METHODS = [
+    ('Debit card', 'debit', 'visa'), ('Credit card', 'credit', 'mastercard'),
+    ('Travel card', 'credit', 'am'), ('Store card', 'credit', 'discovery'),
+]
+
+# Merchants of generated transactions, by category
+MERCHANTS = {
+    'food': ['Corner Bakery', 'Green Grocer', 'Sushi Palace', 'Pizzeria Napoli', 'Café Olé', 'Fresh Market'],
+    'shopping': ['Book Nook', 'Hardware Depot', 'City Outlet', 'Gadget Store'],
+    'transportation': ['Metro Transit', 'Yellow Cab', 'Bike Share'],
+    'entertainment': ['Starlight Cinema', 'Concert Hall', 'Game Zone'],
+    'housing': ['Oak Street Rentals', 'Power & Light', 'Water Works'],
+    'vehicle': ['Quick Lube', 'Shell Station', 'Tire Center'],
+    'financial': ['First National Bank', 'Insurance Mutual'],
+    'other': ['Post Office', 'Pharmacy Plus'],
+    'earned': ['Acme Corp', 'Freelance Client'],
+    'passive': ['Savings Account', 'Rental Income'],
+    'porfolio': ['Brokerage', 'Dividend Fund'],
+}
+DESCRIPTION_WORDS = ['weekly', 'groceries', 'lunch', 'dinner', 'gift', 'refund', 'monthly', 'bill',
+                     'birthday', 'trip', 'office', 'supplies', 'coffee', 'repair', 'ticket', 'salary']
+
+
+def _pick(rng, choices):
+    category, _, median = rng.choices(choices, weights=[weight for _, weight, _ in choices])[0]
+    # Amounts are log-normally distributed around the category median
+    amount = min(median * rng.lognormvariate(0, 0.8), 99999999)
+    return category, Decimal(f'{amount:.2f}')
+
+
+def transaction_count(rng, mean):
+    """
+    Draws how many transactions a regular user has. Most users have a few, a
+    long tail has many.
+    """
+
+    return max(1, int(rng.lognormvariate(0, 1) * mean / 1.65))
+
+
+def generate_transactions(rng, user, methods, count, now, days=730):
+    """
+    Builds unsaved transactions for a user, spread over the last `days` days.
+    About one in eight is income and one in twenty repeats. Every transaction
+    has a merchant of its category and a few words of description.
+    """
+
+    for _ in range(count):
+        if rng.random() < 0.125:
+            transaction_type = 'income'
+            category, amount = _pick(rng, INCOME_CATEGORIES)
+        else:
+            transaction_type = 'expense'
+            category, amount = _pick(rng, EXPENSE_CATEGORIES)
+        roll = rng.random()
+        repeat_interval = 'weekly' if roll < 0.02 else 'monthly' if roll < 0.05 else 'none'
+        yield Transaction(userID=user, payment_methodID_id=rng.choice(methods),
+                          transaction_type=transaction_type, category=category, amount=amount,
+                          date=now - timedelta(seconds=rng.randrange(days * 86400)),
+                          repeat_interval=repeat_interval,
+                          merchant=rng.choice(MERCHANTS[category]),
+                          description=' '.join(rng.sample(DESCRIPTION_WORDS, rng.randint(0, 3))))
+
+
+def seed(users=50, transactions=200, heavy_users=1, heavy_transactions=100000, seed=0):
+    """
+    Creates a reproducible population of users, payment methods and
+    transactions, then builds their rollups.
+    Args:
+        users: number of regular users
+        transactions: mean number of transactions of a regular user
+        heavy_users: number of heavy-tail users
+        heavy_transactions: number of transactions of each heavy-tail user
+        seed: random seed, so runs with the same arguments create the same data
+    Returns:
+        Dictionary of {"regular": [users], "heavy": [users]}
+    """
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+    prefix = f'bench-{seed}'
+
+    with transaction.atomic():
+        # bulk_create skips the signal that creates the default Cash method
+        created = User.objects.bulk_create([
+            User(username=f'{prefix}-{kind}-{index}', password=password, time_zone=rng.choice(TIME_ZONES))
+            for kind, count in (('user', users), ('heavy', heavy_users))
+            for index in range(count)
+        ])
+        methods = {}
+        for user in created:
+            extra = rng.sample(EXTRA_METHODS, rng.randint(0, len(EXTRA_METHODS)))
+            methods[user.id] = [PaymentMethod(userID=user, name='Cash', type='cash', processor='none')] + [
+                PaymentMethod(userID=user, name=name, type=method_type, processor=processor)
+                for name, method_type, processor in extra
+            ]
+        PaymentMethod.objects.bulk_create([method for group in methods.values() for method in group])
+
+        batch = []
+        for user in created:
+            heavy = user.username.startswith(f'{prefix}-heavy')
+            count = heavy_transactions if heavy else transaction_count(rng, transactions)
+            method_ids = [method.id for method in methods[user.id]]
+            for item in generate_transactions(rng, user, method_ids, count, now):
+                batch.append(item)
+                if len(batch) >= BATCH_SIZE:
+                    Transaction.objects.bulk_create(batch)
+                    batch.clear()
+        Transaction.objects.bulk_create(batch)
+
+        MonthlyRollup.rebuild(User.objects.filter(id__in=[user.id for user in created]))
+
+    return {
+        'regular': [user for user in created if user.username.startswith(f'{prefix}-user')],
+        'heavy': [user for user in created if user.username.startswith(f'{prefix}-heavy')],
+    }
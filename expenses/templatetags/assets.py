@@ -0,0 +1,30 @@
+from django import template
+from django.templatetags.static import static
+from django.urls import reverse
+
+from ..assets import built_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def asset(name):
+    """
+    URL of a static file: its fingerprinted, precompressed copy when
+    build_static has run, the plain static URL otherwise.
+    """
+
+    hashed = built_name(name)
+    return reverse('asset', args=[hashed]) if hashed else static(name)
+
+
+@register.simple_tag
+def built_asset(name):
+    """
+    URL of the fingerprinted copy of a static file, or an empty string if the
+    last build did not include it. For files that are optional, like vendored
+    libraries.
+    """
+
+    hashed = built_name(name)
+    return reverse('asset', args=[hashed]) if hashed else ''
@@ -1,3 +1,1627 @@
-from django.test import TestCase
+import calendar
+import gzip
+import json
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import (epoch_month, linear_projection, load_history, month_start, rolling_averages,
+                        seasonal_projection)
+from .archive import archive_cutoff, archive_transactions
+from .cache import STATS_FLUSH_EVERY, cache_stats, clear_cache_stats, result_cache
+from .models import (ArchivedTransaction, Budget, BudgetAlert, CategorySpend, User, MonthlyRollup, PaymentMethod,
+                     RecurrencePause, Transaction)
+from .pagination import encode_cursor, keyset_page
+from .reports import bucket_count
+from .schedule import Template, count_occurrences, materialize, monthly_projection, occurrence_dates
+from .sync import changes_since
+from .urls import urlpatterns
+from .views import filter_transactions
+
+
+def make_transaction(user, method, amount, date, transaction_type='expense',
+                     category='food', repeat_interval='none', description='', merchant=''):
+    return Transaction.objects.create(userID=user, payment_methodID=method,
+                                      transaction_type=transaction_type,
+                                      category=category, amount=Decimal(amount),
+                                      date=date, repeat_interval=repeat_interval,
+                                      description=description, merchant=merchant)
+
+
+class ListTransactionsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.card = PaymentMethod.objects.create(userID=self.user, name='Card',
+                                                 type='credit', processor='visa')
+        self.client.force_login(self.user)
+
+    def test_pages_follow_cursor_without_gaps(self):
+        same_date = datetime(2024, 3, 10, 12, tzinfo=dt_timezone.utc)
+        created = [make_transaction(self.user, self.cash, i + 1, same_date) for i in range(5)]
+
+        seen = []
+        cursor = ''
+        while True:
+            response = self.client.get(reverse('transactions'), {'limit': 2, 'cursor': cursor})
+            data = response.json()
+            seen.extend(transaction['id'] for transaction in data['transactions'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(seen, sorted((t.id for t in created), reverse=True))
+
+    def test_filters(self):
+        make_transaction(self.user, self.cash, 10, datetime(2024, 2, 29, 23, tzinfo=dt_timezone.utc))
+        march_card = make_transaction(self.user, self.card, 20, datetime(2024, 3, 1, tzinfo=dt_timezone.utc))
+        make_transaction(self.user, self.card, 30, datetime(2024, 3, 2, tzinfo=dt_timezone.utc),
+                         transaction_type='income', category='earned')
+
+        response = self.client.get(reverse('transactions'), {'month': '2024-03', 'type': 'expense',
+                                                             'method': self.card.id, 'category': 'food'})
+
+        self.assertEqual([t['id'] for t in response.json()['transactions']], [march_card.id])
+        self.assertIsNone(response.json()['next_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('transactions'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportTransactionsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def test_streams_csv_and_ndjson(self):
+        make_transaction(self.user, self.cash, '12.50', datetime(2024, 3, 1, tzinfo=dt_timezone.utc))
+        make_transaction(self.user, None, '3.00', datetime(2024, 3, 2, tzinfo=dt_timezone.utc))
+
+        response = self.client.get(reverse('export_transactions'), {'format': 'csv'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,date,type,category,amount,repeat_interval,methodID,methodName,repeat_until,'
+                                   'description,merchant')
+        self.assertEqual(len(lines), 3)
+        self.assertIn('12.50', lines[1])
+
+        response = self.client.get(reverse('export_transactions'), {'format': 'ndjson'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['amount'] for row in rows], ['12.50', '3.00'])
+        self.assertIsNone(rows[1]['methodName'])
+
+    def test_rejects_unknown_format(self):
+        response = self.client.get(reverse('export_transactions'), {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class UserSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def test_totals(self):
+        now = timezone.now()
+        today = timezone.localdate()
+        card = PaymentMethod.objects.create(userID=self.user, name='Card', type='debit', processor='visa')
+        make_transaction(self.user, self.cash, '1000', now, transaction_type='income', category='earned')
+        make_transaction(self.user, card, '50', now)
+        weekly = make_transaction(self.user, card, '10', now - timedelta(weeks=8), repeat_interval='weekly')
+        make_transaction(self.user, self.cash, '200', now - timedelta(days=400), repeat_interval='monthly',
+                         category='housing')
+        make_transaction(self.user, card, '999', now - timedelta(days=400))
+
+        summary = self.client.get(reverse('summary')).json()
+
+        # The weekly expense occurs four or five times depending on the month
+        anchor = timezone.localdate(weekly.date)
+        weeks = sum(1 for day in range(1, calendar.monthrange(today.year, today.month)[1] + 1)
+                    if (today.replace(day=day) - anchor).days % 7 == 0)
+        self.assertEqual(summary['income_amount'], 1000)
+        self.assertEqual(summary['variable_expense_amount'], 50)
+        self.assertEqual(summary['fixed_expense_amount'], 10 * weeks + 200)
+        self.assertEqual(summary['expense_amount'], 10 * weeks + 250)
+        self.assertEqual(summary['balance'], 750 - 10 * weeks)
+        self.assertEqual(summary['payment_method_balances'], {'Cash': 800, 'Card': -1059})
+
+    def test_ended_and_paused_schedules_are_not_counted(self):
+        today = timezone.localdate()
+        start = timezone.now() - timedelta(days=100)
+        ended = make_transaction(self.user, self.cash, '30', start, repeat_interval='weekly')
+        ended.repeat_until = today.replace(day=1) - timedelta(days=1)
+        ended.save()
+        paused = make_transaction(self.user, self.cash, '70', start, repeat_interval='monthly')
+        RecurrencePause.objects.create(transactionID=paused, start=today.replace(day=1),
+                                       end=today.replace(day=28))
+
+        summary = self.client.get(reverse('summary')).json()
+
+        self.assertEqual(summary['fixed_expense_amount'], 0)
+
+    def test_query_count_does_not_grow_with_methods(self):
+        for i in range(30):
+            method = PaymentMethod.objects.create(userID=self.user, name=f'Card {i}',
+                                                  type='credit', processor='visa')
+            make_transaction(self.user, method, '5', timezone.now())
+
+        # request user, totals, recurring transactions and method balances.
+        # The session comes from the session cache.
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('summary'))
+
+        self.assertEqual(len(response.json()['payment_method_balances']), 31)
+
+
+class MonthlyRollupTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.card = PaymentMethod.objects.create(userID=self.user, name='Card', type='debit', processor='visa')
+
+    def assertRollupsMatchTransactions(self):
+        stored = {tuple(getattr(rollup, field) for field in MonthlyRollup.KEY_FIELDS): (rollup.total, rollup.count)
+                  for rollup in MonthlyRollup.objects.all()}
+        self.assertEqual(stored, MonthlyRollup.expected(User.objects.all()))
+
+    def test_rollups_follow_creates_edits_and_deletes(self):
+        january = datetime(2024, 1, 15, tzinfo=dt_timezone.utc)
+        first = make_transaction(self.user, self.cash, '10', january)
+        second = make_transaction(self.user, self.cash, '5', january)
+        self.assertEqual(MonthlyRollup.objects.get().total, Decimal('15'))
+
+        first.date = datetime(2024, 2, 1, tzinfo=dt_timezone.utc)
+        first.transaction_type = 'income'
+        first.category = 'earned'
+        first.payment_methodID = self.card
+        first.amount = '12.5'
+        first.save()
+        self.assertRollupsMatchTransactions()
+
+        second.delete()
+        self.assertRollupsMatchTransactions()
+        self.assertEqual(MonthlyRollup.objects.count(), 1)
+
+    def test_deleting_method_moves_totals_to_no_method(self):
+        date = datetime(2024, 1, 15, tzinfo=dt_timezone.utc)
+        make_transaction(self.user, self.card, '10', date)
+        make_transaction(self.user, None, '5', date)
+
+        self.card.delete()
+
+        self.assertRollupsMatchTransactions()
+        self.assertEqual(MonthlyRollup.objects.get().total, Decimal('15'))
+
+    def test_deleting_user_removes_rollups(self):
+        make_transaction(self.user, self.card, '10', timezone.now())
+        self.user.delete()
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+    def test_verify_command(self):
+        make_transaction(self.user, self.card, '10', timezone.now())
+        call_command('rebuild_rollups', verify=True, stdout=StringIO())
+
+        MonthlyRollup.objects.update(total=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', verify=True, stdout=StringIO())
+
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertRollupsMatchTransactions()
+
+
+class ListMonthsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def test_months_in_user_time_zone(self):
+        make_transaction(self.user, self.cash, '1', datetime(2024, 3, 1, 2, tzinfo=dt_timezone.utc))
+        make_transaction(self.user, self.cash, '1', datetime(2024, 3, 5, tzinfo=dt_timezone.utc))
+        make_transaction(self.user, self.cash, '1', datetime(2023, 12, 5, tzinfo=dt_timezone.utc))
+
+        self.assertEqual(self.client.get(reverse('list_months')).json(), [
+            {'month': 'March', 'year': 2024},
+            {'month': 'December', 'year': 2023},
+        ])
+
+        # 2am UTC on March 1st is still February in New York
+        self.user.time_zone = 'America/New_York'
+        self.user.save()
+
+        self.assertEqual(self.client.get(reverse('list_months')).json(), [
+            {'month': 'March', 'year': 2024},
+            {'month': 'February', 'year': 2024},
+            {'month': 'December', 'year': 2023},
+        ])
+
+
+class QueryPlanTests(TestCase):
+    """
+    Guards the hot Transaction queries against falling back to full table scans.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+
+    def assertUsesIndex(self, queryset, index):
+        plan = queryset.explain()
+        self.assertIn(f'USING INDEX {index}', plan)
+        self.assertNotIn('SCAN expenses_transaction', plan)
+
+    def test_listing_by_month(self):
+        transactions = filter_transactions(self.user, {'month': '2024-03'})
+        self.assertUsesIndex(transactions.order_by('-date', '-id'), 'transaction_user_date_idx')
+
+    def test_listing_page_after_cursor(self):
+        last = make_transaction(self.user, self.cash, '1', timezone.now())
+        page = keyset_page(Transaction.objects.filter(userID=self.user), encode_cursor(last.date, last.id), 10)
+
+        with CaptureQueriesContext(connection) as queries:
+            keyset_page(Transaction.objects.filter(userID=self.user), encode_cursor(last.date, last.id), 10)
+        plan = connection.cursor().execute('EXPLAIN QUERY PLAN ' + queries[0]['sql']).fetchall()
+
+        self.assertEqual(page, ([], None))
+        self.assertIn('USING INDEX transaction_user_date_idx', plan[0][-1])
+
+    def test_export_needs_no_sort(self):
+        transactions = Transaction.objects.filter(userID=self.user).order_by('date', 'id')
+        self.assertUsesIndex(transactions, 'transaction_user_date_idx')
+        self.assertNotIn('TEMP B-TREE', transactions.explain())
+
+    def test_recurring_transactions(self):
+        transactions = Transaction.objects.filter(userID=self.user, transaction_type='expense', repeat_interval='weekly')
+        self.assertUsesIndex(transactions, 'transaction_user_type_rep_idx')
+
+    def test_method_transactions(self):
+        transactions = Transaction.objects.filter(userID=self.user, payment_methodID=self.cash, transaction_type='income')
+        self.assertUsesIndex(transactions, 'transaction_user_method_idx')
+
+
+class ImportTransactionsTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def test_json_import_reports_invalid_rows(self):
+        rows = [
+            {'type': 'expense', 'category': 'food', 'amount': '12.30', 'date': '2020-05-04', 'method': 'cash'},
+            {'type': 'income', 'category': 'earned', 'amount': 1000, 'methodID': self.cash.id},
+            {'type': 'expense', 'category': 'groceries', 'amount': '1'},
+            {'type': 'expense', 'category': 'food', 'amount': 'ten'},
+            {'type': 'expense', 'category': 'food', 'amount': '1', 'method': 'Savings'},
+        ]
+
+        response = self.client.post(reverse('import_transactions'), rows, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [3, 4, 5])
+        imported = Transaction.objects.get(amount=Decimal('12.30'))
+        self.assertEqual(imported.payment_methodID, self.cash)
+        self.assertEqual(imported.date, datetime(2020, 5, 4, tzinfo=dt_timezone.utc))
+        self.assertEqual(MonthlyRollup.objects.filter(year=2020, month=5).get().total, Decimal('12.30'))
+
+    def test_json_values_of_the_wrong_type_are_row_errors(self):
+        valid = {'type': 'expense', 'category': 'food', 'amount': '1'}
+        rows = [
+            {**valid, 'type': ['x']},
+            {**valid, 'category': {'name': 'food'}},
+            {**valid, 'date': 5},
+            {**valid, 'repeat_interval': ['monthly']},
+            {**valid, 'repeat_until': 20240101},
+            {**valid, 'merchant': ['Shop']},
+            valid,
+        ]
+
+        response = self.client.post(reverse('import_transactions'), rows, content_type='application/json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [1, 2, 3, 4, 5, 6])
+
+    def test_json_imports_are_not_limited_by_the_upload_memory_size(self):
+        rows = [{'type': 'expense', 'category': 'food', 'amount': '1', 'merchant': 'Corner shop'}] * 50
+        body = json.dumps(rows)
+
+        with override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=len(body) // 2):
+            response = self.client.post(reverse('import_transactions'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 50)
+
+        with override_settings(EXPENSES_MAX_IMPORT_BYTES=len(body) // 2):
+            response = self.client.post(reverse('import_transactions'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('CSV', response.json()['error'])
+        self.assertEqual(Transaction.objects.count(), 50)
+
+    def test_exported_csv_imports_back(self):
+        make_transaction(self.user, self.cash, '7.25', datetime(2023, 1, 2, tzinfo=dt_timezone.utc))
+        make_transaction(self.user, None, '3.00', datetime(2023, 2, 2, tzinfo=dt_timezone.utc),
+                         transaction_type='income', category='earned', repeat_interval='monthly')
+        exported = b''.join(self.client.get(reverse('export_transactions')).streaming_content)
+        other = User.objects.create_user('bob', 'bob@example.com', 'password')
+        self.client.force_login(other)
+
+        upload = SimpleUploadedFile('history.csv', exported, content_type='text/csv')
+        response = self.client.post(reverse('import_transactions'), {'file': upload})
+
+        self.assertEqual(response.json(), {'created': 2, 'errors': []})
+        self.assertEqual(
+            list(Transaction.objects.filter(userID=other).order_by('date').values_list(
+                'amount', 'date', 'repeat_interval', 'payment_methodID__name')),
+            [(Decimal('7.25'), datetime(2023, 1, 2, tzinfo=dt_timezone.utc), 'none', 'Cash'),
+             (Decimal('3.00'), datetime(2023, 2, 2, tzinfo=dt_timezone.utc), 'monthly', None)])
+        self.assertEqual(MonthlyRollup.expected(User.objects.filter(pk=other.pk)),
+                         {tuple(getattr(rollup, field) for field in MonthlyRollup.KEY_FIELDS): (rollup.total, rollup.count)
+                          for rollup in MonthlyRollup.objects.filter(userID=other)})
+
+
+class BatchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def post_batch(self, operations):
+        return self.client.post(reverse('batch'), {'operations': operations}, content_type='application/json')
+
+    def assertRollupsMatchTransactions(self):
+        stored = {tuple(getattr(rollup, field) for field in MonthlyRollup.KEY_FIELDS): (rollup.total, rollup.count)
+                  for rollup in MonthlyRollup.objects.all()}
+        self.assertEqual(stored, MonthlyRollup.expected(User.objects.all()))
+
+    def test_mixed_operations(self):
+        card = PaymentMethod.objects.create(userID=self.user, name='Card', type='debit', processor='visa')
+        moved = make_transaction(self.user, self.cash, '10', datetime(2024, 1, 5, tzinfo=dt_timezone.utc))
+        deleted = make_transaction(self.user, self.cash, '20', datetime(2024, 1, 6, tzinfo=dt_timezone.utc))
+        orphaned = make_transaction(self.user, card, '30', datetime(2024, 1, 7, tzinfo=dt_timezone.utc))
+
+        response = self.post_batch([
+            {'action': 'create', 'model': 'method', 'data': {'name': 'Savings', 'type': 'debit', 'processor': 'none'}},
+            {'action': 'create', 'model': 'transaction',
+             'data': {'type': 'income', 'category': 'earned', 'amount': '100', 'method': 'Savings'}},
+            {'action': 'update', 'model': 'transaction', 'id': moved.id,
+             'data': {'amount': '15', 'date': '2024-02-01', 'category': 'housing'}},
+            {'action': 'delete', 'model': 'transaction', 'id': deleted.id},
+            {'action': 'delete', 'model': 'method', 'id': card.id},
+        ])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertTrue(all(result['status'] == 'ok' for result in results))
+        savings = PaymentMethod.objects.get(name='Savings')
+        self.assertEqual(results[0]['id'], savings.id)
+        self.assertEqual(Transaction.objects.get(pk=results[1]['id']).payment_methodID, savings)
+        moved.refresh_from_db()
+        self.assertEqual((moved.amount, moved.category, moved.date.month), (Decimal('15'), 'housing', 2))
+        self.assertFalse(Transaction.objects.filter(pk=deleted.pk).exists())
+        self.assertIsNone(Transaction.objects.get(pk=orphaned.pk).payment_methodID)
+        self.assertRollupsMatchTransactions()
+
+    def test_invalid_operation_rolls_back_everything(self):
+        kept = make_transaction(self.user, self.cash, '10', timezone.now())
+
+        response = self.post_batch([
+            {'action': 'delete', 'model': 'transaction', 'id': kept.id},
+            {'action': 'update', 'model': 'transaction', 'id': kept.id, 'data': {'category': 'nonsense'}},
+            {'action': 'create', 'model': 'method', 'data': {'name': 'Cash', 'type': 'cash'}},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['ok', 'error', 'error'])
+        self.assertTrue(Transaction.objects.filter(pk=kept.pk).exists())
+        self.assertRollupsMatchTransactions()
+
+    def test_values_of_the_wrong_type_are_operation_errors(self):
+        kept = make_transaction(self.user, self.cash, '10', timezone.now())
+
+        response = self.post_batch([
+            {'action': ['create'], 'model': 'transaction', 'data': {}},
+            {'action': 'create', 'model': {'name': 'method'}},
+            {'action': 'create', 'model': 'method', 'data': {'name': 'Card', 'type': ['debit']}},
+            {'action': 'update', 'model': 'method', 'id': self.cash.id, 'data': {'name': ['Cash']}},
+            {'action': 'create', 'model': 'transaction',
+             'data': {'type': ['x'], 'category': 'food', 'amount': '1'}},
+            {'action': 'update', 'model': 'transaction', 'id': kept.id, 'data': {'date': 5}},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual({result['status'] for result in response.json()['results']}, {'error'})
+
+    def test_deletes_do_not_query_per_row(self):
+        def delete_all():
+            ids = list(Transaction.objects.values_list('id', flat=True))
+            with CaptureQueriesContext(connection) as queries:
+                self.post_batch([{'action': 'delete', 'model': 'transaction', 'id': pk} for pk in ids])
+            return len(queries)
+
+        for i in range(3):
+            make_transaction(self.user, self.cash, '1', datetime(2024, 1, 1 + i, tzinfo=dt_timezone.utc))
+        few = delete_all()
+        for i in range(30):
+            make_transaction(self.user, self.cash, '1', datetime(2024, 1 + i % 12, 1, tzinfo=dt_timezone.utc))
+        many = delete_all()
+
+        self.assertEqual(few, many)
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+
+class SerializationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def test_rows_match_model_serialization(self):
+        make_transaction(self.user, self.cash, '12.50', datetime(2024, 3, 1, 8, 30, 15, 123456, tzinfo=dt_timezone.utc))
+        make_transaction(self.user, None, '3', datetime(2024, 3, 2, tzinfo=dt_timezone.utc), repeat_interval='weekly')
+
+        transactions = Transaction.objects.order_by('-date', '-id')
+        expected = json.loads(json.dumps([t.serialize() for t in transactions], cls=DjangoJSONEncoder))
+
+        self.assertEqual(self.client.get(reverse('list_all_transactions')).json(), expected)
+
+    def test_listing_query_count_does_not_grow(self):
+        for i in range(20):
+            make_transaction(self.user, self.cash, '1', timezone.now())
+
+        # request user and the joined listing
+        with self.assertNumQueries(2):
+            self.client.get(reverse('list_all_transactions'))
+
+    def test_columnar_format(self):
+        older = make_transaction(self.user, self.cash, '1.00', datetime(2024, 3, 1, tzinfo=dt_timezone.utc))
+        newer = make_transaction(self.user, None, '2.00', datetime(2024, 3, 2, tzinfo=dt_timezone.utc))
+
+        data = self.client.get(reverse('list_all_transactions'), {'format': 'columnar'}).json()
+
+        self.assertEqual(data['columns']['id'], [newer.id, older.id])
+        self.assertEqual(data['columns']['methodID'], [None, self.cash.id])
+        self.assertEqual(data['columns']['amount'], ['2.00', '1.00'])
+        self.assertEqual(data['columns']['date'], ['2024-03-02T00:00:00Z', '2024-03-01T00:00:00Z'])
+        self.assertEqual(data['methods'], {str(self.cash.id): 'Cash'})
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def test_unchanged_data_returns_304_without_queries(self):
+        for name in ['summary', 'list_methods', 'list_months', 'list_all_transactions', 'transactions']:
+            etag = self.client.get(reverse(name))['ETag']
+
+            # request user only
+            with self.assertNumQueries(1):
+                response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(response.status_code, 304, name)
+
+    def test_every_write_path_changes_the_etag(self):
+        def etag():
+            return self.client.get(reverse('list_all_transactions'))['ETag']
+
+        seen = [etag()]
+        transaction = make_transaction(self.user, self.cash, '1', timezone.now())
+        seen.append(etag())
+        self.client.post(reverse('edit_transaction', args=[transaction.id]), {
+            'methodID': self.cash.id, 'type': 'expense', 'repeat_interval': 'none',
+            'category': 'food', 'amount': '2'}, content_type='application/json')
+        seen.append(etag())
+        self.client.post(reverse('import_transactions'), [{'type': 'expense', 'category': 'food', 'amount': '3'}],
+                         content_type='application/json')
+        seen.append(etag())
+        self.client.post(reverse('batch'), {'operations': [
+            {'action': 'delete', 'model': 'transaction', 'id': transaction.id}]}, content_type='application/json')
+        seen.append(etag())
+        self.client.post(reverse('method'), {'methodName': 'Card', 'methodType': 'debit', 'methodProcessor': 'visa'},
+                         content_type='application/json')
+        seen.append(etag())
+
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_time_zone_change_changes_the_etag(self):
+        make_transaction(self.user, self.cash, '1', datetime(2024, 3, 1, 2, tzinfo=dt_timezone.utc))
+        response = self.client.get(reverse('list_months'))
+        etag = response['ETag']
+        self.assertEqual(response.json(), [{'month': 'March', 'year': 2024}])
+
+        self.user.refresh_from_db()
+        self.user.time_zone = 'America/New_York'
+        self.user.save()
+
+        response = self.client.get(reverse('list_months'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json(), [{'month': 'February', 'year': 2024}])
+
+    def test_saving_a_stale_user_keeps_the_new_version(self):
+        stale = User.objects.get(pk=self.user.pk)
+        etag = self.client.get(reverse('list_methods'))['ETag']
+        self.client.post(reverse('method'), {'methodName': 'Card', 'methodType': 'debit', 'methodProcessor': 'visa'},
+                         content_type='application/json')
+
+        stale.first_name = 'Alice'
+        stale.save()
+
+        response = self.client.get(reverse('list_methods'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Card', [method['name'] for method in response.json()])
+        self.assertEqual(User.objects.get(pk=self.user.pk).first_name, 'Alice')
+
+
+class ResultCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+        result_cache().clear()
+        clear_cache_stats()
+
+    def test_hits_until_data_changes(self):
+        make_transaction(self.user, self.cash, '10', timezone.now())
+        first = self.client.get(reverse('summary')).json()
+
+        # request user only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('summary')).json(), first)
+
+        # through the admin-style save path
+        transaction = Transaction.objects.get()
+        transaction.amount = 25
+        transaction.save()
+
+        self.assertEqual(self.client.get(reverse('summary')).json()['expense_amount'], 25)
+
+    def test_results_are_per_user_and_parameters(self):
+        other = User.objects.create_user('bob', 'bob@example.com', 'password')
+        make_transaction(self.user, self.cash, '10', datetime(2024, 3, 1, tzinfo=dt_timezone.utc))
+        self.client.get(reverse('transactions'), {'month': '2024-03'})
+
+        self.assertEqual(len(self.client.get(reverse('transactions'), {'month': '2024-04'}).json()['transactions']), 0)
+        self.client.force_login(other)
+        self.assertEqual(len(self.client.get(reverse('transactions'), {'month': '2024-03'}).json()['transactions']), 0)
+
+    def test_stats_are_staff_only(self):
+        self.client.get(reverse('list_methods'))
+        self.client.get(reverse('list_methods'))
+
+        self.assertEqual(self.client.get(reverse('cache_stats')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('cache_stats')).json()['list_methods'], {'hits': 1, 'misses': 1})
+
+    def test_counts_reach_the_shared_counters_in_batches(self):
+        for _ in range(STATS_FLUSH_EVERY - 1):
+            self.client.get(reverse('list_methods'))
+        self.assertIsNone(result_cache().get('stats:list_methods:hits'))
+
+        self.client.get(reverse('list_methods'))
+        self.assertEqual(result_cache().get('stats:list_methods:hits'), STATS_FLUSH_EVERY - 1)
+        self.assertEqual(cache_stats(['list_methods']), {'list_methods': {'hits': STATS_FLUSH_EVERY - 1, 'misses': 1}})
+
+
+class ScheduleTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+
+    def template(self, interval, anchor, until=None, pauses=()):
+        return Template(1, None, 'expense', 'food', Decimal('10'), interval, anchor, until, tuple(pauses))
+
+    def test_weekly_counts_follow_the_calendar(self):
+        # Mondays: five in January 2024, four in February 2024
+        monday = self.template('weekly', date(2023, 10, 2))
+        self.assertEqual(count_occurrences(monday, date(2024, 1, 1), date(2024, 2, 1)), 5)
+        self.assertEqual(count_occurrences(monday, date(2024, 2, 1), date(2024, 3, 1)), 4)
+        self.assertEqual(list(occurrence_dates(monday, date(2024, 2, 1), date(2024, 2, 15))),
+                         [date(2024, 2, 5), date(2024, 2, 12)])
+
+    def test_monthly_occurrences_are_moved_to_short_month_ends(self):
+        template = self.template('monthly', date(2024, 1, 31))
+        self.assertEqual(list(occurrence_dates(template, date(2024, 1, 1), date(2024, 5, 1))),
+                         [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)])
+
+    def test_start_end_and_pauses_limit_occurrences(self):
+        template = self.template('weekly', date(2024, 1, 10), until=date(2024, 2, 7),
+                                 pauses=[(date(2024, 1, 17), date(2024, 1, 24))])
+        dates = list(occurrence_dates(template, date(2023, 12, 1), date(2024, 6, 1)))
+        self.assertEqual(dates, [date(2024, 1, 10), date(2024, 1, 31), date(2024, 2, 7)])
+        self.assertEqual(count_occurrences(template, date(2023, 12, 1), date(2024, 6, 1)), 3)
+
+    def test_projection_is_computed_in_bulk_and_cached(self):
+        result_cache().clear()
+        anchor = datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc)
+        for i in range(30):
+            make_transaction(self.user, self.cash, '1', anchor, repeat_interval='weekly')
+        make_transaction(self.user, self.cash, '100', anchor, transaction_type='income',
+                         category='earned', repeat_interval='monthly')
+
+        # recurring transactions and their pauses
+        with self.assertNumQueries(2):
+            totals = monthly_projection(self.user, date(2024, 1, 1), date(2025, 1, 1))
+        with self.assertNumQueries(0):
+            monthly_projection(self.user, date(2024, 1, 1), date(2025, 1, 1))
+
+        self.assertEqual(len(totals), 12)
+        self.assertEqual(totals[2024, 1], {'income': Decimal('100'), 'expense': Decimal('150')})
+        self.assertEqual(sum(month['expense'] for month in totals.values()), Decimal(30 * 53))
+        self.assertEqual(len(materialize(self.user, date(2024, 1, 1), date(2024, 2, 1))), 30 * 5 + 1)
+
+    def test_projection_and_pause_endpoints(self):
+        template = make_transaction(self.user, self.cash, '25', datetime(2024, 1, 5, 12, tzinfo=dt_timezone.utc),
+                                    repeat_interval='monthly')
+        one_time = make_transaction(self.user, self.cash, '5', datetime(2024, 1, 5, 12, tzinfo=dt_timezone.utc))
+
+        response = self.client.post(reverse('pause_transaction', args=[template.id]),
+                                    json.dumps({'start': '2024-03-01', 'end': '2024-03-31'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post(reverse('pause_transaction', args=[one_time.id]),
+                                    json.dumps({'start': '2024-03-01', 'end': '2024-03-31'}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        data = self.client.get(reverse('projection'),
+                               {'start': '2024-01-01', 'end': '2024-05-01', 'occurrences': '1'}).json()
+        self.assertEqual([month['expense'] for month in data['months']], ['25.00', '25.00', '0.00', '25.00'])
+        self.assertEqual([occurrence['date'] for occurrence in data['occurrences']],
+                         ['2024-01-05', '2024-02-05', '2024-04-05'])
+
+        response = self.client.get(reverse('projection'), {'start': '2024-01-01', 'end': '2030-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_repeat_until_dates_are_rejected(self):
+        template = make_transaction(self.user, self.cash, '25', timezone.now(), repeat_interval='monthly')
+        transaction = {'type': 'expense', 'category': 'food', 'amount': '25'}
+
+        for repeat_until in ('2024-02-30', '2024-13-01', '31/12/2024', ['2024-12-31']):
+            response = self.client.post(reverse('register_transaction'),
+                                        {**transaction, 'paymentMethod': self.cash.id, 'repetition': 'monthly',
+                                         'repeat_until': repeat_until}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, repeat_until)
+            response = self.client.post(reverse('edit_transaction', args=[template.id]),
+                                        {**transaction, 'methodID': self.cash.id, 'repeat_interval': 'monthly',
+                                         'repeat_until': repeat_until}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, repeat_until)
+
+        self.assertEqual(Transaction.objects.count(), 1)
+        template.refresh_from_db()
+        self.assertIsNone(template.repeat_until)
+
+    def test_windows_ending_at_the_last_date(self):
+        for interval in ('weekly', 'monthly'):
+            template = self.template(interval, date(9999, 1, 1))
+            self.assertEqual(list(occurrence_dates(template, date(9999, 12, 1), date.max))[-1],
+                             date(9999, 12, 1 if interval == 'monthly' else 24))
+        make_transaction(self.user, self.cash, '1', datetime(9999, 1, 1, tzinfo=dt_timezone.utc),
+                         repeat_interval='weekly')
+
+        for params in ({'start': '9999-11-01', 'end': '9999-12-31', 'occurrences': '1'}, {'start': '9999-12-01'}):
+            response = self.client.get(reverse('projection'), params)
+            self.assertEqual(response.status_code, 200, params)
+            self.assertEqual(response.json()['months'][-1]['month'], 12)
+
+
+class BenchCommandTests(TestCase):
+
+    def test_reports_every_endpoint(self):
+        out = StringIO()
+        call_command('bench', '--in-place', '--users', '3', '--transactions', '10', '--heavy-transactions', '200',
+                     '--repeat', '2', stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(set(report['profiles']), {'typical', 'heavy'})
+        self.assertEqual(report['profiles']['heavy']['transactions'], 200)
+        endpoints = report['profiles']['heavy']['endpoints']
+        self.assertEqual(set(endpoints), {pattern.name for pattern in urlpatterns})
+        for name, result in endpoints.items():
+            self.assertNotIn('skipped', result, name)
+            self.assertLess(max(result['status']), 500, name)
+            self.assertEqual(result['requests'], 2)
+            self.assertGreaterEqual(result['p99_ms'], result['p50_ms'])
+            if result['queries']:
+                # Sub-millisecond statements still add up to some SQL time
+                self.assertGreater(result['sql_ms'], 0, name)
+
+    def test_forecast_engines_agree(self):
+        out = StringIO()
+        call_command('bench_forecast', '--in-place', '--sizes', '300', '--repeat', '1', stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertTrue(report['sizes']['300']['same_results'])
+
+
+class ProfilingMiddlewareTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+        make_transaction(self.user, self.cash, '10', timezone.now())
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('list_all_transactions'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(EXPENSES_PROFILE_REQUESTS=True, EXPENSES_SLOW_REQUEST_MS=60000)
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('list_all_transactions'))
+
+        metrics = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(metrics), {'sql', 'view', 'serialize', 'total'})
+        # request user and transactions
+        self.assertIn('desc="2 queries"', metrics['sql'])
+
+    @override_settings(EXPENSES_PROFILE_REQUESTS=True, EXPENSES_SLOW_REQUEST_MS=0, EXPENSES_SLOW_QUERIES=2)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('expenses.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('list_all_transactions'), {'format': 'columnar'})
+
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual(entry['path'], reverse('list_all_transactions'))
+        self.assertEqual(entry['status'], 200)
+        self.assertEqual(entry['user'], self.user.pk)
+        self.assertEqual(entry['queries'], 2)
+        self.assertEqual(len(entry['slowest_queries']), 2)
+        self.assertIn('serialize', entry['timings_ms'])
+
+
+class ConnectionSettingsTests(TestCase):
+
+    def test_pragmas_are_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            for pragma, expected in (('synchronous', 1), ('busy_timeout', 5000), ('cache_size', -20000),
+                                     ('temp_store', 2)):
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], expected, pragma)
+
+    def test_session_files_stay_out_of_the_project(self):
+        location = Path(settings.CACHES['sessions']['LOCATION'])
+        self.assertFalse(location.is_relative_to(settings.BASE_DIR))
+
+
+class AsyncViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        card = PaymentMethod.objects.create(userID=self.user, name='Card', type='credit', processor='visa')
+        now = timezone.now()
+        make_transaction(self.user, cash, '1000', now, transaction_type='income', category='earned')
+        make_transaction(self.user, card, '20', now - timedelta(days=40), repeat_interval='weekly')
+        for i in range(15):
+            make_transaction(self.user, card, i + 1, now - timedelta(days=i * 9))
+        self.client.force_login(self.user)
+
+    async def test_responses_match_sync_views(self):
+        await self.async_client.aforce_login(self.user)
+        for sync_name, async_name, params in (('summary', 'async_summary', {}),
+                                              ('list_methods', 'async_list_methods', {}),
+                                              ('list_months', 'async_list_months', {}),
+                                              ('transactions', 'async_transactions', {'limit': 5})):
+            await result_cache().aclear()
+            expected = await self.async_client.get(reverse(async_name), params)
+            await result_cache().aclear()
+            response = await sync_to_async(self.client.get)(reverse(sync_name), params)
+            self.assertEqual(expected.status_code, 200, async_name)
+            self.assertEqual(json.loads(expected.content), response.json(), async_name)
+            self.assertEqual(expected['ETag'], response['ETag'], async_name)
+
+    async def test_conditional_and_cached_requests(self):
+        await self.async_client.aforce_login(self.user)
+        await result_cache().aclear()
+        first = await self.async_client.get(reverse('async_summary'))
+        cached = await self.async_client.get(reverse('async_summary'))
+        self.assertEqual(first.content, cached.content)
+
+        not_modified = await self.async_client.get(reverse('async_summary'), headers={'If-None-Match': first['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+
+    async def test_requires_login(self):
+        response = await self.async_client.get(reverse('async_transactions'))
+        self.assertEqual(response.status_code, 302)
+
+
+class BootstrapTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        card = PaymentMethod.objects.create(userID=self.user, name='Card', type='credit', processor='visa')
+        now = timezone.now()
+        make_transaction(self.user, cash, '1000', now, transaction_type='income', category='earned')
+        make_transaction(self.user, card, '20', now - timedelta(days=40), repeat_interval='weekly')
+        for i in range(25):
+            make_transaction(self.user, card, i + 1, now - timedelta(days=i * 9))
+        self.client.force_login(self.user)
+        result_cache().clear()
+
+    def test_matches_separate_endpoints(self):
+        data = self.client.get(reverse('bootstrap'), {'limit': 10}).json()
+
+        self.assertEqual(data['summary'], self.client.get(reverse('summary')).json())
+        self.assertEqual(data['methods'], self.client.get(reverse('list_methods')).json())
+        self.assertEqual(data['months'], self.client.get(reverse('list_months')).json())
+        self.assertEqual(data['transactions'], self.client.get(reverse('transactions'), {'limit': 10}).json())
+
+    def test_query_count(self):
+        # request user, rollups, methods, recurring transactions, their
+        # pauses and the first page
+        with self.assertNumQueries(6):
+            self.client.get(reverse('bootstrap'))
+
+
+class SyncTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.card = PaymentMethod.objects.create(userID=self.user, name='Card', type='credit', processor='visa')
+        self.client.force_login(self.user)
+        self.now = timezone.now()
+        self.first = make_transaction(self.user, self.cash, '10', self.now)
+        self.second = make_transaction(self.user, self.card, '20', self.now)
+        self.third = make_transaction(self.user, self.card, '30', self.now)
+
+    def sync(self, cursor=None):
+        response = self.client.get(reverse('sync'), {} if cursor is None else {'cursor': cursor})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_deltas_follow_cursor(self):
+        state = self.sync()
+        self.assertEqual([item['id'] for item in state['transactions']],
+                         [self.first.id, self.second.id, self.third.id])
+        self.assertEqual(len(state['methods']), 2)
+
+        self.first.amount = Decimal('15')
+        self.first.save()
+        deleted_id = self.second.id
+        self.second.delete()
+        created = make_transaction(self.user, self.cash, '40', self.now)
+        # Another user's writes are not sent
+        other = User.objects.create_user('bob', 'bob@example.com', 'password')
+        make_transaction(other, None, '5', self.now)
+
+        delta = self.sync(state['cursor'])
+        self.assertEqual([(item['id'], item['amount']) for item in delta['transactions']],
+                         [(self.first.id, '15.00'), (created.id, '40.00')])
+        self.assertEqual(delta['deleted'], {'transactions': [deleted_id], 'methods': []})
+        self.assertEqual(delta['methods'], [])
+        self.assertFalse(delta['has_more'])
+
+        empty = self.sync(delta['cursor'])
+        self.assertEqual((empty['transactions'], empty['cursor']), ([], delta['cursor']))
+
+    def test_method_delete_sends_detached_transactions(self):
+        cursor = self.sync()['cursor']
+
+        self.client.post(reverse('delete_method', args=[self.card.id]))
+
+        delta = self.sync(cursor)
+        self.assertEqual(delta['deleted'], {'transactions': [], 'methods': [self.card.id]})
+        self.assertEqual([(item['id'], item['methodID']) for item in delta['transactions']],
+                         [(self.second.id, None), (self.third.id, None)])
+
+    def test_bulk_writes_are_logged(self):
+        cursor = self.sync()['cursor']
+
+        self.client.post(reverse('import_transactions'),
+                         json.dumps([{'type': 'expense', 'category': 'food', 'amount': '1'}] * 3),
+                         content_type='application/json')
+        self.client.post(reverse('batch'), json.dumps({'operations': [
+            {'action': 'update', 'model': 'transaction', 'id': self.first.id, 'data': {'amount': '11'}},
+            {'action': 'delete', 'model': 'transaction', 'id': self.third.id},
+            {'action': 'create', 'model': 'method', 'data': {'name': 'Bank', 'type': 'debit'}},
+        ]}), content_type='application/json')
+
+        delta = self.sync(cursor)
+        self.assertEqual(len(delta['transactions']), 4)
+        self.assertEqual(delta['deleted']['transactions'], [self.third.id])
+        self.assertEqual([method['name'] for method in delta['methods']], ['Bank'])
+
+    def test_pages_of_changes(self):
+        cursor = self.sync()['cursor']
+        for amount in range(5):
+            make_transaction(self.user, self.cash, amount + 1, self.now)
+
+        ids = []
+        while True:
+            delta = changes_since(self.user, cursor, limit=2)
+            ids += [item['id'] for item in delta['transactions']]
+            cursor = delta['cursor']
+            if not delta['has_more']:
+                break
+        self.assertEqual(len(ids), 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('sync'), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AuthenticationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.other = User.objects.create_user('bob', 'bob@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def test_session_is_read_from_the_cache(self):
+        caches['sessions'].clear()
+
+        # session, request user and methods, then the session is cached
+        with self.assertNumQueries(3):
+            self.client.get(reverse('list_methods'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('list_methods'))
+
+    def test_logout_revokes_the_session_in_every_worker(self):
+        self.client.get(reverse('list_methods'))
+        cache_key = self.client.session.cache_key
+        # Another worker process opens its own connection to the cache
+        other_worker = caches.create_connection('sessions')
+        self.assertIsNotNone(other_worker.get(cache_key))
+
+        self.client.get(reverse('logout'))
+
+        self.assertIsNone(other_worker.get(cache_key))
+
+    def test_rows_of_other_users_are_not_found(self):
+        method = PaymentMethod.objects.get(userID=self.other, name='Cash')
+        transaction = make_transaction(self.other, method, '10', timezone.now())
+
+        responses = [
+            self.client.post(reverse('edit_method', args=[method.id]), json.dumps({'name': 'Mine'}),
+                             content_type='application/json'),
+            self.client.post(reverse('delete_method', args=[method.id])),
+            self.client.post(reverse('delete_transaction', args=[transaction.id])),
+        ]
+
+        self.assertEqual([response.status_code for response in responses], [404, 404, 404])
+        self.assertTrue(PaymentMethod.objects.filter(pk=method.id, name='Cash').exists())
+        self.assertTrue(Transaction.objects.filter(pk=transaction.id).exists())
+
+
+class ReportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.user.time_zone = 'America/New_York'
+        self.user.save()
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.card = PaymentMethod.objects.create(userID=self.user, name='Card', type='credit', processor='visa')
+        self.client.force_login(self.user)
+
+        def at(day, hour):
+            return datetime(2024, 1, day, hour, tzinfo=dt_timezone.utc)
+
+        make_transaction(self.user, self.cash, '10', at(2, 15))
+        make_transaction(self.user, self.card, '20', at(3, 15), category='transportation')
+        # Sunday evening in New York, Monday in UTC
+        make_transaction(self.user, self.cash, '5', at(8, 3))
+        make_transaction(self.user, self.card, '100', at(15, 15), transaction_type='income', category='earned')
+        make_transaction(self.user, self.card, '300', datetime(2023, 11, 1, 15, tzinfo=dt_timezone.utc),
+                         transaction_type='income', category='earned', repeat_interval='monthly')
+
+    def report(self, **params):
+        response = self.client.get(reverse('report'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def series(self, result):
+        return {tuple(item[dimension] for dimension in result['group_by']): item['totals']
+                for item in result['series']}
+
+    def test_weeks_by_category_in_user_time_zone(self):
+        result = self.report(start='2024-01-01', end='2024-01-22', bucket='week', group_by='category')
+
+        self.assertEqual(result['buckets'], ['2024-01-01', '2024-01-08', '2024-01-15'])
+        self.assertEqual(result['group_by'], ['type', 'category'])
+        self.assertEqual(self.series(result), {
+            ('expense', 'food'): [15.0, 0.0, 0.0],
+            ('expense', 'transportation'): [20.0, 0.0, 0.0],
+            # The recurring income falls on the first of each month
+            ('income', 'earned'): [300.0, 0.0, 100.0],
+        })
+
+    def test_months_by_method_read_rollups(self):
+        # request user, rollups, recurring transactions and their pauses
+        with self.assertNumQueries(4):
+            result = self.report(start='2023-12-01', end='2024-02-01', group_by='method')
+
+        self.assertEqual(result['buckets'], ['2023-12-01', '2024-01-01'])
+        self.assertEqual(self.series(result), {
+            ('expense', self.cash.id): [0.0, 15.0],
+            ('expense', self.card.id): [0.0, 20.0],
+            ('income', self.card.id): [300.0, 400.0],
+        })
+
+        # A range that does not start on the first reads the transactions
+        partial = self.report(start='2024-01-03', end='2024-02-01', group_by='method')
+        self.assertEqual(self.series(partial)[('expense', self.cash.id)], [5.0])
+
+    def test_invalid_parameters(self):
+        for params in ({'bucket': 'year'}, {'group_by': 'merchant'}, {'start': '2024-02-01', 'end': '2024-01-01'},
+                       {'start': '2020-01-01', 'end': '2024-01-01', 'bucket': 'day'}, {'start': 'January'}):
+            response = self.client.get(reverse('report'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_ranges_ending_at_the_last_date(self):
+        for bucket, count in (('month', 2), ('week', 9), ('day', 60)):
+            result = self.report(start='9999-11-01', end='9999-12-31', bucket=bucket)
+            self.assertEqual(len(result['buckets']), count, bucket)
+
+    def test_bucket_counts(self):
+        self.assertEqual(bucket_count(date(2024, 1, 31), date(2024, 3, 1), 'month'), 2)
+        self.assertEqual(bucket_count(date(2024, 1, 3), date(2024, 1, 9), 'week'), 2)
+        self.assertEqual(bucket_count(date.min, date.max, 'day'), (date.max - date.min).days)
+        self.assertEqual(bucket_count(date.min, date.max, 'month'), 9999 * 12)
+
+
+class ForecastTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.user.time_zone = 'America/New_York'
+        self.user.save()
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.card = PaymentMethod.objects.create(userID=self.user, name='Card', type='credit', processor='visa')
+        self.client.force_login(self.user)
+
+    def test_history_arrays(self):
+        make_transaction(self.user, self.cash, '12.34', datetime(2024, 1, 2, 3, tzinfo=dt_timezone.utc))
+        make_transaction(self.user, None, '100', datetime(2024, 1, 2, 15, tzinfo=dt_timezone.utc),
+                         transaction_type='income', category='earned')
+        make_transaction(self.user, self.cash, '50', timezone.now(), repeat_interval='monthly')
+
+        history = load_history(self.user)
+
+        # The evening of January 1 in New York, and the recurring one left out
+        self.assertEqual(sorted(history.days.tolist()), [19723, 19724])
+        self.assertEqual(sorted(history.cents.tolist()), [1234, 10000])
+        self.assertEqual(history.income.sum(), 1)
+        self.assertEqual(sorted(history.method_ids[history.methods].tolist()), [0, self.cash.id])
+
+    def test_projections(self):
+        sums = np.array([[100.0, 0], [200, 0], [300, 0], [400, 0]])
+        np.testing.assert_allclose(linear_projection(sums, 2), [[500, 0], [600, 0]], atol=1e-9)
+        self.assertEqual(rolling_averages(sums, [1, 2, 4]).tolist(), [[400, 0], [350, 0], [250, 0]])
+
+        # Every December is twice as expensive
+        year = np.array([[100.0]] * 11 + [[200.0]])
+        projected = seasonal_projection(np.vstack([year, year]), 0, 12)
+        self.assertAlmostEqual(projected[0, 0], 100)
+        self.assertAlmostEqual(projected[11, 0], 200)
+
+    def test_forecast_endpoint(self):
+        current = epoch_month(timezone.localdate(timezone=self.user.tzinfo))
+        for months_ago in range(1, 13):
+            day = month_start(current - months_ago)
+            make_transaction(self.user, self.card, '300', datetime(day.year, day.month, 10, 12,
+                                                                   tzinfo=self.user.tzinfo), category='housing')
+        make_transaction(self.user, self.cash, '20', timezone.now())
+
+        response = self.client.get(reverse('forecast'), {'horizon': 3})
+
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(len(result['months']), 3)
+        self.assertEqual(result['month']['expense_to_date'], 20.0)
+        self.assertEqual(result['expense'][1:], [300.0, 300.0])
+        self.assertIn('housing', result['categories'])
+        self.assertEqual(result['category_averages'][result['categories'].index('housing')],
+                         [300.0, 300.0, 300.0])
+        self.assertEqual(result['methods'], [self.cash.id, self.card.id])
+
+        for params in ({'horizon': 0}, {'horizon': 'x'}, {'projection': 'quadratic'}):
+            self.assertEqual(self.client.get(reverse('forecast'), params).status_code, 400)
+
+    def test_unknown_categories_count_as_other(self):
+        last_month = month_start(epoch_month(timezone.localdate(timezone=self.user.tzinfo)) - 1)
+        make_transaction(self.user, self.cash, '20', datetime(last_month.year, last_month.month, 10, 12,
+                                                               tzinfo=self.user.tzinfo), category='groceries')
+
+        response = self.client.get(reverse('forecast'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['categories'], ['other'])
+
+        # New transactions can no longer be stored with them
+        for name, data in (('register_transaction', {'paymentMethod': self.cash.id, 'repetition': 'none'}),
+                           ('edit_transaction', {'methodID': self.cash.id, 'repeat_interval': 'none'})):
+            args = [Transaction.objects.get().id] if name == 'edit_transaction' else []
+            response = self.client.post(reverse(name, args=args),
+                                        {**data, 'type': 'expense', 'category': 'groceries', 'amount': '5'},
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400, name)
+
+
+class BudgetTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.card = PaymentMethod.objects.create(userID=self.user, name='Card', type='credit', processor='visa')
+        self.client.force_login(self.user)
+        self.budget = Budget.objects.create(userID=self.user, category='food', amount=Decimal('100'), alert_at=50)
+        self.now = timezone.now()
+
+    def spent(self, category='food'):
+        today = timezone.localdate()
+        return CategorySpend.objects.filter(userID=self.user, year=today.year, month=today.month,
+                                            category=category).values_list('total', flat=True).first()
+
+    def alerts(self):
+        return list(BudgetAlert.objects.order_by('threshold').values_list('threshold', 'spent'))
+
+    def test_counter_follows_writes(self):
+        self.client.post(reverse('register_transaction'), json.dumps({
+            'type': 'expense', 'category': 'food', 'paymentMethod': self.cash.id, 'amount': '30',
+            'repetition': 'none'}), content_type='application/json')
+        self.assertEqual(self.spent(), Decimal('30'))
+
+        transaction = Transaction.objects.get(userID=self.user)
+        self.client.post(reverse('edit_transaction', args=[transaction.id]), json.dumps({
+            'methodID': self.card.id, 'type': 'expense', 'category': 'food', 'amount': '45',
+            'repeat_interval': 'none'}), content_type='application/json')
+        self.assertEqual(self.spent(), Decimal('45'))
+
+        # Moving to another method or deleting the method keeps the category total
+        self.client.post(reverse('delete_method', args=[self.card.id]))
+        self.assertEqual(self.spent(), Decimal('45'))
+
+        # Income and recurring expenses are not budgeted
+        make_transaction(self.user, self.cash, '500', self.now, transaction_type='income', category='food')
+        make_transaction(self.user, self.cash, '20', self.now, repeat_interval='monthly')
+        self.assertEqual(self.spent(), Decimal('45'))
+
+        self.client.post(reverse('delete_transaction', args=[transaction.id]))
+        self.assertIsNone(self.spent())
+
+    def test_invalid_writes_are_rejected(self):
+        transaction = make_transaction(self.user, self.cash, '10', self.now)
+        valid = {'type': 'expense', 'category': 'food', 'amount': '30'}
+
+        for invalid in ({'type': 'bogus'}, {'amount': 'abc'}, {'amount': 'Infinity'}, {'repetition': 'yearly'}):
+            response = self.client.post(reverse('register_transaction'), json.dumps({
+                **valid, 'paymentMethod': self.cash.id, 'repetition': 'none', **invalid}),
+                content_type='application/json')
+            self.assertEqual(response.status_code, 400, invalid)
+        for invalid in ({'type': 'bogus'}, {'amount': 'abc'}, {'repeat_interval': 'yearly'}):
+            response = self.client.post(reverse('edit_transaction', args=[transaction.id]), json.dumps({
+                **valid, 'methodID': self.cash.id, 'repeat_interval': 'none', **invalid}),
+                content_type='application/json')
+            self.assertEqual(response.status_code, 400, invalid)
+
+        self.assertEqual(Transaction.objects.get().amount, Decimal('10'))
+        self.assertEqual(set(MonthlyRollup.objects.values_list('transaction_type', 'repeat_interval')),
+                         {('expense', 'none')})
+        self.assertEqual(self.spent(), Decimal('10'))
+
+    def test_bulk_writes_update_the_counter(self):
+        self.client.post(reverse('import_transactions'),
+                         json.dumps([{'type': 'expense', 'category': 'food', 'amount': '10'}] * 3),
+                         content_type='application/json')
+        self.client.post(reverse('batch'), json.dumps({'operations': [
+            {'action': 'create', 'model': 'transaction', 'data': {'type': 'expense', 'category': 'shopping',
+                                                                 'amount': '7'}},
+        ]}), content_type='application/json')
+
+        self.assertEqual(self.spent(), Decimal('30'))
+        self.assertEqual(self.spent('shopping'), Decimal('7'))
+
+        # A rebuild gives the same totals
+        CategorySpend.objects.all().delete()
+        MonthlyRollup.rebuild(User.objects.filter(pk=self.user.pk))
+        self.assertEqual((self.spent(), self.spent('shopping')), (Decimal('30'), Decimal('7')))
+
+    def test_thresholds_alert_once(self):
+        make_transaction(self.user, self.cash, '40', self.now)
+        self.assertEqual(self.alerts(), [])
+
+        make_transaction(self.user, self.cash, '20', self.now)
+        self.assertEqual(self.alerts(), [(50, Decimal('60'))])
+
+        extra = make_transaction(self.user, self.cash, '50', self.now)
+        self.assertEqual(self.alerts(), [(50, Decimal('60')), (100, Decimal('110'))])
+
+        # Going under and over again does not repeat the alert
+        extra.delete()
+        make_transaction(self.user, self.cash, '45', self.now)
+        self.assertEqual(len(self.alerts()), 2)
+
+    def test_status_endpoint(self):
+        make_transaction(self.user, self.cash, '60', self.now)
+        self.client.post(reverse('budget'), json.dumps({'category': 'shopping', 'amount': '200'}),
+                         content_type='application/json')
+
+        # request user, spend counters, alerts and budgets
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('list_budgets'))
+
+        budgets = response.json()['budgets']
+        self.assertEqual([(item['category'], item['spent'], item['remaining'], item['percent'], item['alerts'])
+                          for item in budgets],
+                         [('food', '60.00', '40.00', 60.0, [50]), ('shopping', '0.00', '200.00', 0.0, [])])
+
+        self.client.post(reverse('delete_budget', args=[budgets[1]['id']]))
+        self.assertEqual(len(self.client.get(reverse('list_budgets')).json()['budgets']), 1)
+
+    def test_invalid_budgets(self):
+        for data in ({'category': 'food', 'amount': '-5'}, {'category': 'rent', 'amount': '5'},
+                     {'category': 'food', 'amount': 'lots'}, {'category': 'food', 'amount': '5', 'alert_at': 0},
+                     {'category': 'food', 'amount': 'Infinity'}, {'category': 'food', 'amount': 'NaN'},
+                     {'category': 'food', 'amount': '100000000'}, {'category': 'food', 'amount': '5.001'}):
+            response = self.client.post(reverse('budget'), json.dumps(data), content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+        self.assertEqual(Budget.objects.get(userID=self.user).amount, Decimal('100'))
+        self.assertEqual(self.client.get(reverse('list_budgets'), {'month': '2024-13'}).status_code, 400)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.client.force_login(self.user)
+        self.march = datetime(2024, 3, 10, tzinfo=dt_timezone.utc)
+        self.april = datetime(2024, 4, 10, tzinfo=dt_timezone.utc)
+
+    def search(self, **params):
+        response = self.client.get(reverse('search'), params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, **params):
+        return [item['id'] for item in self.search(**params)['transactions']]
+
+    def test_ranks_merchant_matches_first(self):
+        in_description = make_transaction(self.user, self.cash, '5', self.march, description='coffee at the bakery')
+        in_merchant = make_transaction(self.user, self.cash, '5', self.march, merchant='Bakery')
+        make_transaction(self.user, self.cash, '5', self.march, merchant='Grocer')
+
+        self.assertEqual(self.ids(q='bakery'), [in_merchant.id, in_description.id])
+        # Every word must match, the last one as a prefix, without accents
+        self.assertEqual(self.ids(q='coffee bak'), [in_description.id])
+        self.assertEqual(self.ids(q='BÂKERY'), [in_merchant.id, in_description.id])
+        self.assertEqual(self.ids(q='tea'), [])
+
+        item = self.search(q='bakery')['transactions'][0]
+        self.assertEqual((item['merchant'], item['description']), ('Bakery', ''))
+
+    def test_combines_with_filters(self):
+        march = make_transaction(self.user, self.cash, '5', self.march, merchant='Corner Shop')
+        april = make_transaction(self.user, self.cash, '5', self.april, merchant='Corner Shop', category='shopping')
+        income = make_transaction(self.user, None, '5', self.april, merchant='Corner Shop',
+                                  transaction_type='income', category='earned')
+
+        self.assertEqual(set(self.ids(q='corner')), {march.id, april.id, income.id})
+        self.assertEqual(self.ids(q='corner', month='2024-03'), [march.id])
+        self.assertEqual(self.ids(q='corner', category='shopping'), [april.id])
+        self.assertEqual(self.ids(q='corner', type='income'), [income.id])
+        self.assertEqual(sorted(self.ids(q='corner', method=self.cash.id)), [march.id, april.id])
+
+    def test_paginates_by_rank(self):
+        created = [make_transaction(self.user, self.cash, '5', self.march, merchant='Market',
+                                    description='market ' * count).id
+                   for count in range(5)]
+
+        seen = []
+        cursor = ''
+        while True:
+            page = self.search(q='market', limit=2, cursor=cursor)
+            seen += [item['id'] for item in page['transactions']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, created[::-1])
+        self.assertEqual(self.client.get(reverse('search'), {'q': 'market', 'cursor': '!'}).status_code, 400)
+
+    def test_index_follows_writes(self):
+        transaction = make_transaction(self.user, self.cash, '5', self.march, merchant='Old Name')
+        self.assertEqual(self.ids(q='old'), [transaction.id])
+
+        self.client.post(reverse('edit_transaction', args=[transaction.id]), json.dumps({
+            'methodID': self.cash.id, 'type': 'expense', 'category': 'food', 'amount': '5',
+            'repeat_interval': 'none', 'merchant': 'New Name'}), content_type='application/json')
+        self.assertEqual(self.ids(q='old'), [])
+        self.assertEqual(self.ids(q='new'), [transaction.id])
+
+        self.client.post(reverse('import_transactions'), json.dumps([
+            {'type': 'expense', 'category': 'food', 'amount': '3', 'merchant': 'Imported', 'description': 'new'},
+        ]), content_type='application/json')
+        self.client.post(reverse('batch'), json.dumps({'operations': [
+            {'action': 'update', 'model': 'transaction', 'id': transaction.id, 'data': {'merchant': ''}},
+        ]}), content_type='application/json')
+        self.assertEqual(self.ids(q='new'), [Transaction.objects.get(merchant='Imported').id])
+
+        Transaction.objects.filter(userID=self.user).delete()
+        self.assertEqual(self.ids(q='imported'), [])
+
+    def test_only_searches_own_transactions(self):
+        other = User.objects.create_user('bob', 'bob@example.com', 'password')
+        make_transaction(other, None, '5', self.march, merchant='Bakery')
+        mine = make_transaction(self.user, self.cash, '5', self.march, merchant='Bakery')
+
+        self.assertEqual(self.ids(q='bakery'), [mine.id])
+        # The owner token is not searchable
+        self.assertEqual(self.ids(q=str(self.user.id)), [])
+
+    def test_query_text_is_not_parsed(self):
+        transaction = make_transaction(self.user, self.cash, '5', self.march, merchant='AT&T', description='NOT paid')
+
+        self.assertEqual(self.ids(q='at&t'), [transaction.id])
+        self.assertEqual(self.ids(q='not "paid'), [transaction.id])
+        for text in ('', '"*', 'OR'):
+            response = self.client.get(reverse('search'), {'q': text})
+            self.assertEqual(response.status_code, 200 if text == 'OR' else 400, text)
+
+    def test_index_drives_the_query(self):
+        make_transaction(self.user, self.cash, '5', self.march, merchant='Bakery')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.search(q='bakery', month='2024-03')
+        sql = next(query['sql'] for query in queries if 'MATCH' in query['sql'])
+        plan = connection.cursor().execute('EXPLAIN QUERY PLAN ' + sql).fetchall()
+
+        self.assertIn('expenses_transaction_fts VIRTUAL TABLE', plan[0][-1])
+        self.assertIn('INTEGER PRIMARY KEY', plan[1][-1])
+        self.assertNotIn('LIKE', sql)
+
+    def test_long_text_is_rejected(self):
+        response = self.client.post(reverse('register_transaction'), json.dumps({
+            'type': 'expense', 'category': 'food', 'paymentMethod': self.cash.id, 'amount': '3',
+            'repetition': 'none', 'merchant': 'x' * 101}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.cash = PaymentMethod.objects.get(userID=self.user, name='Cash')
+        self.card = PaymentMethod.objects.create(userID=self.user, name='Card', type='credit', processor='visa')
+        self.client.force_login(self.user)
+
+        self.old = datetime(2021, 5, 10, 12, tzinfo=dt_timezone.utc)
+        self.food = make_transaction(self.user, self.cash, '10', self.old, merchant='Bakery')
+        self.salary = make_transaction(self.user, self.card, '100', self.old + timedelta(days=1),
+                                       transaction_type='income', category='earned')
+        self.rent = make_transaction(self.user, self.card, '50', self.old, repeat_interval='monthly',
+                                     category='housing')
+        self.recent = make_transaction(self.user, self.cash, '7', timezone.now())
+
+    def rollups(self):
+        return sorted(MonthlyRollup.objects.values_list(*MonthlyRollup.KEY_FIELDS, 'total', 'count'))
+
+    def archive(self, **options):
+        call_command('archive_transactions', stdout=StringIO(), **options)
+        self.user.refresh_from_db()
+
+    def ids(self, **params):
+        return [item['id'] for item in self.client.get(reverse('transactions'), params).json()['transactions']]
+
+    def test_moves_old_one_time_transactions_and_keeps_totals(self):
+        rollups = self.rollups()
+        summary = self.client.get(reverse('summary')).json()
+
+        self.archive()
+
+        self.assertEqual(sorted(ArchivedTransaction.objects.values_list('id', flat=True)),
+                         [self.food.id, self.salary.id])
+        # Recurring templates stay, whatever their start date
+        self.assertEqual(sorted(Transaction.objects.values_list('id', flat=True)), [self.rent.id, self.recent.id])
+        self.assertEqual(ArchivedTransaction.objects.get(id=self.food.id).merchant, 'Bakery')
+        self.assertEqual(self.rollups(), rollups)
+        self.assertEqual(self.client.get(reverse('summary')).json(), summary)
+
+        # Rebuilding reads the archive too
+        call_command('rebuild_rollups', verify=True, stdout=StringIO())
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), rollups)
+
+        # Archived rows leave synced clients, and archiving again moves nothing
+        deleted = changes_since(self.user, 0)['deleted']['transactions']
+        self.assertEqual(sorted(deleted), [self.food.id, self.salary.id])
+        self.archive()
+        self.assertEqual(ArchivedTransaction.objects.count(), 2)
+
+    def test_interrupted_run_still_reads_the_archive(self):
+        bulk_create = ArchivedTransaction.objects.bulk_create
+        calls = []
+
+        def fail_second_batch(*args, **kwargs):
+            calls.append(1)
+            if len(calls) > 1:
+                raise DatabaseError('disk full')
+            return bulk_create(*args, **kwargs)
+
+        stale = User.objects.get(pk=self.user.pk)
+        with mock.patch.object(ArchivedTransaction.objects, 'bulk_create', fail_second_batch):
+            with self.assertRaises(DatabaseError):
+                archive_transactions(self.user, archive_cutoff(self.user, 24), batch_size=1)
+
+        self.assertEqual(ArchivedTransaction.objects.count(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.archived_before, archive_cutoff(self.user, 24))
+        # Saving an instance loaded before the run keeps the cutoff
+        stale.save()
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.archived_before)
+        self.assertEqual(len(self.ids(include_archived=1)), 4)
+
+    def test_reads_asking_for_archived_rows(self):
+        self.archive()
+
+        self.assertEqual(self.ids(), [self.recent.id, self.rent.id])
+        self.assertEqual(self.ids(include_archived=1), [self.recent.id, self.salary.id, self.rent.id, self.food.id])
+        self.assertEqual(self.ids(include_archived=1, type='income'), [self.salary.id])
+
+        seen = []
+        cursor = ''
+        while True:
+            page = self.client.get(reverse('transactions'), {'include_archived': 1, 'limit': 1, 'cursor': cursor}).json()
+            seen += [item['id'] for item in page['transactions']]
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(seen, self.ids(include_archived=1))
+
+        response = self.client.get(reverse('export_transactions'), {'format': 'ndjson', 'include_archived': 1})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.food.id, self.rent.id, self.salary.id, self.recent.id])
+
+    def test_reports_stay_exact(self):
+        params = {'start': '2021-05-05', 'end': '2021-06-20', 'bucket': 'week', 'group_by': 'method'}
+        before = self.client.get(reverse('report'), params).json()
+
+        self.archive()
+
+        self.assertEqual(self.client.get(reverse('report'), params).json(), before)
+
+    def test_time_zone_change_keeps_archived_totals(self):
+        self.archive()
+        self.user.time_zone = 'Asia/Tokyo'
+        self.user.save()
+
+        call_command('rebuild_rollups', verify=True, stdout=StringIO())
+        self.assertEqual(MonthlyRollup.objects.filter(year=2021).count(), 3)
+
+    def test_recent_months_are_not_archived(self):
+        with self.assertRaises(CommandError):
+            self.archive(months=6)
+        self.assertFalse(ArchivedTransaction.objects.exists())
+
+
+class StaticBuildTests(TestCase):
+
+    def setUp(self):
+        build_root = tempfile.TemporaryDirectory()
+        self.addCleanup(build_root.cleanup)
+        settings = override_settings(STATIC_BUILD_ROOT=build_root.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.root = Path(build_root.name)
+
+        self.user = User.objects.create_user('alice', 'alice@example.com', 'password')
+        self.client.force_login(self.user)
+
+    def build(self):
+        call_command('build_static', stdout=StringIO(), stderr=StringIO())
+        return json.loads((self.root / 'manifest.json').read_text())
+
+    def test_writes_hashed_and_compressed_files(self):
+        manifest = self.build()
+
+        hashed = manifest['files']['expenses/app.js']
+        self.assertRegex(hashed, r'^expenses/app\.[0-9a-f]{12}\.js$')
+        source = Path(__file__).parent / 'static' / 'expenses' / 'app.js'
+        self.assertEqual((self.root / hashed).read_bytes(), source.read_bytes())
+        self.assertIn('gzip', manifest['encodings'][hashed])
+        self.assertEqual(gzip.decompress((self.root / (hashed + '.gz')).read_bytes()), source.read_bytes())
+
+        # Same content, same names
+        self.assertEqual(self.build(), manifest)
+
+    def test_serves_precompressed_files_for_good(self):
+        hashed = self.build()['files']['expenses/styles.css']
+        url = reverse('asset', args=[hashed])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        plain = (self.root / hashed).read_bytes()
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+        for header in ('', 'gzip;q=0'):
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING=header)
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(b''.join(response.streaming_content), plain)
+
+        for path in ('expenses/styles.css', 'manifest.json', '../db.sqlite3'):
+            self.assertEqual(self.client.get(reverse('asset', args=[path])).status_code, 404, path)
+
+    def test_serves_files_of_earlier_builds(self):
+        previous = 'expenses/app.0123456789ab.js'
+        (self.root / 'expenses').mkdir()
+        (self.root / previous).write_text('old')
+        (self.root / (previous + '.gz')).write_bytes(gzip.compress(b'old'))
+        manifest = self.build()
+        self.assertNotIn(previous, manifest['files'].values())
+
+        response = self.client.get(reverse('asset', args=[previous]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b'old')
+
+        for path in (previous + '.gz', 'expenses/app.fedcba987654.js'):
+            self.assertEqual(self.client.get(reverse('asset', args=[path])).status_code, 404, path)
+
+    def test_pages_use_built_files(self):
+        page = self.client.get(reverse('index')).content.decode()
+        self.assertIn('/static/expenses/app.js', page)
+
+        manifest = self.build()
+        page = self.client.get(reverse('index')).content.decode()
+        self.assertIn(reverse('asset', args=[manifest['files']['expenses/app.js']]), page)
+        self.assertIn(reverse('asset', args=[manifest['files']['expenses/styles.css']]), page)
+        # Without vendored builds or compiled JSX, the CDN and Babel stay
+        self.assertIn('react.development.js', page)
+        self.assertIn('babel.min.js', page)
+
+    def test_prefers_vendored_builds_and_compiled_jsx(self):
+        sources = tempfile.TemporaryDirectory()
+        self.addCleanup(sources.cleanup)
+        vendor = Path(sources.name) / 'expenses' / 'vendor'
+        vendor.mkdir(parents=True)
+        (vendor / 'react.production.min.js').write_text('window.React = {};')
+        (vendor / 'react-dom.production.min.js').write_text('window.ReactDOM = {};')
+        (vendor.parent / 'app.compiled.js').write_text('ReactDOM.createRoot(body);')
+
+        with override_settings(STATICFILES_DIRS=[sources.name]):
+            manifest = self.build()
+        page = self.client.get(reverse('index')).content.decode()
+
+        self.assertIn(reverse('asset', args=[manifest['files']['expenses/vendor/react.production.min.js']]), page)
+        self.assertIn(reverse('asset', args=[manifest['files']['expenses/app.compiled.js']]), page)
+        self.assertNotIn('react.development.js', page)
+        self.assertNotIn('babel', page)
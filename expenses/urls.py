@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('', views.index, name="index"),
@@ -9,13 +9,35 @@ urlpatterns = [
 
     # API
     path("summary", views.user_summary, name="summary"),
+    path("bootstrap", views.bootstrap, name="bootstrap"),
     path("method", views.register_method, name="method"),
     path("list_methods", views.list_methods, name="list_methods"),
     path("list_months", views.list_months, name="list_months"),
+    path("projection", views.projection, name="projection"),
+    path("report", views.report, name="report"),
+    path("forecast", views.forecast, name="forecast"),
+    path("budget", views.register_budget, name="budget"),
+    path("list_budgets", views.list_budgets, name="list_budgets"),
+    path("delete_budget/<int:budget_id>", views.delete_budget, name="delete_budget"),
+    path("cache_stats", views.cache_stats, name="cache_stats"),
+    path("assets/<path:path>", views.asset, name="asset"),
     path("list_all_transactions", views.list_all_transactions, name="list_all_transactions"),
+    path("transactions", views.list_transactions, name="transactions"),
+    path("search", views.search_transactions, name="search"),
+    path("sync", views.sync, name="sync"),
+    path("export_transactions", views.export_transactions, name="export_transactions"),
     path("register_transaction", views.register_transaction, name="register_transaction"),
+    path("import_transactions", views.import_transactions, name="import_transactions"),
+    path("batch", views.batch, name="batch"),
     path("edit_transaction/<int:transaction_id>", views.edit_transaction, name="edit_transaction"),
     path("delete_transaction/<int:transaction_id>", views.delete_transaction, name="delete_transaction"),
+    path("pause_transaction/<int:transaction_id>", views.pause_transaction, name="pause_transaction"),
     path("edit_method/<int:method_id>", views.edit_method, name="edit_method"),
-    path("delete_method/<int:method_id>", views.delete_method, name="delete_method")
+    path("delete_method/<int:method_id>", views.delete_method, name="delete_method"),
+
+    # Async API for ASGI servers
+    path("async/summary", async_views.user_summary, name="async_summary"),
+    path("async/list_methods", async_views.list_methods, name="async_list_methods"),
+    path("async/list_months", async_views.list_months, name="async_list_months"),
+    path("async/transactions", async_views.list_transactions, name="async_transactions")
 ]
\ No newline at end of file
@@ -1,14 +1,110 @@
 import json
-from datetime import datetime
+import mimetypes
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.db import IntegrityError
-from django.db.models import Sum
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction as db_transaction
+from django.http import FileResponse, Http404, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import dashboard
+from .analytics import PROJECTIONS, forecast as build_forecast
+from .assets import IMMUTABLE_CACHE_CONTROL, built_path, choose_encoding
+from .batch import BatchError, apply_operations
+from .cache import cache_stats as get_cache_stats, cached_response
+from .export import CONTENT_TYPES, stream_export
+from .importer import RowError, import_transactions as import_rows, read_csv, transaction_fields
+from .middleware import timing
+from .models import ArchivedTransaction, Budget, User, PaymentMethod, RecurrencePause, Transaction
+from .pagination import InvalidCursor, keyset_page, merged_keyset_page
+from .reports import BUCKETS, DIMENSIONS, MAX_REPORT_BUCKETS, bucket_count, report as build_report
+from .schedule import materialize, monthly_projection
+from .search import InvalidSearch, search_page
+from .serializers import (serialize_methods, serialize_transactions, serialize_transactions_columnar,
+                          transaction_key, transaction_rows)
+from .sync import changes_since, full_state
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+def month_bounds(year, month, tzinfo):
+    """
+    Returns the aware datetimes delimiting a calendar month in the given time
+    zone, so date filters can be expressed as ranges over the indexed column.
+    """
+
+    start = datetime(year, month, 1, tzinfo=tzinfo)
+    if month == 12:
+        end = datetime(year + 1, 1, 1, tzinfo=tzinfo)
+    else:
+        end = datetime(year, month + 1, 1, tzinfo=tzinfo)
+    return start, end
+
+
+def data_etag(request, *args, **kwargs):
+    """
+    ETag of responses that only depend on the user's data. Reading the version
+    costs nothing beyond loading request.user.
+    """
+
+    return request.user.data_tag
+
+
+def data_last_modified(request, *args, **kwargs):
+    return request.user.data_modified
+
+
+def dated_data_etag(request, *args, **kwargs):
+    """
+    ETag of responses that also depend on the current date, like the summary.
+    """
+
+    return f'{data_etag(request)}-{timezone.localdate(timezone=request.user.tzinfo)}'
+
+
+def filter_transactions(user, params, model=Transaction):
+    """
+    Applies the listing filters to the user's transactions. Dates are filtered
+    with ranges so the (userID, date) index can be used.
+    Args:
+        user: owner of the transactions
+        params: mapping with optional month (YYYY-MM), type, method and category
+        model: Transaction, or ArchivedTransaction to filter archived ones
+    Returns:
+        Filtered queryset of the model
+    """
+
+    transaction_list = model.objects.filter(userID=user)
+
+    month = params.get('month', '')
+    if month:
+        year, month = (int(part) for part in month.split('-'))
+        start, end = month_bounds(year, month, user.tzinfo)
+        transaction_list = transaction_list.filter(date__gte=start, date__lt=end)
+
+    transaction_type = params.get('type', '')
+    if transaction_type:
+        transaction_list = transaction_list.filter(transaction_type=transaction_type)
+
+    method = params.get('method', '')
+    if method:
+        transaction_list = transaction_list.filter(payment_methodID=int(method))
+
+    category = params.get('category', '')
+    if category:
+        transaction_list = transaction_list.filter(category=category)
+
+    return transaction_list
 
-from .models import User, PaymentMethod, Transaction
 
 # Create your views here.
 def index(request):
@@ -33,7 +129,7 @@ def register_method(request):
         return JsonResponse({"error": "POST request required"}, status=400)
     
     try:
-        user = get_object_or_404(User, pk=request.user.id)
+        user = request.user
 
         data = json.loads(request.body)
         method_name = data.get('methodName', '')
@@ -49,8 +145,6 @@ def register_method(request):
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
     except IntegrityError:
         return JsonResponse({"error", "Payment method already exists"}, status=400)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
 
 
 @login_required
@@ -69,8 +163,8 @@ def edit_method(request, method_id):
         return JsonResponse({"error": "POST request required"}, status=400)
 
     try:
-        user = get_object_or_404(User, pk=request.user.id)
-        method = get_object_or_404(PaymentMethod, pk=method_id)
+        user = request.user
+        method = get_object_or_404(PaymentMethod, pk=method_id, userID=user)
 
         data = json.loads(request.body)
         method_name = data.get('name', '')
@@ -88,10 +182,9 @@ def edit_method(request, method_id):
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
     except PaymentMethod.DoesNotExist:
         return JsonResponse({"error", "Method does not exist"}, status=404)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
 
 @login_required
+@db_transaction.atomic
 def delete_method(request, method_id):
     
     """
@@ -107,8 +200,8 @@ def delete_method(request, method_id):
         return JsonResponse({"error": "POST request required"}, status=400)
 
     try:
-        user = get_object_or_404(User, pk=request.user.id)
-        method = get_object_or_404(PaymentMethod, pk=method_id)
+        user = request.user
+        method = get_object_or_404(PaymentMethod, pk=method_id, userID=user)
 
         method.delete()
 
@@ -116,13 +209,12 @@ def delete_method(request, method_id):
     
     except json.JSONDecodeError:
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
     except PaymentMethod.DoesNotExist:
         return JsonResponse({"error", "Method does not exist"}, status=404)
 
 
 @login_required
+@db_transaction.atomic
 def register_transaction(request):
 
     """
@@ -137,33 +229,119 @@ def register_transaction(request):
         return JsonResponse({"error": "POST request required"}, status=400)
 
     try:
-        user = get_object_or_404(User, pk=request.user.id)
+        user = request.user
 
         data = json.loads(request.body)
-        type = data.get('type', '')
-        category = data.get('category', '')
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Expected a JSON object"}, status=400)
         method = data.get('paymentMethod', '')
-        amount = data.get('amount', '')
-        repetition = data.get('repetition', '')
-
-        paymentMethod = get_object_or_404(PaymentMethod, id=method)
-
-        transaction = Transaction(userID=user, payment_methodID=paymentMethod,
-                                transaction_type=type, category=category,
-                                amount=amount, repeat_interval=repetition)
+        # Validated like imported rows, the date defaulting to now
+        fields = transaction_fields({
+            'type': data.get('type'),
+            'category': data.get('category'),
+            'amount': data.get('amount'),
+            'repeat_interval': data.get('repetition'),
+            'repeat_until': data.get('repeat_until'),
+            'description': data.get('description'),
+            'merchant': data.get('merchant'),
+        }, user.tzinfo)
+
+        paymentMethod = get_object_or_404(PaymentMethod, id=method, userID=user)
+
+        transaction = Transaction(userID=user, payment_methodID=paymentMethod, **fields)
         transaction.save()
 
         return JsonResponse({"message": "Transaction registered"}, status=201)
     
     except json.JSONDecodeError:
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
+    except RowError as error:
+        return JsonResponse({"error": str(error)}, status=400)
     except PaymentMethod.DoesNotExist:
         return JsonResponse({"error", "Payment method does not exist"}, status=404)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
     
 
 @login_required
+def import_transactions(request):
+
+    """
+    Imports many transactions at once, either as a JSON array in the request
+    body or as a CSV file uploaded in the "file" field. JSON bodies may reach
+    EXPENSES_MAX_IMPORT_BYTES, larger imports must be uploaded as CSV.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the number of transactions created and per-row errors
+    """
+
+    if request.method != "POST":
+        return JsonResponse({"error": "POST request required"}, status=400)
+
+    try:
+        user = request.user
+
+        if 'file' in request.FILES:
+            rows = read_csv(request.FILES['file'])
+        else:
+            max_bytes = getattr(settings, 'EXPENSES_MAX_IMPORT_BYTES', 32 * 1024 * 1024)
+            if int(request.META.get('CONTENT_LENGTH') or 0) > max_bytes:
+                return JsonResponse({"error": f"JSON imports are limited to {max_bytes} bytes, upload larger "
+                                              "imports as a CSV file or use the import_transactions command"},
+                                    status=413)
+            # request.body is capped at DATA_UPLOAD_MAX_MEMORY_SIZE, the
+            # stream is read up to the length checked above
+            rows = json.load(request)
+            if not isinstance(rows, list):
+                return JsonResponse({"error": "Expected a JSON array of transactions"}, status=400)
+
+        created, errors = import_rows(user, rows)
+
+        return JsonResponse({"created": created, "errors": errors}, status=201)
+
+    except UnicodeDecodeError:
+        return JsonResponse({"error": "CSV file must be UTF-8 encoded"}, status=400)
+    except ValueError:
+        # Malformed JSON or Content-Length
+        return JsonResponse({"error": "Invalid JSON in request body"}, status=400)
+
+
+@login_required
+def batch(request):
+
+    """
+    Applies several creates, updates and deletes of transactions and payment
+    methods at once. Either every operation is applied or none is.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the result of each operation
+    """
+
+    if request.method != "POST":
+        return JsonResponse({"error": "POST request required"}, status=400)
+
+    try:
+        user = request.user
+
+        data = json.loads(request.body)
+        operations = data.get('operations') if isinstance(data, dict) else None
+        if not isinstance(operations, list):
+            return JsonResponse({"error": "Expected a list of operations"}, status=400)
+
+        results = apply_operations(user, operations)
+
+        return JsonResponse({"results": results}, status=200)
+
+    except BatchError as error:
+        return JsonResponse({"error": "Batch was not applied", "results": error.results}, status=400)
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON in request body"}, status=400)
+    except IntegrityError:
+        return JsonResponse({"error": "Payment method already exists"}, status=400)
+
+
+@login_required
+@db_transaction.atomic
 def delete_transaction(request, transaction_id):
     
     """
@@ -179,8 +357,8 @@ def delete_transaction(request, transaction_id):
         return JsonResponse({"error": "POST request required"}, status=400)
 
     try:
-        user = get_object_or_404(User, pk=request.user.id)
-        transaction = get_object_or_404(Transaction, pk=transaction_id)
+        user = request.user
+        transaction = get_object_or_404(Transaction, pk=transaction_id, userID=user)
 
         transaction.delete()
 
@@ -188,13 +366,14 @@ def delete_transaction(request, transaction_id):
     
     except json.JSONDecodeError:
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
     except Transaction.DoesNotExist:
         return JsonResponse({"error", "Transaction does not exist"}, status=404)
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_data_etag)
+@cached_response('summary', dated_data_etag)
 def user_summary(request):
     """
     Retrieves the summary of the user's financial status.
@@ -203,79 +382,44 @@ def user_summary(request):
     Returns:
         JsonResponse indicating success or failure of the retrieval of information
     """
+    return JsonResponse(dashboard.summary(request.user), safe=False)
+
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_data_etag)
+@cached_response('bootstrap', dated_data_etag)
+def bootstrap(request):
+
+    """
+    Returns the summary, payment methods, month list and first page of
+    transactions in one response, so the dashboard loads with a single request.
+    Args:
+        request: HTTP request object with an optional page limit
+    Returns:
+        JsonResponse with the dashboard data
+    """
+
     try:
-        user = get_object_or_404(User, pk=request.user.id)
-
-        current_date = datetime.now()
-        income = Transaction.objects.filter(userID=user, date__year=current_date.year, 
-                      date__month=current_date.month, transaction_type='income')
-        weekly_expense = Transaction.objects.filter(userID=user, transaction_type='expense',
-                                                    repeat_interval='weekly')
-        monthly_expense = Transaction.objects.filter(userID=user, transaction_type='expense',
-                                                     repeat_interval='monthly')
-        variable_expense = Transaction.objects.filter(userID=user, date__year=current_date.year, 
-                      date__month=current_date.month, transaction_type='expense', repeat_interval='none')
-        
-        income_amount = income.aggregate(total=Sum('amount'))['total']
-        weekly_expense_amount = weekly_expense.aggregate(total=Sum('amount'))['total']
-        monthly_expense_amount = monthly_expense.aggregate(total=Sum('amount'))['total']
-        variable_expense_amount = variable_expense.aggregate(total=Sum('amount'))['total']
-
-        if not income_amount:
-            income_amount = 0
-
-        if not variable_expense_amount:
-            variable_expense_amount = 0
-        
-        if weekly_expense_amount and monthly_expense_amount:
-            fixed_expense_amount = (weekly_expense_amount * 4) + monthly_expense_amount
-        elif monthly_expense_amount:
-            fixed_expense_amount = monthly_expense_amount
-        elif weekly_expense_amount:
-            fixed_expense_amount = weekly_expense_amount * 4
-        else:
-            fixed_expense_amount = 0
-
-        expense_amount = fixed_expense_amount + variable_expense_amount
-        
-        if income_amount and expense_amount:
-            balance = income_amount - expense_amount
-        elif expense_amount:
-            balance = -expense_amount
-        elif income_amount:
-            balance = income_amount
-        else: 
-            balance = 0
-
-        # Calculate balance for each payment method
-        payment_methods = PaymentMethod.objects.filter(userID=user)
-        payment_method_balances = {}
-        for method in payment_methods:
-            method_income = Transaction.objects.filter(userID=user, payment_methodID=method, transaction_type='income').aggregate(total=Sum('amount'))['total'] or 0
-            method_expense = Transaction.objects.filter(userID=user, payment_methodID=method, transaction_type='expense').aggregate(total=Sum('amount'))['total'] or 0
-            payment_method_balances[method.name] = float(method_income - method_expense)
-
-        summary = {
-            'balance': float(balance),
-            'income_amount': float(income_amount),
-            'expense_amount': float(expense_amount),
-            'fixed_expense_amount': float(fixed_expense_amount),
-            'variable_expense_amount': float(variable_expense_amount),
-            'payment_method_balances': payment_method_balances
-        }
-
-        return JsonResponse(summary, safe=False)
-
-    except User.DoesNotExist:
-        return JsonResponse({"error": "User does not exist"}, status=400)
+        limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError(limit)
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+
+    return JsonResponse(dashboard.bootstrap(request.user, limit))
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
 def list_all_transactions(request):
     
     """
     Lists all transactions from a user. This is used to provide options for the
-    transaction form.
+    transaction form. Pass format=columnar for a compact response with one
+    array per field.
     Args:
         request: HTTP request object
     Returns:
@@ -283,26 +427,167 @@ def list_all_transactions(request):
     """
 
     try:
-        user = get_object_or_404(User, pk=request.user.id)
+        user = request.user
 
-        transaction_list = Transaction.objects.filter(userID=user).order_by('-date')
+        transaction_list = transaction_rows(Transaction.objects.filter(userID=user).order_by('-date', '-id'))
 
-        serialized_list = []
-        for transaction in transaction_list:
-            serialized_transaction = transaction.serialize()
-            serialized_list.append(serialized_transaction)
-
-        return JsonResponse(serialized_list, safe=False)
+        with timing('serialize'):
+            if request.GET.get('format') == 'columnar':
+                response = JsonResponse(serialize_transactions_columnar(transaction_list))
+            else:
+                response = JsonResponse(serialize_transactions(transaction_list), safe=False)
+        return response
 
     except json.JSONDecodeError:
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
     except IntegrityError:
         return JsonResponse({"error", "Payment method already exists"}, status=400)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
 
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@cached_response('list_transactions', data_etag)
+def list_transactions(request):
+
+    """
+    Lists one page of the user's transactions, newest first. Supports the
+    month (YYYY-MM), type, method and category filters and a cursor returned by
+    the previous page. Archived transactions are listed too when
+    include_archived is set.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the page of transactions and the cursor of the next page
+    """
+
+    try:
+        user = request.user
+
+        transaction_list = transaction_rows(filter_transactions(user, request.GET))
+
+        limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError(limit)
+
+        cursor = request.GET.get('cursor', '')
+        if request.GET.get('include_archived') and user.archived_before:
+            archived_list = transaction_rows(filter_transactions(user, request.GET, model=ArchivedTransaction))
+            page, next_cursor = merged_keyset_page([transaction_list, archived_list], cursor, limit,
+                                                   key=transaction_key)
+        else:
+            page, next_cursor = keyset_page(transaction_list, cursor, limit, key=transaction_key)
+
+        with timing('serialize'):
+            response = JsonResponse({
+                "transactions": serialize_transactions(page),
+                "next_cursor": next_cursor
+            })
+        return response
+
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "Invalid filter value"}, status=400)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@cached_response('search_transactions', data_etag)
+def search_transactions(request):
+
+    """
+    Searches the description and merchant of the user's transactions, best
+    match first. The text is given in q and combines with the month (YYYY-MM),
+    type, method and category filters of the transaction listing.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the page of matching transactions and the cursor of
+        the next page
+    """
+
+    try:
+        user = request.user
+
+        limit = min(int(request.GET.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError(limit)
+
+        page, next_cursor = search_page(user, filter_transactions(user, request.GET), request.GET.get('q', ''),
+                                        request.GET.get('cursor', ''), limit)
+
+        with timing('serialize'):
+            response = JsonResponse({
+                "transactions": serialize_transactions(page),
+                "next_cursor": next_cursor
+            })
+        return response
+
+    except InvalidSearch:
+        return JsonResponse({"error": "Search text required"}, status=400)
+    except InvalidCursor:
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+    except ValueError:
+        return JsonResponse({"error": "Invalid filter value"}, status=400)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+def sync(request):
+
+    """
+    Returns the transactions and payment methods changed since a cursor, with
+    the ids of deleted ones. Without a cursor every row is returned. Clients
+    keep the returned cursor for the next call and call again right away while
+    has_more is true.
+    Args:
+        request: HTTP request object with an optional cursor
+    Returns:
+        JsonResponse with the changes and the next cursor
+    """
+
+    cursor = request.GET.get('cursor', '')
+    if cursor and not cursor.isdigit():
+        return JsonResponse({"error": "Invalid cursor"}, status=400)
+
+    with timing('serialize'):
+        response = JsonResponse(changes_since(request.user, int(cursor)) if cursor else full_state(request.user))
+    return response
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+def export_transactions(request):
+
+    """
+    Streams the user's transaction history as CSV or NDJSON, archived
+    transactions included when include_archived is set.
+    Args:
+        request: HTTP request object
+    Returns:
+        StreamingHttpResponse with the exported file
+    """
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in CONTENT_TYPES:
+        return JsonResponse({"error": "Format must be csv or ndjson"}, status=400)
+
+    response = StreamingHttpResponse(stream_export(request.user, export_format,
+                                                   include_archived=bool(request.GET.get('include_archived'))),
+                                     content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="transactions.{export_format}"'
+    return response
+
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@cached_response('list_methods', data_etag)
 def list_methods(request):
 
     """
@@ -315,24 +600,22 @@ def list_methods(request):
     """
 
     try: 
-        user = get_object_or_404(User, pk=request.user.id)
-
-        method_list = PaymentMethod.objects.filter(userID=user)
+        user = request.user
 
-        serialized_list = []
-        for method in method_list:
-            serialized_method = method.serialize()
-            serialized_list.append(serialized_method)
+        method_list = PaymentMethod.objects.filter(userID=user).order_by('id')
 
-        return JsonResponse(serialized_list, safe=False)
+        with timing('serialize'):
+            response = JsonResponse(serialize_methods(method_list), safe=False)
+        return response
     
     except json.JSONDecodeError:
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
     
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=data_etag, last_modified_func=data_last_modified)
+@cached_response('list_months', data_etag)
 def list_months(request):
 
     """
@@ -344,29 +627,289 @@ def list_months(request):
     """
     
     try:
-        user = get_object_or_404(User, pk=request.user.id)
-
-        transaction_list = Transaction.objects.filter(userID=user).order_by('-date')
-
-        months = []
-        for transaction in transaction_list:
-            month_year = {
-                "month": transaction.date.strftime("%B"),
-                "year": transaction.date.year
-            }
-            transaction.date.strftime("%B %Y")
-            if month_year not in months:
-                months.append(month_year)
+        user = request.user
 
-        return JsonResponse(months, safe=False)
+        return JsonResponse(dashboard.serialize_months(dashboard.months(user)), safe=False)
 
     except json.JSONDecodeError:
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
     
 
+MAX_PROJECTION_DAYS = 731
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_data_etag)
+@cached_response('projection', dated_data_etag)
+def projection(request):
+
+    """
+    Projects the user's recurring transactions over a window of days, month by
+    month. Pass occurrences=1 to also list every scheduled occurrence.
+    Args:
+        request: HTTP request object with optional start and end (YYYY-MM-DD,
+                 end excluded), defaulting to the next twelve months
+    Returns:
+        JsonResponse with the monthly totals and optional occurrences
+    """
+
+    user = request.user
+    try:
+        today = timezone.localdate(timezone=user.tzinfo)
+        start = parse_date(request.GET['start']) if request.GET.get('start') else today.replace(day=1)
+        if request.GET.get('end'):
+            end = parse_date(request.GET['end'])
+        elif start and start.year < date.max.year:
+            end = date(start.year + 1, start.month, 1)
+        else:
+            end = date.max if start else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid date"}, status=400)
+
+    if start is None or end is None:
+        return JsonResponse({"error": "Dates must be formatted as YYYY-MM-DD"}, status=400)
+    if not start < end or (end - start).days > MAX_PROJECTION_DAYS:
+        return JsonResponse({"error": f"The window must span 1 to {MAX_PROJECTION_DAYS} days"}, status=400)
+
+    totals = monthly_projection(user, start, end)
+    response = {
+        "start": start,
+        "end": end,
+        "months": [
+            {"year": year, "month": month, "income": str(amounts['income']), "expense": str(amounts['expense'])}
+            for (year, month), amounts in totals.items()
+        ]
+    }
+    if request.GET.get('occurrences') == '1':
+        response["occurrences"] = [
+            {"id": occurrence.template_id, "date": occurrence.date, "methodID": occurrence.method_id,
+             "type": occurrence.transaction_type, "category": occurrence.category,
+             "amount": str(occurrence.amount)}
+            for occurrence in materialize(user, start, end)
+        ]
+
+    return JsonResponse(response)
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_data_etag)
+@cached_response('report', dated_data_etag)
+def report(request):
+
+    """
+    Totals the user's transactions per day, week or month over a date range,
+    split by type and optionally by category and payment method, as arrays
+    aligned with the buckets.
+    Args:
+        request: HTTP request object with optional start and end (YYYY-MM-DD,
+                 end excluded, defaulting to the last twelve months), bucket
+                 (day, week or month) and group_by (comma-separated category,
+                 type and method)
+    Returns:
+        JsonResponse with the bucket dates and one series per group
+    """
+
+    user = request.user
+    try:
+        today = timezone.localdate(timezone=user.tzinfo)
+        if request.GET.get('end'):
+            end = parse_date(request.GET['end'])
+        else:
+            end = date(today.year + today.month // 12, today.month % 12 + 1, 1)
+        if request.GET.get('start'):
+            start = parse_date(request.GET['start'])
+        else:
+            start = date(end.year - 1, end.month, 1) if end else None
+    except ValueError:
+        return JsonResponse({"error": "Invalid date"}, status=400)
+
+    if start is None or end is None:
+        return JsonResponse({"error": "Dates must be formatted as YYYY-MM-DD"}, status=400)
+    if not start < end:
+        return JsonResponse({"error": "The start must be before the end"}, status=400)
+
+    size = request.GET.get('bucket', 'month')
+    if size not in BUCKETS:
+        return JsonResponse({"error": f"Bucket must be one of {', '.join(BUCKETS)}"}, status=400)
+    group_by = [dimension for dimension in request.GET.get('group_by', '').split(',') if dimension]
+    if any(dimension not in DIMENSIONS for dimension in group_by):
+        return JsonResponse({"error": f"Group by must be among {', '.join(DIMENSIONS)}"}, status=400)
+    if bucket_count(start, end, size) > MAX_REPORT_BUCKETS:
+        return JsonResponse({"error": f"A report has at most {MAX_REPORT_BUCKETS} buckets"}, status=400)
+
+    result = build_report(user, start, end, size, group_by)
+    with timing('serialize'):
+        response = JsonResponse(result)
+    return response
+
+
+MAX_FORECAST_MONTHS = 24
+
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_data_etag)
+@cached_response('forecast', dated_data_etag)
+def forecast(request):
+
+    """
+    Forecasts the user's cash flow: the projected balance at the end of the
+    month, rolling category averages, payment method burn rates and the
+    income and expenses of the next months.
+    Args:
+        request: HTTP request object with optional horizon (months, the
+                 current one included) and projection (linear or seasonal)
+    Returns:
+        JsonResponse with the forecast
+    """
+
+    try:
+        horizon = int(request.GET.get('horizon', 6))
+    except ValueError:
+        return JsonResponse({"error": "Invalid horizon"}, status=400)
+    if not 1 <= horizon <= MAX_FORECAST_MONTHS:
+        return JsonResponse({"error": f"The horizon must be 1 to {MAX_FORECAST_MONTHS} months"}, status=400)
+
+    projection = request.GET.get('projection', 'linear')
+    if projection not in PROJECTIONS:
+        return JsonResponse({"error": f"Projection must be one of {', '.join(PROJECTIONS)}"}, status=400)
+
+    result = build_forecast(request.user, horizon, projection)
+    with timing('serialize'):
+        response = JsonResponse(result)
+    return response
+
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=dated_data_etag)
+@cached_response('list_budgets', dated_data_etag)
+def list_budgets(request):
+
+    """
+    Lists the user's budgets with their spending in a month and the alert
+    thresholds reached.
+    Args:
+        request: HTTP request object with an optional month (YYYY-MM),
+                 defaulting to the current one
+    Returns:
+        JsonResponse with the status of each budget
+    """
+
+    try:
+        if request.GET.get('month'):
+            year, month = (int(part) for part in request.GET['month'].split('-'))
+            if not 1 <= month <= 12:
+                raise ValueError(month)
+        else:
+            year, month = dashboard.current_month(request.user)
+    except ValueError:
+        return JsonResponse({"error": "Month must be formatted as YYYY-MM"}, status=400)
+
+    return JsonResponse({"year": year, "month": month,
+                         "budgets": dashboard.budget_status(request.user, year, month)})
+
+
+@login_required
+def register_budget(request):
+
+    """
+    Sets the monthly budget of a category, replacing the previous one.
+    Args:
+        request: HTTP request object with the category, the amount and an
+                 optional alert_at percentage
+    Returns:
+        JsonResponse indicating success or failure of the registration
+    """
+
+    if request.method != "POST":
+        return JsonResponse({"error": "POST request required"}, status=400)
+
+    try:
+        data = json.loads(request.body)
+        category = data.get('category', '')
+        amount = Decimal(str(data.get('amount', '')))
+        alert_at = int(data.get('alert_at', 80))
+
+        if category not in dict(Transaction.CATEGORIES):
+            return JsonResponse({"error": "Unknown category"}, status=400)
+        if not amount.is_finite() or not amount > 0 or not 1 <= alert_at <= 100:
+            return JsonResponse({"error": "The amount must be positive and alert_at 1 to 100"}, status=400)
+        # Digits beyond the column's max_digits and decimal_places
+        Budget._meta.get_field('amount').run_validators(amount)
+
+        budget, _ = Budget.objects.update_or_create(userID=request.user, category=category,
+                                                    defaults={'amount': amount, 'alert_at': alert_at})
+
+        return JsonResponse({"message": "Budget registered", "id": budget.id}, status=201)
+
+    except json.JSONDecodeError:
+        return JsonResponse({"error": "Invalid JSON in request body"}, status=400)
+    except ValidationError as error:
+        return JsonResponse({"error": ' '.join(error.messages)}, status=400)
+    except (InvalidOperation, ValueError, TypeError):
+        return JsonResponse({"error": "Invalid amount or alert_at"}, status=400)
+
+
+@login_required
+def delete_budget(request, budget_id):
+
+    """
+    Deletes a budget and its alerts.
+    Args:
+        request: HTTP request object
+        budget_id: ID of the budget to be deleted
+    Returns:
+        JsonResponse indicating success or failure of the deletion
+    """
+
+    if request.method != "POST":
+        return JsonResponse({"error": "POST request required"}, status=400)
+
+    budget = get_object_or_404(Budget, pk=budget_id, userID=request.user)
+    budget.delete()
+
+    return JsonResponse({"message": "Budget deleted"}, status=201)
+
+
+@login_required
+def pause_transaction(request, transaction_id):
+
+    """
+    Pauses a recurring transaction between two days, both included.
+    Args:
+        request: HTTP request object with start and end (YYYY-MM-DD)
+        transaction_id: ID of the recurring transaction
+    Returns:
+        JsonResponse indicating success or failure of the pause
+    """
+
+    if request.method != "POST":
+        return JsonResponse({"error": "POST request required"}, status=400)
+
+    try:
+        transaction = get_object_or_404(Transaction, pk=transaction_id, userID=request.user)
+        if transaction.repeat_interval == 'none':
+            return JsonResponse({"error": "Only recurring transactions can be paused"}, status=400)
+
+        data = json.loads(request.body)
+        start = parse_date(data.get('start') or '')
+        end = parse_date(data.get('end') or '')
+        if start is None or end is None or start > end:
+            return JsonResponse({"error": "A start and end date (YYYY-MM-DD) are required"}, status=400)
+
+        pause = RecurrencePause.objects.create(transactionID=transaction, start=start, end=end)
+
+        return JsonResponse({"message": "Transaction paused", "id": pause.id}, status=201)
+
+    except (json.JSONDecodeError, ValueError):
+        return JsonResponse({"error": "Invalid JSON in request body"}, status=400)
+
+
+@login_required
+@db_transaction.atomic
 def edit_transaction(request, transaction_id):
     
     """
@@ -382,37 +925,99 @@ def edit_transaction(request, transaction_id):
         return JsonResponse({"error": "POST request required"}, status=400)
 
     try:
-        user = get_object_or_404(User, pk=request.user.id)
-        transaction = get_object_or_404(Transaction, pk=transaction_id)
+        user = request.user
+        transaction = get_object_or_404(Transaction, pk=transaction_id, userID=user)
 
         data = json.loads(request.body)
+        if not isinstance(data, dict):
+            return JsonResponse({"error": "Expected a JSON object"}, status=400)
         methodID = data.get('methodID', '')
-        type = data.get('type', '')
-        repeat_interval = data.get('repeat_interval', '')
-        category = data.get('category', '')
-        amount = data.get('amount', '')
+        # Validated like imported rows. The optional fields keep their value
+        # when left out, and the date never changes.
+        fields = transaction_fields({
+            'type': data.get('type'),
+            'category': data.get('category'),
+            'amount': data.get('amount'),
+            'repeat_interval': data.get('repeat_interval'),
+            'repeat_until': data.get('repeat_until',
+                                     transaction.repeat_until.isoformat() if transaction.repeat_until else None),
+            'description': data.get('description', transaction.description),
+            'merchant': data.get('merchant', transaction.merchant),
+        }, user.tzinfo)
+        del fields['date']
+
+        paymentMethod = get_object_or_404(PaymentMethod, id=methodID, userID=user)
 
-        paymentMethod = get_object_or_404(PaymentMethod, id=methodID)
-
-        transaction.transaction_type = type
-        transaction.category = category
         transaction.payment_methodID = paymentMethod
-        transaction.amount = amount
-        transaction.repeat_interval = repeat_interval
+        for field, value in fields.items():
+            setattr(transaction, field, value)
         transaction.save()
 
         return JsonResponse({"message": "Transaction edited"}, status=201)
     
     except json.JSONDecodeError:
         return JsonResponse({"error", "Invalid JSON in request body"}, status=400)
+    except RowError as error:
+        return JsonResponse({"error": str(error)}, status=400)
     except PaymentMethod.DoesNotExist:
         return JsonResponse({"error", "Payment method does not exist"}, status=400)
-    except User.DoesNotExist:
-        return JsonResponse({"error", "User does not exist"}, status=404)
     except Transaction.DoesNotExist:
         return JsonResponse({"error", "Transaction does not exist"}, status=404)
 
 
+CACHED_VIEWS = ['summary', 'bootstrap', 'list_transactions', 'list_methods', 'list_months', 'projection',
+                'report', 'forecast', 'list_budgets', 'search_transactions']
+
+
+def asset(request, path):
+
+    """
+    Serves a file written by build_static, precompressed when the client
+    accepts it. Names carry a hash of the content, so responses are cached
+    for good.
+    Args:
+        request: HTTP request object
+        path: hashed name of the file
+    Returns:
+        FileResponse with the file
+    """
+
+    # Files of earlier builds are served too, for pages rendered before the
+    # last one
+    built = built_path(path)
+    if built is None:
+        raise Http404(path)
+
+    encoding, suffix = choose_encoding(built, request.headers.get('Accept-Encoding', ''))
+    try:
+        file = open(built.with_name(built.name + suffix), 'rb')
+    except FileNotFoundError:
+        raise Http404(path)
+    response = FileResponse(file, content_type=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@login_required
+def cache_stats(request):
+
+    """
+    Reports the hit and miss counters of the cached views. Staff only.
+    Args:
+        request: HTTP request object
+    Returns:
+        JsonResponse with the counters of each view
+    """
+
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff access required"}, status=403)
+
+    return JsonResponse(get_cache_stats(CACHED_VIEWS))
+
+
 def login_view(request):
     if request.method == "POST":
 
@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'expenses.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,10 +77,34 @@ WSGI_APPLICATION = 'final.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite tuning, applied to every new connection. WAL lets reads go on while
+# a write commits, and IMMEDIATE transactions take the write lock when they
+# start, so concurrent writers wait up to busy_timeout instead of failing with
+# "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 134217728,
+    'cache_size': -20000,
+    'temp_store': 'MEMORY',
+}
+
+# Django advises against persistent connections under ASGI, where each async
+# request may run in a new thread and leave its connection behind, so
+# connections are closed after every request by default. final/wsgi.py sets
+# EXPENSES_CONN_MAX_AGE to keep them open for 10 minutes in a WSGI deployment,
+# where every worker thread reuses its own.
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('EXPENSES_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
@@ -85,6 +112,107 @@ DATABASES = {
 AUTH_USER_MODEL = "expenses.User"
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# The "expenses" cache holds per-user results of the summary and listing views.
+# Local memory evicts the least recently used entries once MAX_ENTRIES is
+# reached. When running several worker processes, switch it to
+# django.core.cache.backends.filebased.FileBasedCache with a LOCATION directory
+# so workers share entries and hit/miss counters.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'expenses': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'expenses-results',
+        'TIMEOUT': 600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'expenses-sessions',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.1/topics/http/sessions/
+#
+# Sessions are written through to the database and read from the "sessions"
+# cache, so authenticated requests skip the django_session query once the
+# session is cached. The user row is still read on every request: it carries
+# the data version the ETags are built from. The cache must be shared by all
+# worker processes, or a logout only evicts the session from the worker that
+# served it and the others keep accepting it: files are shared by the workers
+# of one host, use a Redis or Memcached backend across hosts. The files live
+# in the temporary directory, out of the project tree: losing them only costs
+# one django_session query per session. LocMemCache is only safe with a single
+# process. To keep no server-side session state at all, use
+# django.contrib.sessions.backends.signed_cookies instead: the session then
+# lives in a cookie signed with SECRET_KEY, which cannot be revoked from the
+# server before it expires.
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+
+# Bulk imports
+# JSON arrays posted to /import are read from the request stream, so they are
+# not limited by DATA_UPLOAD_MAX_MEMORY_SIZE but by EXPENSES_MAX_IMPORT_BYTES,
+# about 200,000 transactions. Bigger imports are answered with a 413 and go
+# through a CSV upload in the "file" field, which is streamed row by row, or
+# the import_transactions management command.
+
+EXPENSES_MAX_IMPORT_BYTES = 32 * 1024 * 1024
+
+
+# Request profiling
+# expenses.middleware.ProfilingMiddleware adds a Server-Timing header with the
+# SQL, view and serialization time of each request, and logs requests slower
+# than EXPENSES_SLOW_REQUEST_MS as JSON lines to EXPENSES_SLOW_REQUEST_LOG.
+
+EXPENSES_PROFILE_REQUESTS = False
+EXPENSES_SLOW_REQUEST_MS = 500
+EXPENSES_SLOW_QUERIES = 5
+EXPENSES_SLOW_REQUEST_LOG = BASE_DIR / 'slow_requests.log'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {
+            'format': '{message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.FileHandler',
+            'filename': EXPENSES_SLOW_REQUEST_LOG,
+            'formatter': 'message',
+            # The file is only created once a slow request is logged
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'expenses.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -121,6 +249,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
+# Output of manage.py build_static: fingerprinted and precompressed copies of
+# the static files, served by the expenses "asset" view with far-future
+# caching. Templates fall back to STATIC_URL while nothing is built.
+STATIC_BUILD_ROOT = BASE_DIR / 'static_build'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
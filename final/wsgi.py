@@ -12,5 +12,8 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'final.settings')
+# Worker threads of a WSGI server reuse their database connection between
+# requests, see DATABASES in final/settings.py
+os.environ.setdefault('EXPENSES_CONN_MAX_AGE', '600')
 
 application = get_wsgi_application()